@@ -16,7 +16,7 @@
 # with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import os, subprocess, math, time
+import os, subprocess, math
 import rospy, rosparam, rospkg
 
 from qt_gui.plugin import Plugin
@@ -27,83 +27,9 @@ from QtGui import QWidget, QTreeWidgetItem, QCheckBox, QSpinBox, QDoubleSpinBox,
 from functools import partial
 from tempfile import NamedTemporaryFile
 
-from sensor_msgs.msg import JointState
-
 from sr_gui_controller_tuner.sr_controller_tuner import SrControllerTunerApp
-
-class PlotThread(QThread):
-    def __init__(self, parent = None, joint_name = "FFJ0", controller_type = "Motor Force"):
-        QThread.__init__(self, parent)
-        self.joint_name_ = joint_name
-        self.is_joint_0_ = False
-        self.joint_index_in_joint_state_ = None
-        try:
-            self.joint_index_in_joint_state_ = ["FFJ0", "MFJ0", "RFJ0", "LFJ0"].index(self.joint_name_)
-            self.is_joint_0_ = True
-        except ValueError:
-            self.is_joint_0_ = False
-
-        self.controller_type_ = controller_type
-
-        #prepares the title for the plot (can't contain spaces)
-        self.plot_title_ = self.joint_name_ + " " + self.controller_type_
-        self.plot_title_ = self.plot_title_.replace(" ", "_").replace("/","_")
-
-        #stores the subprocesses to be able to terminate them on close
-        self.subprocess_ = []
-
-    def run(self):
-        """
-        Creates an appropriate plot according to controller type
-        Also creates a subscription if controller is of Motor Force type
-        """
-        #rxplot_str = "rxplot -b 30 -p 30 --title=" + self.plot_title_ + " "
-        rxplot_str = "rosrun rqt_plot rqt_plot " 
-
-        if self.controller_type_ == "Motor Force":
-            # the joint 0s are published on a different topic: /joint_0s/joint_states
-            if not self.is_joint_0_:
-                #subscribe to joint_states to get the index of the joint in the message
-                self.subscriber_ = rospy.Subscriber("joint_states", JointState, self.js_callback_)
-
-                #wait until we got the joint index in the joint
-                # states message
-                while self.joint_index_in_joint_state_ == None:
-                    time.sleep(0.01)
-
-                rxplot_str += "joint_states/effort["+ str(self.joint_index_in_joint_state_) +"]"
-            else:
-                rxplot_str += "joint_0s/joint_states/effort["+ str(self.joint_index_in_joint_state_) +"]"
-
-        elif self.controller_type_ == "Position":
-            rxplot_str += "sh_"+self.joint_name_.lower()+"_position_controller/state/set_point,sh_"+self.joint_name_.lower()+"_position_controller/state/process_value sh_" + self.joint_name_.lower()+"_position_controller/state/command"
-        elif self.controller_type_ == "Muscle Position":
-            rxplot_str += "sh_"+self.joint_name_.lower()+"_muscle_position_controller/state/set_point,sh_"+self.joint_name_.lower()+"_muscle_position_controller/state/process_value sh_" + self.joint_name_.lower()+"_muscle_position_controller/state/pseudo_command sh_" + self.joint_name_.lower()+"_muscle_position_controller/state/valve_muscle_0,sh_" + self.joint_name_.lower()+"_muscle_position_controller/state/valve_muscle_1"
-        elif self.controller_type_ == "Velocity":
-            rxplot_str += "sh_"+self.joint_name_.lower()+"_velocity_controller/state/set_point,sh_"+self.joint_name_.lower()+"_velocity_controller/state/process_value"
-        elif self.controller_type_ == "Mixed Position/Velocity":
-            rxplot_str += "sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/set_point,sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/process_value sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/process_value_dot,sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/commanded_velocity sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/command,sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/measured_effort,sh_"+self.joint_name_.lower()+"_mixed_position_velocity_controller/state/friction_compensation"
-        elif self.controller_type_ == "Effort":
-            rxplot_str += "sh_"+self.joint_name_.lower()+"_effort_controller/state/set_point,sh_"+self.joint_name_.lower()+"_effort_controller/state/process_value"
-
-        self.subprocess_.append( subprocess.Popen(rxplot_str.split()) )
-
-    def js_callback_(self, msg):
-        #get the joint index once, then unregister
-        self.joint_index_in_joint_state_ = msg.name.index( self.joint_name_.upper() )
-        self.subscriber_.unregister()
-        self.subscriber_ = None
-
-    def __del__(self):
-        for subprocess in self.subprocess_:
-            #killing the rxplot to close the window
-            subprocess.kill()
-
-        if self.subscriber_ != None:
-            self.subscriber_.unregister()
-            self.subscriber_ = None
-
-        self.wait()
+from sr_gui_controller_tuner.gains_dispatcher import GainsDispatcher, format_report
+from sr_gui_controller_tuner.plot_panel import PlotPanel
 
 class MoveThread(QThread):
     def __init__(self, parent = None, joint_name = "FFJ0", controller_type = "Motor Force"):
@@ -214,6 +140,10 @@ class SrGuiControllerTuner(Plugin):
         #stores the movements threads to be able to stop them
         self.move_threads = []
 
+        #the plots of the controllers, next to the tree
+        self.plot_panel = PlotPanel()
+        self._widget.horizontalLayout_2.addWidget(self.plot_panel)
+
         #stores the controllers in the same order as the dropdown
         self.controllers_in_dropdown = []
 
@@ -224,6 +154,10 @@ class SrGuiControllerTuner(Plugin):
         #a library which helps us doing the real work.
         self.sr_controller_tuner_app_ = SrControllerTunerApp( os.path.join(rospkg.RosPack().get_path('sr_gui_controller_tuner'), 'data', 'controller_settings.xml') )
 
+        #calls the services to set the gains of several joints at once, off the GUI thread
+        self.gains_dispatcher = GainsDispatcher(self.sr_controller_tuner_app_, parent = self)
+        self.gains_dispatcher.dispatchFinished.connect(self.on_gains_set_)
+
         #refresh the controllers once
         self.on_btn_refresh_ctrl_clicked_()
         #attach the button pressed to its action
@@ -241,8 +175,10 @@ class SrGuiControllerTuner(Plugin):
         self._widget.btn_stop_mvts.pressed.connect(self.on_btn_stop_mvts_clicked_)
 
     def on_btn_plot_pressed_(self, joint_name, btn):
-        plot_thread = PlotThread(btn, joint_name, self.controller_type)
-        plot_thread.start()
+        if self.plot_panel.toggle_plot(joint_name, self.controller_type):
+            btn.setText("Hide Plot")
+        else:
+            btn.setText("Plot")
 
     def on_btn_move_pressed_(self, joint_name, btn):
         move_thread = MoveThread(btn, joint_name, self.controller_type)
@@ -337,6 +273,8 @@ class SrGuiControllerTuner(Plugin):
         paramlist = rosparam.load_file( self.file_to_save )
         for params,ns in paramlist:
             rosparam.upload_params(ns, params)
+        #the tree is filled from the snapshot of the parameters, which doesn't have the new values yet
+        self.sr_controller_tuner_app_.pid_loader.refresh()
 
         self.refresh_controller_tree_( self.controllers_in_dropdown[self._widget.dropdown_ctrl.currentIndex()] )
 
@@ -349,16 +287,18 @@ class SrGuiControllerTuner(Plugin):
         if len( selected_items ) == 0:
             QMessageBox.warning(self._widget.tree_ctrl_settings, "Warning", "No motors selected.")
 
+        joint_names = []
         for it in selected_items:
             if str(it.text(1)) != "":
-                self.save_controller( str(it.text(1)) )
+                joint_names.append( str(it.text(1)) )
+        if len( joint_names ) > 0:
+            self.save_controllers( joint_names )
 
     def on_btn_save_all_clicked_(self):
         """
         Save all controllers
         """
-        for motor in self.ctrl_widgets.keys():
-            self.save_controller( motor )
+        self.save_controllers( self.ctrl_widgets.keys() )
 
     def on_btn_set_selected_clicked_(self):
         """
@@ -369,21 +309,25 @@ class SrGuiControllerTuner(Plugin):
         if len( selected_items ) == 0:
             QMessageBox.warning(self._widget.tree_ctrl_settings, "Warning", "No motors selected.")
 
+        joint_names = []
         for it in selected_items:
             if str(it.text(1)) != "":
-                self.set_controller( str(it.text(1)) )
+                joint_names.append( str(it.text(1)) )
+        if len( joint_names ) > 0:
+            self.set_controllers( joint_names )
 
     def on_btn_set_all_clicked_(self):
         """
         Sets the current values for all controllers using the ros service.
         """
-        for motor in self.ctrl_widgets.keys():
-            self.set_controller( motor )
+        self.set_controllers( self.ctrl_widgets.keys() )
 
     def on_btn_refresh_ctrl_clicked_(self):
         """
         Calls refresh_controller_tree_ after preparing widgets
         """
+        #the parameters may have been changed since the last refresh
+        self.sr_controller_tuner_app_.pid_loader.refresh()
         ctrls = self.sr_controller_tuner_app_.get_ctrls()
         self.sr_controller_tuner_app_.refresh_control_mode()
         self.controllers_in_dropdown = []
@@ -415,29 +359,70 @@ class SrGuiControllerTuner(Plugin):
 
         return settings
 
+    def set_controllers(self, joint_names):
+        """
+        Sets the current values for the given controllers using the ros services.
+        The services are called concurrently, the results are reported in on_gains_set_.
+        """
+        #the widgets can only be read from the GUI thread
+        settings = {}
+        for joint_name in joint_names:
+            settings[joint_name] = self.read_settings( joint_name )
+
+        #uses the library to call the services properly
+        if self.gains_dispatcher.dispatch(self.controller_type, settings):
+            self._widget.btn_set_selected.setEnabled(False)
+            self._widget.btn_set_all.setEnabled(False)
+
     def set_controller(self, joint_name):
         """
         Sets the current values for the given controller using the ros service.
         """
-        settings = self.read_settings( joint_name )
+        self.set_controllers( [joint_name] )
+
+    def on_gains_set_(self, results, duration):
+        """
+        Reports the results of set_controllers: one message for all the joints.
+        """
+        if not self.sr_controller_tuner_app_.edit_only_mode:
+            self._widget.btn_set_selected.setEnabled(True)
+            self._widget.btn_set_all.setEnabled(True)
 
-        #uses the library to call the service properly
-        success = self.sr_controller_tuner_app_.set_controller(joint_name, self.controller_type, settings)
-        if success == False:
+        report = format_report(results, duration)
+        rospy.loginfo( "Set the PID values:\n" + report )
+
+        #the controllers update their parameters when their gains are set
+        if len([result for result in results if result.success]) > 0:
+            self.sr_controller_tuner_app_.pid_loader.refresh()
+
+        failed = [result.joint_name for result in results if not result.success]
+        if len(failed) > 0:
+            message = "Failed to set the PID values for joint(s) " + ", ".join(sorted(failed)) + "."
             if self.controller_type == "Motor Force":
-                QMessageBox.warning(self._widget.tree_ctrl_settings, "Warning", "Failed to set the PID values for joint "+ joint_name +". This won't work for Gazebo controllers as there are no force controllers yet.")
-            else:
-                QMessageBox.warning(self._widget.tree_ctrl_settings, "Warning", "Failed to set the PID values for joint "+ joint_name +".")
+                message += " This won't work for Gazebo controllers as there are no force controllers yet."
+            box = QMessageBox(QMessageBox.Warning, "Warning", message, QMessageBox.Ok, self._widget.tree_ctrl_settings)
+            box.setDetailedText(report)
+            box.exec_()
 
 
+    def save_controllers(self, joint_names):
+        """
+        Saves the current values for the given controllers, writing the file once.
+        """
+        settings = {}
+        for joint_name in joint_names:
+            settings[joint_name] = self.read_settings( joint_name )
+
+        #uses the library to save them properly
+        self.sr_controller_tuner_app_.save_controllers(self.controller_type, settings, self.file_to_save)
+        #don't show older values than the ones saved at the next refresh of the tree
+        self.sr_controller_tuner_app_.pid_loader.refresh()
+
     def save_controller(self, joint_name):
         """
         Saves the current values for the given controller using the ros service.
         """
-        settings = self.read_settings( joint_name )
-
-        #uses the library to call the service properly
-        self.sr_controller_tuner_app_.save_controller(joint_name, self.controller_type, settings, self.file_to_save)
+        self.save_controllers( [joint_name] )
 
 
     def refresh_controller_tree_(self, controller_type = "Motor Force"):
@@ -469,15 +454,15 @@ class SrGuiControllerTuner(Plugin):
             tmp_headers.append( header["name"] )
         self._widget.tree_ctrl_settings.setHeaderLabels( tmp_headers )
 
-        hand_item = QTreeWidgetItem(ctrl_settings.hand_item)
+        hand_item = QTreeWidgetItem(list(ctrl_settings.hand_item))
         self._widget.tree_ctrl_settings.addTopLevelItem(hand_item)
         for index_finger,finger_settings in enumerate(ctrl_settings.fingers):
-            finger_item = QTreeWidgetItem( hand_item, finger_settings )
+            finger_item = QTreeWidgetItem( hand_item, list(finger_settings) )
             self._widget.tree_ctrl_settings.addTopLevelItem(finger_item)
             for motor_settings in ctrl_settings.motors[index_finger]:
                 motor_name = motor_settings[1]
 
-                motor_item = QTreeWidgetItem( finger_item, motor_settings )
+                motor_item = QTreeWidgetItem( finger_item, list(motor_settings) )
                 self._widget.tree_ctrl_settings.addTopLevelItem(motor_item)
 
                 parameter_values = self.sr_controller_tuner_app_.load_parameters( controller_type, motor_name )
@@ -491,6 +476,8 @@ class SrGuiControllerTuner(Plugin):
                         frame_buttons = QFrame()
                         layout_buttons = QHBoxLayout()
                         btn_plot = QPushButton("Plot")
+                        if self.plot_panel.has_plot(motor_name, self.controller_type):
+                            btn_plot.setText("Hide Plot")
                         self.ctrl_widgets[ motor_name ]["btn_plot"] = btn_plot
                         self.ctrl_widgets[ motor_name ]["btn_plot"].clicked.connect(partial(self.on_btn_plot_pressed_, motor_name, self.ctrl_widgets[ motor_name ]["btn_plot"]))
                         layout_buttons.addWidget(btn_plot)
@@ -565,6 +552,9 @@ class SrGuiControllerTuner(Plugin):
 
     def shutdown_plugin(self):
         self._unregisterPublisher()
+        self.gains_dispatcher.shutdown()
+        self.plot_panel.shutdown()
+        self.sr_controller_tuner_app_.service_pool.close()
 
     def save_settings(self, global_settings, perspective_settings):
         pass
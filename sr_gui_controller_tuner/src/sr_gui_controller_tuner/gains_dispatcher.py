@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from QtCore import QObject, Signal
+
+#at most one call per joint of a hand at a time
+MAX_WORKERS = 24
+
+#the outcome of setting the gains of a joint, duration in seconds
+GainsResult = namedtuple("GainsResult", ["joint_name", "success", "duration", "error"])
+
+def format_report(results, total_duration):
+    """
+    One line per joint (failures first) and the total time
+    """
+    lines = []
+    for result in sorted(results, key = lambda result: (result.success, result.joint_name)):
+        line = "%s: %s (%.0f ms)" % (result.joint_name, "OK" if result.success else "FAILED",
+                                     result.duration * 1000.0)
+        if result.error:
+            line += " - " + result.error
+        lines.append(line)
+    lines.append("%d joints set in %.0f ms" % (len(results), total_duration * 1000.0))
+    return "\n".join(lines)
+
+class GainsDispatcher(QObject):
+    """
+    Sets the gains of several joints concurrently, on a bounded pool of
+    threads, away from the GUI thread. dispatchFinished is emitted (in the
+    thread the dispatcher belongs to) with the list of GainsResult and the
+    total duration once all the joints have been set.
+    """
+    dispatchFinished = Signal(object, float)
+
+    def __init__(self, tuner_app, max_workers = MAX_WORKERS, parent = None):
+        QObject.__init__(self, parent)
+        self.tuner_app = tuner_app
+        self.max_workers = max_workers
+        self.pool = None
+        #only changed from the thread the dispatcher belongs to
+        self.busy = False
+        #connected first: the dispatcher isn't busy any more when the other slots are called
+        self.dispatchFinished.connect(self.dispatch_finished_)
+
+    def dispatch(self, controller_type, settings):
+        """
+        settings are the controller settings indexed by joint name. Returns
+        False (and does nothing) if the previous dispatch isn't finished.
+        """
+        if self.busy:
+            return False
+        if self.pool is None:
+            self.pool = ThreadPool(self.max_workers)
+        self.busy = True
+        start = time.time()
+        calls = [(joint_name, controller_type, joint_settings) for joint_name, joint_settings in settings.items()]
+
+        def finished(results):
+            #called in a thread of the pool: queued to the thread of the dispatcher
+            self.dispatchFinished.emit(results, time.time() - start)
+
+        self.pool.map_async(self.set_controller_, calls, 1, finished)
+        return True
+
+    def dispatch_finished_(self, results, duration):
+        self.busy = False
+
+    def set_controller_(self, call):
+        joint_name, controller_type, settings = call
+        start = time.time()
+        error = ""
+        try:
+            success = self.tuner_app.set_controller(joint_name, controller_type, settings) != False
+        except Exception as e:
+            #the reason of the failure, for the report (and not raised: it would
+            # lose the results of all the other joints)
+            success = False
+            error = str(e) or e.__class__.__name__
+        return GainsResult(joint_name, success, time.time() - start, error)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import threading
+
+import rospy
+
+class JointIndexRegistry(object):
+    """
+    The index of each joint in the messages of a JointState topic, shared
+    by everything in the process which reads that topic (use get() rather
+    than creating a registry). The names are learnt from the JointState
+    messages received by the users of the topic, through update().
+    """
+    registries = {}
+    registries_mutex = threading.Lock()
+
+    @classmethod
+    def get(cls, topic = "joint_states"):
+        topic = rospy.resolve_name(topic)
+        cls.registries_mutex.acquire()
+        try:
+            registry = cls.registries.get(topic)
+            if registry is None:
+                registry = cls(topic)
+                cls.registries[topic] = registry
+            return registry
+        finally:
+            cls.registries_mutex.release()
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.mutex = threading.Lock()
+        self.names = None
+        self.indexes = {}
+
+    def update(self, names):
+        """
+        Learns the names of a message received on the topic,
+        returns the index of each joint by name.
+        """
+        if names == self.names or list(names) == self.names:
+            return self.indexes
+        self.mutex.acquire()
+        try:
+            if list(names) != self.names:
+                self.names = list(names)
+                self.indexes = dict((name, index) for index, name in enumerate(names))
+            return self.indexes
+        finally:
+            self.mutex.release()
+
+    def index(self, joint_name):
+        """
+        The index of the joint, None if it isn't known (yet)
+        """
+        return self.indexes.get(joint_name)
@@ -16,7 +16,7 @@
 # with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import rospy, os
+import rospy, os, time, copy, shutil, tempfile
 
 import yaml
 try:
@@ -24,32 +24,64 @@ try:
 except ImportError:
     from yaml import Loader, Dumper
 
+#seconds before the snapshot of the parameter server is fetched again
+SNAPSHOT_TTL = 10.0
+
 class PidLoader(object):
     """
-    Loads pid parameters of each controller in parameters_dict from a yaml file
+    Loads pid parameters of each controller in parameters_dict from the parameter server.
+
+    The whole parameter server is fetched in a single call and the parameters
+    are read from this snapshot, which is fetched again when it's older than
+    ttl seconds or when refresh() is called.
     """
-    def __init__(self):
-        pass
+    def __init__(self, ttl = SNAPSHOT_TTL):
+        self.ttl = ttl
+        self.snapshot = None
+        self.snapshot_time = 0.0
+
+    def refresh(self):
+        """
+        Fetches the parameter server again
+        """
+        self.snapshot = rospy.get_param("/")
+        self.snapshot_time = time.time()
+
+    def get_param(self, param_name):
+        """
+        Like rospy.get_param, but read from the snapshot: raises a KeyError if the parameter isn't set
+        """
+        if self.snapshot is None or time.time() - self.snapshot_time > self.ttl:
+            self.refresh()
+        value = self.snapshot
+        for key in rospy.resolve_name(param_name).split("/"):
+            if key == "":
+                continue
+            if not isinstance(value, dict) or key not in value:
+                raise KeyError(param_name)
+            value = value[key]
+        #the snapshot is shared by all the controllers
+        return copy.deepcopy(value)
 
     def get_settings(self, param_name):
         param_dict = {}
         if len(param_name) == 2:
             try:
-                tmp_dict = rospy.get_param(param_name[0])
+                tmp_dict = self.get_param(param_name[0])
             except KeyError:
                 return -1
             for item in tmp_dict.items():
                 param_dict["pos/"+item[0]] = item[1]
 
             try:
-                tmp_dict = rospy.get_param(param_name[1])
+                tmp_dict = self.get_param(param_name[1])
             except KeyError:
                 return -1
             for item in tmp_dict.items():
                 param_dict["vel/"+item[0]] = item[1]
         else:
             try:
-                param_dict = rospy.get_param(param_name)
+                param_dict = self.get_param(param_name)
             except KeyError:
                 return -1
         return param_dict
@@ -57,32 +89,69 @@ class PidLoader(object):
 class PidSaver(object):
     """
     Saves pid parameters of each controller in parameters_dict in a yaml file
+
+    The file is replaced atomically: the new settings are written to a
+    temporary file which is then renamed, so an error while saving leaves
+    the file unchanged. If backup is True, the previous version of the file
+    is kept as <file>.bak.
     """
-    def __init__(self, file_path):
+    def __init__(self, file_path, backup = False):
         self.path = file_path
+        self.backup = backup
 
     def save_settings(self, param_path, parameters_dict):
+        self.save_all_settings( [(param_path, parameters_dict)] )
+
+    def save_all_settings(self, settings):
+        """
+        Saves a list of (param_path, parameters_dict), parsing and writing the file only once.
+        """
         f = open(self.path,'r')
-        document = ""
-        for line in f.readlines():
-            document += line
-        f.close()
+        try:
+            yaml_config = yaml.load(f, Loader=Loader)
+        finally:
+            f.close()
 
-        yaml_config = yaml.load(document)
+        for param_path, parameters_dict in settings:
+            self.update_config_(yaml_config, param_path, parameters_dict)
 
+        full_config_to_write = yaml.dump(yaml_config, Dumper=Dumper, default_flow_style=False)
+        self.write_(full_config_to_write)
+
+    def update_config_(self, yaml_config, param_path, parameters_dict):
+        config = yaml_config[param_path[0]]
         for item in parameters_dict.items():
             if "pos/" in item[0]:
-                yaml_config[param_path[0]]["position_pid"][item[0].split("pos/")[1]] = item[1]
+                config["position_pid"][item[0].split("pos/")[1]] = item[1]
             elif "vel/" in item[0]:
-                yaml_config[param_path[0]]["velocity_pid"][item[0].split("vel/")[1]] = item[1]
+                config["velocity_pid"][item[0].split("vel/")[1]] = item[1]
+            elif len(param_path) == 1:
+                #the parameters are directly in the controller namespace (effort controllers)
+                config[item[0]] = item[1]
             else:
-                yaml_config[param_path[0]][param_path[1]][item[0]] = item[1]
+                config[param_path[1]][item[0]] = item[1]
 
-        full_config_to_write = yaml.dump(yaml_config, default_flow_style=False)
+    def write_(self, document):
+        #the temporary file must be on the same file system to be renamed
+        directory, name = os.path.split(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix = "." + name + ".", dir = directory)
+        try:
+            f = os.fdopen(fd, 'w')
+            try:
+                f.write(document)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+            #mkstemp creates the file readable by its owner only
+            shutil.copymode(self.path, tmp_path)
 
-        f = open(self.path, 'w')
-        f.write(full_config_to_write)
-        f.close()
+            if self.backup:
+                shutil.copy2(self.path, self.path + ".bak")
+            os.rename(tmp_path, self.path)
+        except:
+            os.remove(tmp_path)
+            raise
 
 if __name__ == '__main__':
     path_to_config = "~"
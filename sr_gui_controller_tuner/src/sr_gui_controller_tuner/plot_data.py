@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import threading, time
+
+import numpy
+import rospy, rostopic
+
+from sr_gui_controller_tuner.joint_index_registry import JointIndexRegistry
+
+#samples kept per topic: more than the plotted window at 1kHz
+BUFFER_CAPACITY = 1 << 14
+#seconds between two attempts to subscribe to a topic which isn't published yet
+CONNECT_RETRY = 1.0
+
+class TopicBuffer(object):
+    """
+    The values of some fields of the messages received on a topic, kept in
+    a ring buffer (one column per field).
+
+    The subscriber callback only appends the values to a pending list, the
+    ring buffer is updated by flush() (called from the GUI thread, like
+    window() and column()). A field is an attribute of the message and an
+    optional key: the index in an array attribute, or a joint name for the
+    arrays of a JointState (resolved with the JointIndexRegistry of the topic).
+    The column of a field is dropped with its last user (release_column()),
+    so the indexes of the columns change: look them up again after it.
+
+    The stamps are expected to increase: when they go back (sim time reset,
+    bag played in a loop), the buffer is cleared.
+
+    The type of the topic is asked to the master by a background thread:
+    a slow master doesn't block the GUI thread calling connect().
+    """
+    def __init__(self, topic, capacity = BUFFER_CAPACITY):
+        self.topic = topic
+        self.capacity = capacity
+        self.fields = []
+        #the number of users of each field
+        self.field_users = {}
+        self.times = numpy.zeros(capacity)
+        self.values = numpy.zeros((capacity, 0))
+        self.count = 0
+
+        self.mutex = threading.Lock()
+        self.pending_times = []
+        self.pending_values = []
+        #the index of the joints, when some fields are read by joint name
+        self.joint_indexes = None
+
+        self.users = 0
+        self.subscriber = None
+        self.connect_time = None
+        #the lookup of the type of the topic: the thread running it, and
+        # its (message class, topic) once the topic is published
+        self.lookup = None
+        self.topic_class = None
+
+    def connect(self):
+        """
+        Subscribes to the topic with the type it's published with, once
+        known. Returns False if it isn't known yet: the type is looked up
+        in the background, again every CONNECT_RETRY seconds until the
+        topic is published.
+        """
+        if self.subscriber is not None:
+            return True
+        self.mutex.acquire()
+        try:
+            topic_class = self.topic_class
+        finally:
+            self.mutex.release()
+        if topic_class is not None:
+            msg_class, real_topic = topic_class
+            self.subscriber = rospy.Subscriber(real_topic, msg_class, self.callback, queue_size = 100)
+            return True
+
+        if self.lookup is not None and self.lookup.is_alive():
+            return False
+        if self.connect_time is not None and time.time() - self.connect_time < CONNECT_RETRY:
+            return False
+        self.connect_time = time.time()
+        self.lookup = threading.Thread(target = self.lookup_topic_class_, name = "plot lookup " + self.topic)
+        self.lookup.daemon = True
+        self.lookup.start()
+        return False
+
+    def lookup_topic_class_(self):
+        try:
+            msg_class, real_topic, msg_eval = rostopic.get_topic_class(rospy.resolve_name(self.topic))
+        except Exception as e:
+            rospy.logwarn("Couldn't get the type of " + self.topic + ": " + str(e))
+            return
+        if msg_class is None:
+            return
+        self.mutex.acquire()
+        try:
+            self.topic_class = (msg_class, real_topic)
+        finally:
+            self.mutex.release()
+
+    def unregister(self):
+        if self.subscriber is not None:
+            self.subscriber.unregister()
+            self.subscriber = None
+
+    def column(self, attribute, key = None):
+        """
+        The column of the field in the values, added if needed
+        """
+        field = (attribute, key)
+        self.mutex.acquire()
+        try:
+            if field in self.fields:
+                self.field_users[field] += 1
+                return self.fields.index(field)
+            if key is not None and not isinstance(key, int):
+                self.joint_indexes = JointIndexRegistry.get(self.topic)
+            #the pending rows have the previous number of columns
+            self.flush_(*self.take_pending_())
+            self.fields.append(field)
+            self.field_users[field] = 1
+            new_column = numpy.empty((self.capacity, 1))
+            new_column.fill(numpy.nan)
+            self.values = numpy.hstack((self.values, new_column))
+            return len(self.fields) - 1
+        finally:
+            self.mutex.release()
+
+    def release_column(self, attribute, key = None):
+        """
+        Drops the column of the field when its last user releases it
+        """
+        field = (attribute, key)
+        self.mutex.acquire()
+        try:
+            self.field_users[field] -= 1
+            if self.field_users[field] > 0:
+                return
+            del self.field_users[field]
+            #the pending rows have the previous number of columns
+            self.flush_(*self.take_pending_())
+            column = self.fields.index(field)
+            del self.fields[column]
+            self.values = numpy.delete(self.values, column, axis = 1)
+            joint_keys = [field_key for field_attribute, field_key in self.fields
+                          if field_key is not None and not isinstance(field_key, int)]
+            if len(joint_keys) == 0:
+                self.joint_indexes = None
+        finally:
+            self.mutex.release()
+
+    def callback(self, msg):
+        header = getattr(msg, "header", None)
+        if header is not None and not header.stamp.is_zero():
+            stamp = header.stamp.to_sec()
+        else:
+            stamp = rospy.get_time()
+
+        indexes = None
+        if self.joint_indexes is not None:
+            indexes = self.joint_indexes.update(getattr(msg, "name", []))
+
+        self.mutex.acquire()
+        try:
+            for attribute, key in self.fields:
+                self.pending_values.append(self.extract_(msg, attribute, key, indexes))
+            self.pending_times.append(stamp)
+        finally:
+            self.mutex.release()
+
+    def extract_(self, msg, attribute, key, indexes):
+        try:
+            value = getattr(msg, attribute)
+            if key is None:
+                return float(value)
+            if not isinstance(key, int):
+                key = indexes[key]
+            return float(value[key])
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            return numpy.nan
+
+    def take_pending_(self):
+        times = self.pending_times
+        values = self.pending_values
+        self.pending_times = []
+        self.pending_values = []
+        return times, values
+
+    def flush(self):
+        """
+        Moves the values received since the last flush to the ring buffer
+        """
+        self.mutex.acquire()
+        try:
+            times, values = self.take_pending_()
+        finally:
+            self.mutex.release()
+        self.flush_(times, values)
+
+    def flush_(self, times, values):
+        nb_rows = len(times)
+        if nb_rows == 0:
+            return
+        times = numpy.array(times, dtype = numpy.float64)
+        values = numpy.array(values, dtype = numpy.float64).reshape((nb_rows, len(self.fields)))
+        #the time went back: only keep the samples after the last jump
+        jumps = numpy.flatnonzero(numpy.diff(times) < 0)
+        latest_time = self.latest_time()
+        if len(jumps) > 0 or (latest_time is not None and times[0] < latest_time):
+            self.count = 0
+            if len(jumps) > 0:
+                times = times[jumps[-1] + 1:]
+                values = values[jumps[-1] + 1:]
+                nb_rows = len(times)
+        if nb_rows > self.capacity:
+            self.count += nb_rows - self.capacity
+            times = times[-self.capacity:]
+            values = values[-self.capacity:]
+            nb_rows = self.capacity
+        rows = (self.count + numpy.arange(nb_rows)) % self.capacity
+        self.times[rows] = times
+        self.values[rows] = values
+        self.count += nb_rows
+
+    def latest_time(self):
+        if self.count == 0:
+            return None
+        return self.times[(self.count - 1) % self.capacity]
+
+    def window(self, column, start_time):
+        """
+        The times and values of a column since start_time, oldest first
+        """
+        if self.count <= self.capacity:
+            times = self.times[:self.count]
+            values = self.values[:self.count, column]
+        else:
+            end = self.count % self.capacity
+            times = numpy.concatenate((self.times[end:], self.times[:end]))
+            values = numpy.concatenate((self.values[end:, column], self.values[:end, column]))
+        first = numpy.searchsorted(times, start_time)
+        return times[first:], values[first:]
+
+def decimate(times, values, start_time, end_time, width):
+    """
+    Reduces the samples to the min and max of each of the width columns
+    between start_time and end_time: the plot looks the same, whatever the
+    number of samples. The NaN are ignored.
+    """
+    if len(times) <= 2 * width or end_time <= start_time:
+        return times, values
+    columns = ((times - start_time) * (width / (end_time - start_time))).astype(numpy.int64)
+    #the samples at end_time go in the last column
+    columns = numpy.minimum(columns, width - 1)
+    firsts = numpy.flatnonzero(numpy.append(True, columns[1:] != columns[:-1]))
+    minimums = numpy.fmin.reduceat(values, firsts)
+    maximums = numpy.fmax.reduceat(values, firsts)
+    return numpy.repeat(times[firsts], 2), numpy.column_stack((minimums, maximums)).ravel()
+
+class PlotDataHub(object):
+    """
+    The TopicBuffer of all the plotted topics: the plots on the same topic
+    share its subscriber and buffer, which is dropped with its last user.
+    """
+    def __init__(self, capacity = BUFFER_CAPACITY):
+        self.capacity = capacity
+        self.buffers = {}
+
+    def acquire(self, topic):
+        buffer = self.buffers.get(topic)
+        if buffer is None:
+            buffer = TopicBuffer(topic, self.capacity)
+            self.buffers[topic] = buffer
+        buffer.users += 1
+        buffer.connect()
+        return buffer
+
+    def release(self, buffer):
+        buffer.users -= 1
+        if buffer.users == 0:
+            buffer.unregister()
+            del self.buffers[buffer.topic]
+
+    def flush(self):
+        for buffer in self.buffers.values():
+            if buffer.connect():
+                buffer.flush()
+
+    def shutdown(self):
+        for buffer in self.buffers.values():
+            buffer.unregister()
+        self.buffers = {}
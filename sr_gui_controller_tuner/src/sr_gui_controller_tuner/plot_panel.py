@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import numpy
+
+from QtCore import Qt, QTimer, QRectF, QPointF
+from QtGui import QWidget, QVBoxLayout, QScrollArea, QPainter, QPen, QColor, QPolygonF, QSizePolicy
+
+from sr_gui_controller_tuner.plot_data import PlotDataHub, decimate
+
+#seconds of data shown
+PLOT_WINDOW = 10.0
+#plots redrawn per second
+REFRESH_RATE = 30
+PLOT_HEIGHT = 180
+MARGIN_LEFT = 60
+COLORS = [Qt.blue, Qt.red, Qt.darkGreen, Qt.magenta, Qt.darkCyan, Qt.darkYellow]
+
+JOINTS_0 = ["FFJ0", "MFJ0", "RFJ0", "LFJ0"]
+
+def controller_plots(joint_name, controller_type):
+    """
+    What is plotted for a controller: a list of axes, each a list
+    of curves (topic, attribute, key), like the rqt_plot of the
+    controller used to show.
+    """
+    if controller_type == "Motor Force":
+        if joint_name in JOINTS_0:
+            # the joint 0s are published on a different topic
+            return [[("joint_0s/joint_states", "effort", JOINTS_0.index(joint_name))]]
+        return [[("joint_states", "effort", joint_name.upper())]]
+
+    controller = {"Position": "position_controller",
+                  "Muscle Position": "muscle_position_controller",
+                  "Velocity": "velocity_controller",
+                  "Mixed Position/Velocity": "mixed_position_velocity_controller",
+                  "Effort": "effort_controller"}[controller_type]
+    state = "sh_" + joint_name.lower() + "_" + controller + "/state"
+    axes = [["set_point", "process_value"]]
+    if controller_type == "Position":
+        axes.append(["command"])
+    elif controller_type == "Muscle Position":
+        axes.append(["pseudo_command"])
+        axes.append(["valve_muscle_0", "valve_muscle_1"])
+    elif controller_type == "Mixed Position/Velocity":
+        axes.append(["process_value_dot", "commanded_velocity"])
+        axes.append(["command", "measured_effort", "friction_compensation"])
+    return [[(state, attribute, None) for attribute in attributes] for attributes in axes]
+
+def polyline(x, y):
+    """
+    A QPolygonF of the points, filled straight from the arrays when possible
+    """
+    polygon = QPolygonF(len(x))
+    try:
+        pointer = polygon.data()
+        pointer.setsize(len(x) * 2 * numpy.dtype(numpy.float64).itemsize)
+        points = numpy.frombuffer(pointer, dtype = numpy.float64)
+    except (AttributeError, TypeError):
+        #the binding doesn't give access to the memory of the polygon
+        return QPolygonF([QPointF(point_x, point_y) for point_x, point_y in zip(x, y)])
+    points[0::2] = x
+    points[1::2] = y
+    return polygon
+
+class Curve(object):
+    def __init__(self, buffer, field, label, color):
+        self.buffer = buffer
+        #(attribute, key): the index of its column changes when other
+        # columns of the buffer are dropped
+        self.field = field
+        self.label = label
+        self.color = color
+
+    def window(self, start_time):
+        return self.buffer.window(self.buffer.fields.index(self.field), start_time)
+
+class PlotWidget(QWidget):
+    """
+    Plots the last PLOT_WINDOW seconds of the curves of a controller,
+    one axis per group of curves. The data is decimated to one min/max
+    pair per pixel, so drawing doesn't depend on the rate of the topics.
+    """
+    def __init__(self, title, axes, parent = None):
+        QWidget.__init__(self, parent)
+        self.title = title
+        #a list of Curve per axis
+        self.axes = axes
+        self.setMinimumHeight(PLOT_HEIGHT)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def curves(self):
+        return [curve for curves in self.axes for curve in curves]
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        font_height = painter.fontMetrics().height()
+        painter.drawText(QPointF(4, font_height), self.title)
+
+        latest = [curve.buffer.latest_time() for curve in self.curves()]
+        latest = [latest_time for latest_time in latest if latest_time is not None]
+        if len(latest) == 0:
+            painter.setPen(Qt.gray)
+            painter.drawText(QPointF(MARGIN_LEFT, 2 * font_height), "waiting for data")
+            return
+        end_time = max(latest)
+        start_time = end_time - PLOT_WINDOW
+
+        axis_height = float(self.height() - font_height - 4) / len(self.axes)
+        for index, curves in enumerate(self.axes):
+            top = font_height + 4 + index * axis_height
+            rect = QRectF(MARGIN_LEFT, top + font_height, self.width() - MARGIN_LEFT - 4,
+                          axis_height - font_height - 4)
+            self.paint_axis_(painter, rect, curves, start_time, end_time)
+
+    def paint_axis_(self, painter, rect, curves, start_time, end_time):
+        width = max(int(rect.width()), 1)
+        data = []
+        for curve in curves:
+            times, values = curve.window(start_time)
+            times, values = decimate(times, values, start_time, end_time, width)
+            finite = numpy.isfinite(values)
+            data.append((times[finite], values[finite]))
+
+        all_values = [values for times, values in data if len(values) > 0]
+        if len(all_values) > 0:
+            minimum = min([values.min() for values in all_values])
+            maximum = max([values.max() for values in all_values])
+        else:
+            minimum, maximum = 0.0, 0.0
+        if maximum - minimum < 1e-9:
+            minimum -= 1.0
+            maximum += 1.0
+        margin = 0.05 * (maximum - minimum)
+        minimum -= margin
+        maximum += margin
+
+        painter.setPen(Qt.lightGray)
+        painter.drawRect(rect)
+        painter.setPen(Qt.black)
+        painter.drawText(QRectF(0, rect.top(), MARGIN_LEFT - 4, rect.height()),
+                         Qt.AlignRight | Qt.AlignTop, "%.3g" % maximum)
+        painter.drawText(QRectF(0, rect.top(), MARGIN_LEFT - 4, rect.height()),
+                         Qt.AlignRight | Qt.AlignBottom, "%.3g" % minimum)
+
+        x_scale = rect.width() / (end_time - start_time)
+        y_scale = rect.height() / (maximum - minimum)
+        legend_x = rect.left()
+        for curve, (times, values) in zip(curves, data):
+            painter.setPen(QPen(QColor(curve.color)))
+            painter.drawText(QPointF(legend_x, rect.top() - 2), curve.label)
+            legend_x += painter.fontMetrics().width(curve.label) + 10
+            if len(times) > 1:
+                x = rect.left() + (times - start_time) * x_scale
+                y = rect.bottom() - (values - minimum) * y_scale
+                painter.drawPolyline(polyline(x, y))
+
+class PlotPanel(QWidget):
+    """
+    The plots of the controllers, redrawn REFRESH_RATE times per second.
+    Hidden when there's nothing to plot.
+    """
+    def __init__(self, parent = None):
+        QWidget.__init__(self, parent)
+        self.hub = PlotDataHub()
+        #the PlotWidget indexed by (joint name, controller type)
+        self.plots = {}
+
+        self.plots_widget = QWidget()
+        self.plots_layout = QVBoxLayout()
+        self.plots_layout.addStretch()
+        self.plots_widget.setLayout(self.plots_layout)
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setWidget(self.plots_widget)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(scroll_area)
+        self.setLayout(layout)
+        self.setMinimumWidth(400)
+        self.hide()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh_)
+
+    def has_plot(self, joint_name, controller_type):
+        return (joint_name, controller_type) in self.plots
+
+    def toggle_plot(self, joint_name, controller_type):
+        """
+        Adds the plot of the controller, or removes it if it's already
+        there. Returns True if the plot is shown.
+        """
+        key = (joint_name, controller_type)
+        if key in self.plots:
+            self.remove_plot(joint_name, controller_type)
+            return False
+
+        axes = []
+        for curves in controller_plots(joint_name, controller_type):
+            axis = []
+            for index, (topic, attribute, field_key) in enumerate(curves):
+                buffer = self.hub.acquire(topic)
+                buffer.column(attribute, field_key)
+                axis.append(Curve(buffer, (attribute, field_key), attribute, COLORS[index % len(COLORS)]))
+            axes.append(axis)
+        plot = PlotWidget(joint_name + " " + controller_type, axes)
+        self.plots[key] = plot
+        #before the stretch
+        self.plots_layout.insertWidget(self.plots_layout.count() - 1, plot)
+
+        self.show()
+        if not self.timer.isActive():
+            self.timer.start(int(1000 / REFRESH_RATE))
+        return True
+
+    def remove_plot(self, joint_name, controller_type):
+        plot = self.plots.pop((joint_name, controller_type))
+        for curve in plot.curves():
+            curve.buffer.release_column(*curve.field)
+            self.hub.release(curve.buffer)
+        self.plots_layout.removeWidget(plot)
+        plot.deleteLater()
+        if len(self.plots) == 0:
+            self.timer.stop()
+            self.hide()
+
+    def refresh_(self):
+        self.hub.flush()
+        for plot in self.plots.values():
+            plot.update()
+
+    def shutdown(self):
+        self.timer.stop()
+        self.hub.shutdown()
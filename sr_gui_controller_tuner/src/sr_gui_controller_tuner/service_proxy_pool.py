@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import threading
+
+import rospy
+
+class PooledServiceProxy(object):
+    """
+    A persistent rospy.ServiceProxy which reconnects when a call fails:
+    the connection is kept open between the calls, so the master is only
+    asked for the service when connecting. Calls through the same proxy
+    are serialized (a persistent connection handles one call at a time).
+    """
+    def __init__(self, service_name, service_class, wait_timeout = None):
+        self.service_name = service_name
+        self.service_class = service_class
+        self.wait_timeout = wait_timeout
+        self.mutex = threading.Lock()
+        self.proxy = None
+
+    def connect_(self):
+        if self.wait_timeout is not None:
+            #raises a ROSException if the service doesn't appear in time
+            rospy.wait_for_service(self.service_name, self.wait_timeout)
+        self.proxy = rospy.ServiceProxy(self.service_name, self.service_class, persistent = True)
+
+    def __call__(self, *args, **kwargs):
+        self.mutex.acquire()
+        try:
+            if self.proxy is None:
+                self.connect_()
+            try:
+                return self.proxy(*args, **kwargs)
+            except rospy.ServiceException:
+                #the connection may have been broken (the node restarted): try once more on a new one
+                self.close_()
+                self.connect_()
+                return self.proxy(*args, **kwargs)
+        finally:
+            self.mutex.release()
+
+    def close_(self):
+        if self.proxy is not None:
+            self.proxy.close()
+            self.proxy = None
+
+    def close(self):
+        self.mutex.acquire()
+        try:
+            self.close_()
+        finally:
+            self.mutex.release()
+
+class ServiceProxyPool(object):
+    """
+    The PooledServiceProxy used by the tuner, one per service name and type
+    """
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.proxies = {}
+
+    def get(self, service_name, service_class, wait_timeout = None):
+        """
+        The proxy for the service. If wait_timeout is given, connecting
+        waits up to wait_timeout seconds for the service to be advertised.
+        """
+        key = (rospy.resolve_name(service_name), service_class)
+        self.mutex.acquire()
+        try:
+            proxy = self.proxies.get(key)
+            if proxy is None:
+                proxy = PooledServiceProxy(key[0], service_class, wait_timeout)
+                self.proxies[key] = proxy
+        finally:
+            self.mutex.release()
+        return proxy
+
+    def close(self):
+        """
+        Closes all the connections
+        """
+        self.mutex.acquire()
+        proxies = list(self.proxies.values())
+        self.proxies = {}
+        self.mutex.release()
+        for proxy in proxies:
+            proxy.close()
@@ -16,28 +16,34 @@
 # with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import rospy
+import rospy, os
 
 from xml.etree import ElementTree as ET
 from pr2_mechanism_msgs.srv import ListControllers
 
 from sr_robot_msgs.srv import ForceController, SetEffortControllerGains, SetMixedPositionVelocityPidGains, SetPidGains
 from sr_gui_controller_tuner.pid_loader_and_saver import PidLoader, PidSaver
+from sr_gui_controller_tuner.service_proxy_pool import ServiceProxyPool
 import unicodedata
 
 class CtrlSettings(object):
     """
     Parses xml file and reads controller settings
     Creates lists for headers, fingers, motors
+
+    The settings are shared between the users of the SrControllerTunerApp
+    cache, so the headers and the rows are tuples and mustn't be modified.
+    The min and max of the headers are converted to numbers.
     """
 
-    def __init__(self, xml_path, controller_type):
-        self.headers = []
+    def __init__(self, xml_path, controller_type, xml_tree = None):
+        headers = []
 
-        #open and parses the xml config file
-        xml_file = open(xml_path)
-        xml_tree = ET.parse(xml_file)
-        xml_file.close()
+        if xml_tree == None:
+            #open and parses the xml config file
+            xml_file = open(xml_path)
+            xml_tree = ET.parse(xml_file)
+            xml_file.close()
 
         #read the settings from the xml file
         ctrl_tree = None
@@ -49,36 +55,46 @@ class CtrlSettings(object):
 
         if ctrl_tree == None:
             rospy.logerr("Couldn't find the settings for the controller " + controller_type)
-
-        #read the headers settings
-        xml_headers = ctrl.find("headers")
-        for header in xml_headers.findall("item"):
-            self.headers.append( header.attrib )
-
+        else:
+            #read the headers settings
+            xml_headers = ctrl_tree.find("headers")
+            for header in xml_headers.findall("item"):
+                header = dict(header.attrib)
+                number_type = {"Int": int, "Float": float}.get(header.get("type"))
+                for limit in ["min", "max"]:
+                    if number_type != None and limit in header:
+                        header[limit] = number_type(header[limit])
+                headers.append( header )
+
+        self.headers = tuple(headers)
         self.nb_columns = len(self.headers)
 
-        self.hand_item = ["Hand"]
+        hand_item = ["Hand"]
         for i in range(0, self.nb_columns - 1):
-            self.hand_item.append("")
+            hand_item.append("")
+        self.hand_item = tuple(hand_item)
 
         #read the fingers and the motors from the xml file
-        self.fingers = []
-        self.motors = []
+        fingers = []
+        motors = []
         all_fingers = xml_tree.find("fingers")
         for finger in all_fingers.findall("finger"):
             finger_row = [ finger.attrib['name'] ]
             for i in range(0, self.nb_columns - 1):
                 finger_row.append("")
-            self.fingers.append( finger_row )
+            fingers.append( tuple(finger_row) )
 
             motors_for_finger = []
             for motor in finger.findall("motor"):
                 motor_row = [ "", motor.attrib['name'] ]
                 for i in range(0, self.nb_columns - 2):
                     motor_row.append("")
-                motors_for_finger.append( motor_row )
+                motors_for_finger.append( tuple(motor_row) )
+
+            motors.append( tuple(motors_for_finger) )
 
-            self.motors.append( motors_for_finger )
+        self.fingers = tuple(fingers)
+        self.motors = tuple(motors)
 
 
 class SrControllerTunerApp(object):
@@ -89,9 +105,14 @@ class SrControllerTunerApp(object):
     
     def __init__(self, xml_path):
         self.xml_path = xml_path
+        #the CtrlSettings by controller type, parsed when the xml file changes
+        self.ctrl_settings = {}
+        self.ctrl_settings_mtime = None
         self.all_controller_types = ["Motor Force", "Position", "Velocity",
                                      "Mixed Position/Velocity", "Effort", "Muscle Position"]
         self.pid_loader = PidLoader()
+        #persistent connections to the services, kept between the calls
+        self.service_pool = ServiceProxyPool()
         
         self.edit_only_mode = False
         self.control_mode = "FORCE"
@@ -106,9 +127,9 @@ class SrControllerTunerApp(object):
         running_ctrls = []
 
         try:
-            rospy.wait_for_service('pr2_controller_manager/list_controllers', self.CONTROLLER_MANAGER_DETECTION_TIMEOUT)
-        
-            controllers = rospy.ServiceProxy('pr2_controller_manager/list_controllers', ListControllers)
+            #waits for the service when connecting (not when already connected)
+            controllers = self.service_pool.get('pr2_controller_manager/list_controllers', ListControllers,
+                                                self.CONTROLLER_MANAGER_DETECTION_TIMEOUT)
             resp = None
             try:
                 resp = controllers()
@@ -135,6 +156,7 @@ class SrControllerTunerApp(object):
                 running_ctrls.append(defined_ctrl_type)
         except rospy.ROSException, e:
             rospy.loginfo( "Controller manager not running: %s"%str(e) )
+            #waiting for the service failed: the connection will be retried at the next refresh
             rospy.loginfo( "Running controller tuner in edit-only mode" )
             self.edit_only_mode = True
             #In edit_only_mode all the controllers are available for editing
@@ -150,8 +172,24 @@ class SrControllerTunerApp(object):
         """
         Parses a file containing the controller settings
         and their min and max values, and returns them.
+        The file is only parsed again when it has been modified.
         """
-        ctrl_settings = CtrlSettings(self.xml_path, controller_type)
+        mtime = os.stat(self.xml_path).st_mtime
+        if mtime != self.ctrl_settings_mtime:
+            xml_file = open(self.xml_path)
+            xml_tree = ET.parse(xml_file)
+            xml_file.close()
+
+            self.ctrl_settings = {}
+            for ctrl in xml_tree.findall("controller"):
+                ctrl_name = ctrl.attrib['name']
+                self.ctrl_settings[ ctrl_name ] = CtrlSettings(self.xml_path, ctrl_name, xml_tree)
+            self.ctrl_settings_mtime = mtime
+
+        ctrl_settings = self.ctrl_settings.get( controller_type )
+        if ctrl_settings == None:
+            #logs the error and returns empty settings
+            ctrl_settings = CtrlSettings(self.xml_path, controller_type)
 
         return ctrl_settings
 
@@ -179,113 +217,110 @@ class SrControllerTunerApp(object):
     def set_controller(self, joint_name, controller_type, controller_settings):
         """
         Sets the controller settings calling the proper service with the correct syntax for controller type.
+        Raises an exception (rospy.ServiceException, ROSException...) saying why if the gains couldn't be set.
         """
         pid_service = None
         service_name = ""
         if controller_type == "Motor Force":
             #/realtime_loop/change_force_PID_FFJ0
             service_name =  "realtime_loop/change_force_PID_"+joint_name.upper()
-            pid_service = rospy.ServiceProxy(service_name, ForceController)
+            pid_service = self.service_pool.get(service_name, ForceController)
 
         elif controller_type == "Position":
             #/sh_ffj3_position_controller/set_gains
             service_name =  "sh_"+joint_name.lower()+"_position_controller/set_gains"
-            pid_service = rospy.ServiceProxy(service_name, SetPidGains)
+            pid_service = self.service_pool.get(service_name, SetPidGains)
 
         elif controller_type == "Muscle Position":
             #/sh_ffj3_position_controller/set_gains
             service_name =  "sh_"+joint_name.lower()+"_muscle_position_controller/set_gains"
-            pid_service = rospy.ServiceProxy(service_name, SetPidGains)
+            pid_service = self.service_pool.get(service_name, SetPidGains)
 
         elif controller_type == "Velocity":
             #/sh_ffj3_velocity_controller/set_gains
             service_name =  "sh_"+joint_name.lower()+"_velocity_controller/set_gains"
-            pid_service = rospy.ServiceProxy(service_name, SetPidGains)
+            pid_service = self.service_pool.get(service_name, SetPidGains)
 
         elif controller_type == "Mixed Position/Velocity":
             #/sh_ffj3_mixed_position_velocity_controller/set_gains
             service_name =  "sh_"+joint_name.lower()+"_mixed_position_velocity_controller/set_gains"
-            pid_service = rospy.ServiceProxy(service_name, SetMixedPositionVelocityPidGains)
+            pid_service = self.service_pool.get(service_name, SetMixedPositionVelocityPidGains)
 
         elif controller_type == "Effort":
             #/sh_ffj3_effort_controller/set_gains
             service_name =  "sh_"+joint_name.lower()+"_effort_controller/set_gains"
-            pid_service = rospy.ServiceProxy(service_name, SetEffortControllerGains)
+            pid_service = self.service_pool.get(service_name, SetEffortControllerGains)
 
         else:
-            rospy.logerr( "", controller_type, " is not a recognized controller type." )
+            raise ValueError(controller_type + " is not a recognized controller type.")
 
         contrlr_settings_converted = {}
         for param in controller_settings.items():
             contrlr_settings_converted[ param[0] ] = float(param[1])
 
         if controller_type == "Motor Force":
-            try:
-                pid_service(int(contrlr_settings_converted["max_pwm"]),
-                            int(contrlr_settings_converted["sgleftref"]),
-                            int(contrlr_settings_converted["sgrightref"]),
-                            int(contrlr_settings_converted["f"]),
-                            int(contrlr_settings_converted["p"]), int(contrlr_settings_converted["i"]),
-                            int(contrlr_settings_converted["d"]), int(contrlr_settings_converted["imax"]),
-                            int(contrlr_settings_converted["deadband"]), int(contrlr_settings_converted["sign"]) )
-            except:
-                return False
+            pid_service(int(contrlr_settings_converted["max_pwm"]),
+                        int(contrlr_settings_converted["sgleftref"]),
+                        int(contrlr_settings_converted["sgrightref"]),
+                        int(contrlr_settings_converted["f"]),
+                        int(contrlr_settings_converted["p"]), int(contrlr_settings_converted["i"]),
+                        int(contrlr_settings_converted["d"]), int(contrlr_settings_converted["imax"]),
+                        int(contrlr_settings_converted["deadband"]), int(contrlr_settings_converted["sign"]) )
 
         elif controller_type == "Position":
-            try:
-                pid_service(float(contrlr_settings_converted["p"]), float(contrlr_settings_converted["i"]),
-                            float(contrlr_settings_converted["d"]), float(contrlr_settings_converted["i_clamp"]),
-                            float(contrlr_settings_converted["max_force"]), float(contrlr_settings_converted["position_deadband"]),
-                            int(contrlr_settings_converted["friction_deadband"]) )
-            except:
-                return False
+            pid_service(float(contrlr_settings_converted["p"]), float(contrlr_settings_converted["i"]),
+                        float(contrlr_settings_converted["d"]), float(contrlr_settings_converted["i_clamp"]),
+                        float(contrlr_settings_converted["max_force"]), float(contrlr_settings_converted["position_deadband"]),
+                        int(contrlr_settings_converted["friction_deadband"]) )
 
         elif controller_type == "Muscle Position":
-            try:
-                pid_service(float(contrlr_settings_converted["p"]), float(contrlr_settings_converted["i"]),
-                            float(contrlr_settings_converted["d"]), float(contrlr_settings_converted["i_clamp"]),
-                            float(contrlr_settings_converted["max_force"]), float(contrlr_settings_converted["position_deadband"]),
-                            int(contrlr_settings_converted["friction_deadband"]) )
-            except:
-                return False
+            pid_service(float(contrlr_settings_converted["p"]), float(contrlr_settings_converted["i"]),
+                        float(contrlr_settings_converted["d"]), float(contrlr_settings_converted["i_clamp"]),
+                        float(contrlr_settings_converted["max_force"]), float(contrlr_settings_converted["position_deadband"]),
+                        int(contrlr_settings_converted["friction_deadband"]) )
 
         elif controller_type == "Velocity":
-            try:
-                pid_service(float(contrlr_settings_converted["p"]), float(contrlr_settings_converted["i"]),
-                            float(contrlr_settings_converted["d"]), float(contrlr_settings_converted["i_clamp"]),
-                            float(contrlr_settings_converted["max_force"]), float(contrlr_settings_converted["velocity_deadband"]),
-                            int(contrlr_settings_converted["friction_deadband"]) )
-            except:
-                return False
+            pid_service(float(contrlr_settings_converted["p"]), float(contrlr_settings_converted["i"]),
+                        float(contrlr_settings_converted["d"]), float(contrlr_settings_converted["i_clamp"]),
+                        float(contrlr_settings_converted["max_force"]), float(contrlr_settings_converted["velocity_deadband"]),
+                        int(contrlr_settings_converted["friction_deadband"]) )
 
         elif controller_type == "Mixed Position/Velocity":
-            try:
-                pid_service(float(contrlr_settings_converted["pos/p"]), float(contrlr_settings_converted["pos/i"]),
-                            float(contrlr_settings_converted["pos/d"]), float(contrlr_settings_converted["pos/i_clamp"]),
-                            float(contrlr_settings_converted["pos/min_velocity"]), float(contrlr_settings_converted["pos/max_velocity"]),
-                            float(contrlr_settings_converted["pos/position_deadband"]),
-                            float(contrlr_settings_converted["vel/p"]), float(contrlr_settings_converted["vel/i"]),
-                            float(contrlr_settings_converted["vel/d"]), float(contrlr_settings_converted["vel/i_clamp"]),
-                            float(contrlr_settings_converted["vel/max_force"]),
-                            int(contrlr_settings_converted["vel/friction_deadband"]) )
-            except:
-                return False
+            pid_service(float(contrlr_settings_converted["pos/p"]), float(contrlr_settings_converted["pos/i"]),
+                        float(contrlr_settings_converted["pos/d"]), float(contrlr_settings_converted["pos/i_clamp"]),
+                        float(contrlr_settings_converted["pos/min_velocity"]), float(contrlr_settings_converted["pos/max_velocity"]),
+                        float(contrlr_settings_converted["pos/position_deadband"]),
+                        float(contrlr_settings_converted["vel/p"]), float(contrlr_settings_converted["vel/i"]),
+                        float(contrlr_settings_converted["vel/d"]), float(contrlr_settings_converted["vel/i_clamp"]),
+                        float(contrlr_settings_converted["vel/max_force"]),
+                        int(contrlr_settings_converted["vel/friction_deadband"]) )
 
         elif controller_type == "Effort":
-            try:
-                pid_service(int(contrlr_settings_converted["max_force"]), int(contrlr_settings_converted["friction_deadband"]) )
-            except:
-                return False
-        else:
-            rospy.logerr( "", controller_type, " is not a recognized controller type." )
-            return False
+            pid_service(int(contrlr_settings_converted["max_force"]), int(contrlr_settings_converted["friction_deadband"]) )
         return True
 
 
-    def save_controller(self, joint_name, controller_type, controller_settings, filename):
+    def save_controller(self, joint_name, controller_type, controller_settings, filename, backup = False):
         """
         Saves the controller settings calling the proper service with the correct syntax for controller type
         """
+        self.save_controllers(controller_type, {joint_name: controller_settings}, filename, backup)
+
+    def save_controllers(self, controller_type, controller_settings, filename, backup = False):
+        """
+        Saves the settings of several controllers (indexed by joint name) in one go.
+        """
+        all_settings = []
+        for joint_name, settings in controller_settings.items():
+            all_settings.append( (self.get_param_path(joint_name, controller_type), settings) )
+
+        pid_saver = PidSaver(filename, backup)
+        pid_saver.save_all_settings(all_settings)
+
+    def get_param_path(self, joint_name, controller_type):
+        """
+        Where the settings of the controller are in the yaml file
+        """
         param_name = []
         if controller_type == "Motor Force":
             param_name = [""+joint_name.lower() ,"pid"]
@@ -299,6 +334,4 @@ class SrControllerTunerApp(object):
             param_name =  ["sh_"+joint_name.lower()+"_mixed_position_velocity_controller" , "pid"]
         elif controller_type == "Effort":
             param_name =  ["sh_"+joint_name.lower()+"_effort_controller"]
-
-        pid_saver = PidSaver(filename)
-        pid_saver.save_settings(param_name, controller_settings)
\ No newline at end of file
+        return param_name
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import unittest
+
+from sr_gui_controller_tuner.joint_index_registry import JointIndexRegistry
+from sr_gui_controller_tuner.plot_data import TopicBuffer
+
+class Stamp(object):
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def is_zero(self):
+        return self.seconds == 0.0
+
+    def to_sec(self):
+        return self.seconds
+
+class Header(object):
+    def __init__(self, seconds):
+        self.stamp = Stamp(seconds)
+
+class JointState(object):
+    def __init__(self, seconds, name, effort):
+        self.header = Header(seconds)
+        self.name = name
+        self.effort = effort
+
+class TestJointIndexRegistry(unittest.TestCase):
+    def test_shared(self):
+        registry = JointIndexRegistry.get("/test_joint_index_registry/joint_states")
+        self.assertTrue(JointIndexRegistry.get("/test_joint_index_registry/joint_states") is registry)
+        self.assertFalse(JointIndexRegistry.get("/test_joint_index_registry/joint_0s/joint_states") is registry)
+
+    def test_update(self):
+        registry = JointIndexRegistry("/joint_states")
+        self.assertTrue(registry.index("FFJ3") is None)
+
+        indexes = registry.update(("FFJ3", "MFJ3"))
+        self.assertEqual(indexes, {"FFJ3": 0, "MFJ3": 1})
+        self.assertEqual((registry.index("MFJ3"), registry.index("RFJ3")), (1, None))
+        #the same names, as a list or a tuple: the mapping isn't rebuilt
+        self.assertTrue(registry.update(["FFJ3", "MFJ3"]) is indexes)
+
+        registry.update(["RFJ3", "FFJ3"])
+        self.assertEqual((registry.index("FFJ3"), registry.index("MFJ3"), registry.index("RFJ3")), (1, None, 0))
+
+    def test_plot_buffers(self):
+        topic = "/test_joint_index_registry/plotted/joint_states"
+        first = TopicBuffer(topic)
+        second = TopicBuffer(topic)
+        mfj3 = first.column("effort", "MFJ3")
+        rfj3 = second.column("effort", "RFJ3")
+        self.assertTrue(first.joint_indexes is JointIndexRegistry.get(topic))
+
+        first.callback(JointState(1.0, ["FFJ3", "MFJ3"], [10.0, 20.0]))
+        #the order of the joints changed
+        first.callback(JointState(2.0, ["MFJ3", "RFJ3", "FFJ3"], [21.0, 31.0, 11.0]))
+        second.callback(JointState(2.0, ["MFJ3", "RFJ3", "FFJ3"], [21.0, 31.0, 11.0]))
+        first.flush()
+        second.flush()
+        self.assertEqual(list(first.window(mfj3, 0.0)[1]), [20.0, 21.0])
+        self.assertEqual(list(second.window(rfj3, 0.0)[1]), [31.0])
+        self.assertEqual(JointIndexRegistry.get(topic).index("FFJ3"), 2)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_controller_tuner", "test_joint_index_registry", TestJointIndexRegistry)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import yaml
+
+from sr_gui_controller_tuner import pid_loader_and_saver
+from sr_gui_controller_tuner.pid_loader_and_saver import PidLoader, PidSaver
+
+CONFIG = """sh_ffj3_mixed_position_velocity_controller:
+  joint: FFJ3
+  position_pid: {d: 0.0, i: 0.0, p: 1.0}
+  velocity_pid: {d: 0.0, i: 0.5, p: 2.0}
+sh_ffj3_effort_controller:
+  joint: FFJ3
+  max_force: 100
+sh_ffj3_position_controller:
+  joint: FFJ3
+  pid: {d: 0.0, i: 0.0, p: 3.0}
+"""
+
+class TestPidSaver(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "controllers.yaml")
+        f = open(self.path, "w")
+        f.write(CONFIG)
+        f.close()
+        os.chmod(self.path, 0o664)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self, path = None):
+        f = open(path or self.path)
+        try:
+            return yaml.safe_load(f)
+        finally:
+            f.close()
+
+    def test_save_settings(self):
+        PidSaver(self.path).save_settings(["sh_ffj3_position_controller", "pid"], {"p": 4.0, "d": 0.5})
+        config = self.load()
+        self.assertEqual(config["sh_ffj3_position_controller"]["pid"], {"d": 0.5, "i": 0.0, "p": 4.0})
+        self.assertEqual(config["sh_ffj3_effort_controller"], {"joint": "FFJ3", "max_force": 100})
+
+    def test_save_all_settings(self):
+        PidSaver(self.path).save_all_settings([
+            (["sh_ffj3_mixed_position_velocity_controller"], {"pos/p": 5.0, "vel/i": 0.25}),
+            (["sh_ffj3_effort_controller"], {"max_force": 200})])
+        config = self.load()
+        mixed = config["sh_ffj3_mixed_position_velocity_controller"]
+        self.assertEqual(mixed["position_pid"]["p"], 5.0)
+        self.assertEqual(mixed["velocity_pid"]["i"], 0.25)
+        self.assertEqual(config["sh_ffj3_effort_controller"]["max_force"], 200)
+
+    def test_backup(self):
+        PidSaver(self.path, backup = True).save_settings(["sh_ffj3_effort_controller"], {"max_force": 200})
+        self.assertEqual(self.load(self.path + ".bak"), yaml.safe_load(CONFIG))
+        self.assertEqual(self.load()["sh_ffj3_effort_controller"]["max_force"], 200)
+
+    def test_no_backup(self):
+        PidSaver(self.path).save_settings(["sh_ffj3_effort_controller"], {"max_force": 200})
+        self.assertFalse(os.path.exists(self.path + ".bak"))
+
+    def test_mode_kept(self):
+        PidSaver(self.path).save_settings(["sh_ffj3_effort_controller"], {"max_force": 200})
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o664)
+
+    def test_unchanged_on_error(self):
+        saver = PidSaver(self.path, backup = True)
+        #the second controller isn't in the file: nothing is written
+        self.assertRaises(KeyError, saver.save_all_settings, [
+            (["sh_ffj3_effort_controller"], {"max_force": 200}),
+            (["sh_ffj4_effort_controller"], {"max_force": 200})])
+        f = open(self.path)
+        self.assertEqual(f.read(), CONFIG)
+        f.close()
+        self.assertEqual(os.listdir(self.directory), ["controllers.yaml"])
+
+    def test_no_temporary_file_left(self):
+        saver = PidSaver(self.path)
+        for p in range(3):
+            saver.save_settings(["sh_ffj3_position_controller", "pid"], {"p": float(p)})
+        self.assertEqual(os.listdir(self.directory), ["controllers.yaml"])
+
+class TestPidLoader(unittest.TestCase):
+    def setUp(self):
+        self.parameters = yaml.safe_load(CONFIG)
+        self.fetches = 0
+        self.get_param = pid_loader_and_saver.rospy.get_param
+        pid_loader_and_saver.rospy.get_param = self.fetch_parameters
+
+    def tearDown(self):
+        pid_loader_and_saver.rospy.get_param = self.get_param
+
+    def fetch_parameters(self, param_name):
+        self.assertEqual(param_name, "/")
+        self.fetches += 1
+        return yaml.safe_load(yaml.safe_dump(self.parameters))
+
+    def test_get_settings(self):
+        loader = PidLoader()
+        self.assertEqual(loader.get_settings("/sh_ffj3_position_controller/pid"), {"d": 0.0, "i": 0.0, "p": 3.0})
+        self.assertEqual(loader.get_settings(["/sh_ffj3_mixed_position_velocity_controller/position_pid",
+                                              "/sh_ffj3_mixed_position_velocity_controller/velocity_pid"]),
+                         {"pos/d": 0.0, "pos/i": 0.0, "pos/p": 1.0, "vel/d": 0.0, "vel/i": 0.5, "vel/p": 2.0})
+        self.assertEqual(loader.get_settings("/sh_ffj4_position_controller/pid"), -1)
+        self.assertEqual(loader.get_settings("/sh_ffj3_effort_controller/max_force/p"), -1)
+        #a single fetch of the whole parameter server
+        self.assertEqual(self.fetches, 1)
+
+    def test_copies(self):
+        loader = PidLoader()
+        settings = loader.get_settings("/sh_ffj3_position_controller/pid")
+        settings["p"] = 10.0
+        self.assertEqual(loader.get_settings("/sh_ffj3_position_controller/pid")["p"], 3.0)
+
+    def test_ttl(self):
+        loader = PidLoader(ttl = 3600.0)
+        loader.get_settings("/sh_ffj3_position_controller/pid")
+        self.parameters["sh_ffj3_position_controller"]["pid"]["p"] = 6.0
+        self.assertEqual(loader.get_settings("/sh_ffj3_position_controller/pid")["p"], 3.0)
+        loader.refresh()
+        self.assertEqual(loader.get_settings("/sh_ffj3_position_controller/pid")["p"], 6.0)
+        self.assertEqual(self.fetches, 2)
+
+        loader.ttl = 0.0
+        loader.snapshot_time -= 1.0
+        loader.get_settings("/sh_ffj3_position_controller/pid")
+        self.assertEqual(self.fetches, 3)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_controller_tuner", "test_pid_loader_and_saver", TestPidSaver)
+    rosunit.unitrun("sr_gui_controller_tuner", "test_pid_loader_and_saver", TestPidLoader)
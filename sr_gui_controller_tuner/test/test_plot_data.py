@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import threading
+import time
+import unittest
+
+import numpy
+
+from sr_gui_controller_tuner import plot_data
+from sr_gui_controller_tuner.plot_data import TopicBuffer, decimate
+
+class Stamp(object):
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def is_zero(self):
+        return self.seconds == 0.0
+
+    def to_sec(self):
+        return self.seconds
+
+class Header(object):
+    def __init__(self, seconds):
+        self.stamp = Stamp(seconds)
+
+class ControllerState(object):
+    """
+    The fields of a controller state message used by the plots
+    """
+    def __init__(self, seconds, set_point, process_value):
+        self.header = Header(seconds)
+        self.set_point = set_point
+        self.process_value = process_value
+        self.effort = [set_point, process_value]
+
+class TestTopicBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buffer = TopicBuffer("/sh_ffj3_position_controller/state", capacity = 8)
+        self.set_point = self.buffer.column("set_point")
+
+    def receive(self, first, last):
+        for index in range(first, last):
+            self.buffer.callback(ControllerState(float(index), 10.0 * index, -index))
+
+    def test_empty(self):
+        self.assertTrue(self.buffer.latest_time() is None)
+        times, values = self.buffer.window(self.set_point, 0.0)
+        self.assertEqual((len(times), len(values)), (0, 0))
+
+    def test_pending_until_flush(self):
+        self.receive(1, 4)
+        self.assertEqual(self.buffer.count, 0)
+        self.buffer.flush()
+        self.assertEqual(self.buffer.count, 3)
+        self.assertEqual(self.buffer.latest_time(), 3.0)
+
+    def test_ring_wrap(self):
+        for first in range(1, 21, 3):
+            self.receive(first, first + 3)
+            self.buffer.flush()
+        self.assertEqual(self.buffer.count, 21)
+        self.assertEqual(self.buffer.latest_time(), 21.0)
+        times, values = self.buffer.window(self.set_point, 0.0)
+        #the last capacity samples, oldest first
+        numpy.testing.assert_array_equal(times, numpy.arange(14, 22))
+        numpy.testing.assert_array_equal(values, 10.0 * numpy.arange(14, 22))
+
+        times, values = self.buffer.window(self.set_point, 19.5)
+        numpy.testing.assert_array_equal(times, [20.0, 21.0])
+
+    def test_more_than_capacity(self):
+        self.receive(1, 6)
+        self.buffer.flush()
+        self.receive(6, 26)
+        self.buffer.flush()
+        self.assertEqual(self.buffer.count, 25)
+        times, values = self.buffer.window(self.set_point, 0.0)
+        numpy.testing.assert_array_equal(times, numpy.arange(18, 26))
+
+    def test_columns(self):
+        self.receive(1, 3)
+        self.buffer.flush()
+        self.receive(3, 4)
+        process_value = self.buffer.column("process_value")
+        effort = self.buffer.column("effort", 1)
+        self.assertEqual(self.buffer.column("set_point"), self.set_point)
+        missing = self.buffer.column("command")
+        out_of_range = self.buffer.column("effort", 2)
+        self.receive(4, 6)
+        self.buffer.flush()
+
+        #the samples received before a column was added have no value for it
+        times, values = self.buffer.window(process_value, 0.0)
+        numpy.testing.assert_array_equal(values, [numpy.nan, numpy.nan, numpy.nan, -4.0, -5.0])
+        numpy.testing.assert_array_equal(self.buffer.window(effort, 3.5)[1], [-4.0, -5.0])
+        numpy.testing.assert_array_equal(self.buffer.window(self.set_point, 0.0)[1], [10.0, 20.0, 30.0, 40.0, 50.0])
+        self.assertTrue(numpy.isnan(self.buffer.window(missing, 0.0)[1]).all())
+        self.assertTrue(numpy.isnan(self.buffer.window(out_of_range, 0.0)[1]).all())
+
+    def test_release_column(self):
+        self.buffer.column("process_value")
+        self.buffer.column("process_value")
+        self.buffer.column("effort", 1)
+        self.receive(1, 3)
+        self.buffer.flush()
+        self.receive(3, 4)
+
+        #still used by another plot
+        self.buffer.release_column("process_value")
+        self.assertEqual(self.buffer.fields, [("set_point", None), ("process_value", None), ("effort", 1)])
+        self.buffer.release_column("process_value")
+        self.assertEqual(self.buffer.fields, [("set_point", None), ("effort", 1)])
+        self.assertEqual(self.buffer.values.shape, (8, 2))
+        self.receive(4, 5)
+        self.buffer.flush()
+
+        #the pending sample was flushed with the column
+        effort = self.buffer.fields.index(("effort", 1))
+        numpy.testing.assert_array_equal(self.buffer.window(effort, 0.0)[1], [-1.0, -2.0, -3.0, -4.0])
+        numpy.testing.assert_array_equal(self.buffer.window(self.set_point, 0.0)[1], [10.0, 20.0, 30.0, 40.0])
+
+    def test_time_back(self):
+        self.receive(1, 6)
+        self.buffer.flush()
+        #the bag restarted between two flushes
+        self.receive(2, 4)
+        self.buffer.flush()
+        times, values = self.buffer.window(self.set_point, 0.0)
+        numpy.testing.assert_array_equal(times, [2.0, 3.0])
+        self.assertEqual(self.buffer.latest_time(), 3.0)
+
+        #and within the samples of a flush
+        self.receive(4, 7)
+        self.receive(1, 3)
+        self.buffer.flush()
+        times, values = self.buffer.window(self.set_point, 0.0)
+        numpy.testing.assert_array_equal(times, [1.0, 2.0])
+        numpy.testing.assert_array_equal(values, [10.0, 20.0])
+
+class Subscriber(object):
+    def __init__(self, topic, msg_class, callback, queue_size = None):
+        self.topic = topic
+        self.msg_class = msg_class
+
+    def unregister(self):
+        pass
+
+class TestConnect(unittest.TestCase):
+    def setUp(self):
+        #a master answering when told to
+        self.answer = threading.Event()
+        self.published = False
+        self.lookups = 0
+        self.replaced = (plot_data.rostopic.get_topic_class, plot_data.rospy.Subscriber, plot_data.CONNECT_RETRY)
+        plot_data.rostopic.get_topic_class = self.get_topic_class
+        plot_data.rospy.Subscriber = Subscriber
+        plot_data.CONNECT_RETRY = 0.0
+        self.buffer = TopicBuffer("/sh_ffj3_position_controller/state")
+
+    def tearDown(self):
+        self.answer.set()
+        if self.buffer.lookup is not None:
+            self.buffer.lookup.join()
+        plot_data.rostopic.get_topic_class, plot_data.rospy.Subscriber, plot_data.CONNECT_RETRY = self.replaced
+
+    def get_topic_class(self, topic):
+        self.lookups += 1
+        self.answer.wait()
+        if self.published:
+            return ControllerState, topic, None
+        return None, None, None
+
+    def test_does_not_block(self):
+        start = time.time()
+        self.assertFalse(self.buffer.connect())
+        #still waiting for the master
+        self.assertFalse(self.buffer.connect())
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(self.lookups, 1)
+        self.assertTrue(self.buffer.subscriber is None)
+
+        self.published = True
+        self.answer.set()
+        self.buffer.lookup.join()
+        self.assertTrue(self.buffer.connect())
+        self.assertEqual((self.buffer.subscriber.topic, self.buffer.subscriber.msg_class),
+                         ("/sh_ffj3_position_controller/state", ControllerState))
+        self.assertEqual(self.lookups, 1)
+
+    def test_not_published(self):
+        self.answer.set()
+        self.assertFalse(self.buffer.connect())
+        self.buffer.lookup.join()
+        self.assertFalse(self.buffer.connect())
+        self.buffer.lookup.join()
+        self.assertEqual(self.lookups, 2)
+
+        self.published = True
+        self.assertFalse(self.buffer.connect())
+        self.buffer.lookup.join()
+        self.assertTrue(self.buffer.connect())
+
+class TestDecimate(unittest.TestCase):
+    def test_few_samples(self):
+        times = numpy.arange(10.0)
+        values = numpy.arange(10.0)
+        decimated_times, decimated_values = decimate(times, values, 0.0, 10.0, 5)
+        self.assertTrue(decimated_times is times and decimated_values is values)
+
+    def test_min_max(self):
+        times = numpy.linspace(0.0, 10.0, 100001)
+        values = numpy.sin(times)
+        values[5] = 5.0
+        values[50000] = -5.0
+        values[7] = numpy.nan
+        decimated_times, decimated_values = decimate(times, values, 0.0, 10.0, 100)
+
+        #the min and max of each column, the samples at the end in the last one
+        self.assertEqual(len(decimated_times), 200)
+        self.assertEqual(len(decimated_values), 200)
+        self.assertEqual((decimated_values.max(), decimated_values.min()), (5.0, -5.0))
+        self.assertFalse(numpy.isnan(decimated_values).any())
+        self.assertTrue((numpy.diff(decimated_times) >= 0.0).all())
+        self.assertEqual(decimated_values[1], 5.0)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_controller_tuner", "test_plot_data", TestTopicBuffer)
+    rosunit.unitrun("sr_gui_controller_tuner", "test_plot_data", TestConnect)
+    rosunit.unitrun("sr_gui_controller_tuner", "test_plot_data", TestDecimate)
@@ -26,10 +26,10 @@ import QtGui
 from QtGui import *
 
 from sr_hand.Grasp import Grasp
-from sr_hand.grasps_interpoler import GraspInterpoler
 from sr_hand.grasps_parser import GraspParser
 
 from sr_hand.shadowhand_ros import ShadowHand_ROS
+from sr_gui_movement_recorder.interpolation import GraspSpline
 
 class JointSelecter(QtGui.QWidget):
     """
@@ -429,8 +429,8 @@ class SrGuiGraspController(Plugin):
                 QMessageBox.warning(self._widget, "Warning", "Could not read current grasp.\nCheck that the hand controllers are running.\nThen click \"Set Reference\"")
                 return
 
-        self.grasp_interpoler_1 = GraspInterpoler(self.grasp_from_chooser.grasp, self.current_grasp)
-        self.grasp_interpoler_2 = GraspInterpoler(self.current_grasp, self.grasp_to_chooser.grasp)
+        self.grasp_interpoler_1 = GraspSpline(self.grasp_from_chooser.grasp, self.current_grasp)
+        self.grasp_interpoler_2 = GraspSpline(self.current_grasp, self.grasp_to_chooser.grasp)
 
         self.grasp_slider.slider.setValue(0)
 
@@ -445,8 +445,8 @@ class SrGuiGraspController(Plugin):
             QMessageBox.warning(self._widget, "Warning", "Could not read current grasp.\nCheck that the hand controllers are running.\nThen click \"Set Reference\"")
             return
         
-        self.grasp_interpoler_1 = GraspInterpoler(self.grasp_from_chooser.grasp, self.current_grasp)
-        self.grasp_interpoler_2 = GraspInterpoler(self.current_grasp, self.grasp_to_chooser.grasp)
+        self.grasp_interpoler_1 = GraspSpline(self.grasp_from_chooser.grasp, self.current_grasp)
+        self.grasp_interpoler_2 = GraspSpline(self.current_grasp, self.grasp_to_chooser.grasp)
 
     def interpolate_grasps(self, value):
         """
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os, threading
+
+from sr_hand.grasps_parser import GraspParser
+
+class GraspLibrary(object):
+    """
+    A cached grasps file, shared by the whole process (one instance per
+    file). The file is only parsed again when its modification time or
+    size changes.
+    """
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.grasps = {}
+        self.names = ()
+        #incremented each time the grasps are reloaded
+        self.version = 0
+
+    @classmethod
+    def get(cls, path):
+        """
+        The library for the given grasps file
+        """
+        path = os.path.realpath(path)
+        with cls.instances_lock:
+            library = cls.instances.get(path)
+            if library is None:
+                library = cls(path)
+                cls.instances[path] = library
+        library.refresh()
+        return library
+
+    @classmethod
+    def for_parser(cls, grasp_parser):
+        """
+        The library for the file of an already parsed sr_hand GraspParser
+        (reusing its grasps instead of parsing the file again)
+        """
+        path = os.path.realpath(grasp_parser.xml_path)
+        with cls.instances_lock:
+            library = cls.instances.get(path)
+            if library is None:
+                library = cls(path)
+                library.set_grasps_(grasp_parser.grasps, library.file_stamp_())
+                cls.instances[path] = library
+        library.refresh()
+        return library
+
+    def file_stamp_(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def set_grasps_(self, grasps, stamp):
+        self.grasps = grasps
+        self.names = tuple(sorted(grasps.keys()))
+        self.stamp = stamp
+        self.version += 1
+
+    def refresh(self):
+        """
+        Reparse the file if it changed. Returns True if it was reloaded.
+        """
+        with self.lock:
+            stamp = self.file_stamp_()
+            if stamp is None or stamp == self.stamp:
+                return False
+            grasp_parser = GraspParser()
+            grasp_parser.parse_tree(self.path)
+            self.set_grasps_(grasp_parser.grasps, stamp)
+            return True
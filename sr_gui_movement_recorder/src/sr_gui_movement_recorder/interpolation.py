@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+
+LINEAR = "linear"
+MINIMUM_JERK = "minimum_jerk"
+CUBIC = "cubic"
+#cubic blends through the steps without stopping (unless the step has a pause)
+PROFILES = (LINEAR, MINIMUM_JERK, CUBIC)
+
+#the powers of the fraction of the segment, for evaluating the quintic polynomials
+POWERS = numpy.arange(6)
+
+class SegmentSpline(object):
+    """
+    Quintic polynomials for all the joints of a list of segments, stored
+    as a (segments, 6, joints) table of coefficients in the fraction u
+    (0 to 1) of the segment: p(u) = c0 + c1 u + ... + c5 u^5.
+
+    The polynomials are built from the positions at both ends of the
+    segments and, optionally, the velocities (cubic Hermite) and the
+    accelerations (quintic Hermite) at both ends, in units per second.
+
+    NaN positions mark joints which are not commanded: a joint which is only
+    commanded at the end of a segment appears half way through it, a joint
+    which is only commanded at the start disappears half way through.
+    """
+    def __init__(self, start_positions, end_positions, durations,
+                 start_velocities = None, end_velocities = None,
+                 start_accelerations = None, end_accelerations = None):
+        start = numpy.asarray(start_positions, dtype = numpy.float64)
+        end = numpy.asarray(end_positions, dtype = numpy.float64)
+        durations = numpy.asarray(durations, dtype = numpy.float64)[:, numpy.newaxis]
+        self.start_positions = start
+        self.end_positions = end
+
+        def scaled(values, power):
+            #velocities and accelerations in units per segment
+            if values is None:
+                return numpy.zeros(start.shape)
+            return numpy.nan_to_num(numpy.asarray(values, dtype = numpy.float64)) * durations ** power
+
+        delta = end - start
+        v0 = scaled(start_velocities, 1)
+        v1 = scaled(end_velocities, 1)
+        a0 = scaled(start_accelerations, 2)
+        a1 = scaled(end_accelerations, 2)
+
+        coefficients = numpy.zeros((len(start), 6) + start.shape[1:])
+        coefficients[:, 0] = start
+        if start_accelerations is not None or end_accelerations is not None:
+            coefficients[:, 1] = v0
+            coefficients[:, 2] = 0.5 * a0
+            coefficients[:, 3] = 10.0 * delta - 6.0 * v0 - 4.0 * v1 - 1.5 * a0 + 0.5 * a1
+            coefficients[:, 4] = -15.0 * delta + 8.0 * v0 + 7.0 * v1 + 1.5 * a0 - a1
+            coefficients[:, 5] = 6.0 * delta - 3.0 * v0 - 3.0 * v1 - 0.5 * a0 + 0.5 * a1
+        elif start_velocities is not None or end_velocities is not None:
+            coefficients[:, 1] = v0
+            coefficients[:, 2] = 3.0 * delta - 2.0 * v0 - v1
+            coefficients[:, 3] = -2.0 * delta + v0 + v1
+        else:
+            coefficients[:, 1] = delta
+        coefficients.flags.writeable = False
+        self.coefficients = coefficients
+
+    def __len__(self):
+        return len(self.coefficients)
+
+    def evaluate(self, segment, fraction):
+        """
+        The positions of all the joints at a given fraction of a segment
+        """
+        positions = numpy.dot(float(fraction) ** POWERS, self.coefficients[segment])
+        if fraction >= 0.5:
+            return numpy.where(numpy.isnan(positions), self.end_positions[segment], positions)
+        return numpy.where(numpy.isnan(positions), self.start_positions[segment], positions)
+
+    def evaluate_rows(self, segments, fractions):
+        """
+        The positions for a whole array of (segment, fraction) ticks,
+        one row per tick
+        """
+        fractions = numpy.asarray(fractions, dtype = numpy.float64)[:, numpy.newaxis]
+        coefficients = self.coefficients
+        #Horner's scheme, one pass per coefficient over all the ticks
+        positions = coefficients[segments, 5].copy()
+        for order in range(4, -1, -1):
+            positions *= fractions
+            positions += coefficients[segments, order]
+        missing = numpy.isnan(positions)
+        if numpy.any(missing):
+            half = numpy.where(fractions >= 0.5, self.end_positions[segments], self.start_positions[segments])
+            positions[missing] = half[missing]
+        return positions
+
+def blend_velocities(key_positions, durations, holds):
+    """
+    Velocities at the keys for a cubic blending through them: the mean of
+    the slopes on both sides, limited so that the joints never overshoot a
+    key. The velocity is 0 at the first and last keys, where the direction
+    of a joint changes and at the keys flagged in holds (the steps with a
+    pause). durations[i] is the time to go from key i to key i + 1.
+    """
+    key_positions = numpy.asarray(key_positions, dtype = numpy.float64)
+    velocities = numpy.zeros(key_positions.shape)
+    if len(key_positions) < 3:
+        return velocities
+
+    durations = numpy.asarray(durations, dtype = numpy.float64)[:, numpy.newaxis]
+    with numpy.errstate(divide = "ignore", invalid = "ignore"):
+        slopes = numpy.diff(key_positions, axis = 0) / durations
+    slopes[~numpy.isfinite(slopes)] = 0.0
+
+    before = slopes[:-1]
+    after = slopes[1:]
+    blended = 0.5 * (before + after)
+    #same direction on both sides, and never more than 3 times the slowest side (Fritsch-Carlson)
+    limit = 3.0 * numpy.minimum(numpy.abs(before), numpy.abs(after))
+    blended = numpy.clip(blended, -limit, limit)
+    blended[before * after <= 0.0] = 0.0
+    blended[numpy.asarray(holds, dtype = bool)[1:-1]] = 0.0
+    velocities[1:-1] = blended
+    return velocities
+
+def profile_spline(profile, key_positions, durations, holds = None):
+    """
+    The SegmentSpline going through the keys (one segment of durations[i]
+    seconds between key i and key i + 1) with the given profile:
+     - linear: constant velocity, stopping and starting at each key
+     - minimum_jerk: zero velocity and acceleration at each key
+     - cubic: continuous velocity through the keys (see blend_velocities)
+
+    Returns the spline, and the velocities and accelerations at the
+    keys (None when the profile doesn't constrain them).
+    """
+    if profile not in PROFILES:
+        raise ValueError("Unknown interpolation profile: " + str(profile))
+    key_positions = numpy.asarray(key_positions, dtype = numpy.float64)
+
+    velocities = None
+    accelerations = None
+    if profile == MINIMUM_JERK:
+        velocities = numpy.zeros(key_positions.shape)
+        accelerations = numpy.zeros(key_positions.shape)
+    elif profile == CUBIC:
+        if holds is None:
+            holds = numpy.zeros(len(key_positions), dtype = bool)
+        velocities = blend_velocities(key_positions, durations, holds)
+
+    def starts(values):
+        return None if values is None else values[:-1]
+    def ends(values):
+        return None if values is None else values[1:]
+
+    spline = SegmentSpline(key_positions[:-1], key_positions[1:], durations,
+                           starts(velocities), ends(velocities), starts(accelerations), ends(accelerations))
+    return spline, velocities, accelerations
+
+class GraspSpline(object):
+    """
+    Interpolates all the joints from one sr_hand Grasp to another with a
+    single NumPy expression, a drop-in replacement for the sr_hand
+    GraspInterpoler: interpolate(percentage) returns the dictionary of
+    targets.
+    """
+    def __init__(self, grasp_from, grasp_to, profile = LINEAR):
+        joints_from = grasp_from.joints_and_positions
+        joints_to = grasp_to.joints_and_positions
+        self.joint_names = sorted(set(joints_from.keys()) | set(joints_to.keys()))
+        positions = numpy.array([[joints_from.get(name, numpy.nan) for name in self.joint_names],
+                                 [joints_to.get(name, numpy.nan) for name in self.joint_names]], dtype = numpy.float64)
+        self.spline = profile_spline(profile, positions, [1.0])[0]
+
+    def interpolate(self, percentage):
+        positions = self.spline.evaluate(0, min(100.0, max(0.0, float(percentage))) / 100.0).tolist()
+        return dict((name, position) for name, position in zip(self.joint_names, positions)
+                    if position == position)
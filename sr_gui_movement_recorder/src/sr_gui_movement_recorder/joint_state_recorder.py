@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json, threading, rospy
+
+import numpy
+from numpy.lib.format import open_memmap
+
+from sensor_msgs.msg import JointState
+
+#10 minutes at 1kHz
+DEFAULT_CAPACITY = 600000
+
+def recording_dtype(nb_joints):
+    return numpy.dtype([("stamp", numpy.float64),
+                        ("position", numpy.float64, (nb_joints,)),
+                        ("velocity", numpy.float64, (nb_joints,)),
+                        ("effort", numpy.float64, (nb_joints,))])
+
+class JointStateRecording(object):
+    """
+    A ring buffer of joint states stored in a memory-mapped .npy file,
+    the joint names being saved next to it in a .json file.
+
+    The file is preallocated with a fixed capacity: once full, the oldest
+    samples are overwritten. Rows which were never written have a 0 stamp,
+    so the order of the samples can be recovered even if the recording
+    wasn't closed properly.
+    """
+    def __init__(self, filename, joint_names, capacity = DEFAULT_CAPACITY, buffer = None):
+        self.filename = filename
+        self.joint_names = tuple(joint_names)
+        if buffer is None:
+            buffer = open_memmap(filename, mode = "w+", dtype = recording_dtype(len(self.joint_names)),
+                                 shape = (capacity,))
+            self.write_header_()
+        self.buffer = buffer
+        self.capacity = len(buffer)
+
+        #views on the fields, so that appending doesn't create any row object
+        self.stamps = buffer["stamp"]
+        self.positions = buffer["position"]
+        self.velocities = buffer["velocity"]
+        self.efforts = buffer["effort"]
+
+        self.count = int(numpy.count_nonzero(self.stamps))
+        if self.count < self.capacity:
+            self.index = self.count
+        else:
+            self.index = int(numpy.argmin(self.stamps))
+
+    @staticmethod
+    def header_filename(filename):
+        return filename + ".json"
+
+    def write_header_(self):
+        with open(self.header_filename(self.filename), "w") as header:
+            json.dump({"joint_names": list(self.joint_names)}, header)
+
+    @classmethod
+    def open(cls, filename, mode = "r"):
+        """
+        Opens an existing recording (read only by default)
+        """
+        with open(cls.header_filename(filename)) as header:
+            joint_names = json.load(header)["joint_names"]
+        return cls(filename, joint_names, buffer = numpy.load(filename, mmap_mode = mode))
+
+    def __len__(self):
+        return self.count
+
+    def append(self, stamp, position, velocity = None, effort = None):
+        index = self.index
+        self.stamps[index] = stamp
+        self.positions[index] = position
+        #some publishers leave the velocities / efforts empty
+        if velocity is not None and len(velocity) != 0:
+            self.velocities[index] = velocity
+        if effort is not None and len(effort) != 0:
+            self.efforts[index] = effort
+
+        self.index = index + 1
+        if self.index == self.capacity:
+            self.index = 0
+        if self.count < self.capacity:
+            self.count += 1
+
+    def samples(self):
+        """
+        The recorded samples in chronological order (a view on the
+        file unless the ring buffer has wrapped around)
+        """
+        if self.count < self.capacity:
+            return self.buffer[:self.count]
+        return numpy.concatenate((self.buffer[self.index:], self.buffer[:self.index]))
+
+    def flush(self):
+        if hasattr(self.buffer, "flush"):
+            self.buffer.flush()
+
+    def close(self):
+        self.flush()
+        self.buffer = self.stamps = self.positions = self.velocities = self.efforts = None
+
+class JointStateRecorder(object):
+    """
+    Records all the messages published on a JointState topic into a
+    JointStateRecording. The recording is created when the first message
+    is received, as it gives the joint names.
+    """
+    def __init__(self, filename, capacity = DEFAULT_CAPACITY, topic = "joint_states"):
+        self.filename = filename
+        self.capacity = capacity
+        self.recording = None
+        self.recorded_names = None
+        self.dropped = 0
+        self.mutex = threading.Lock()
+
+        #a large queue and buffer so that we don't lose any message at 1kHz
+        self.subscriber = rospy.Subscriber(topic, JointState, self.callback_, queue_size = 1000,
+                                           buff_size = 2 ** 24, tcp_nodelay = True)
+
+    def callback_(self, msg):
+        with self.mutex:
+            if self.subscriber is None:
+                return
+            if self.recording is None:
+                self.recording = JointStateRecording(self.filename, msg.name, self.capacity)
+                self.recorded_names = list(msg.name)
+            elif msg.name != self.recorded_names:
+                #not the joints we're recording
+                self.dropped += 1
+                return
+            stamp = msg.header.stamp.to_sec()
+            if stamp == 0.0:
+                stamp = rospy.get_time()
+            self.recording.append(stamp, msg.position, msg.velocity, msg.effort)
+
+    def stop(self):
+        """
+        Stops recording and returns the recording (None if no message
+        was received)
+        """
+        with self.mutex:
+            self.subscriber.unregister()
+            self.subscriber = None
+            if self.recording is not None:
+                self.recording.flush()
+            return self.recording
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import xml.etree.ElementTree as ET
+
+import numpy
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec
+from sr_gui_movement_recorder.movement_io import indent
+
+def tolerance_array(joint_names, tolerance, joint_tolerances = None):
+    """
+    Per joint tolerances: tolerance for all the joints except the
+    ones given in the joint_tolerances dictionary.
+    """
+    tolerances = numpy.empty(len(joint_names))
+    tolerances.fill(float(tolerance))
+    if joint_tolerances is not None:
+        for index, name in enumerate(joint_names):
+            if name in joint_tolerances:
+                tolerances[index] = float(joint_tolerances[name])
+    if numpy.any(tolerances <= 0.0):
+        raise ValueError("The tolerances must be positive")
+    return tolerances
+
+def douglas_peucker(times, positions, tolerances):
+    """
+    Multi-dimensional Ramer-Douglas-Peucker in joint space.
+
+    Returns the sorted indexes of the samples to keep so that, for each
+    joint, linearly interpolating the kept samples in time never deviates
+    from the samples by more than the joint tolerance. Each segment is
+    checked with a single vectorized pass over its samples.
+
+    Of consecutive samples with the same time (duplicated stamps in a
+    recording), only the last one can be kept.
+    """
+    nb_samples = len(times)
+    if nb_samples <= 2:
+        return numpy.arange(nb_samples)
+
+    #there is no interpolating between samples with the same time
+    unique = numpy.flatnonzero(numpy.append(times[1:] != times[:-1], True))
+    if len(unique) < nb_samples:
+        return unique[douglas_peucker(times[unique], positions[unique], tolerances)]
+
+    #positions in tolerance units: a sample is off if any joint deviates by more than 1
+    scaled = positions / tolerances
+    keep = numpy.zeros(nb_samples, dtype = bool)
+    keep[0] = keep[-1] = True
+
+    segments = [(0, nb_samples - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        fractions = times[first + 1:last] - times[first]
+        fractions /= times[last] - times[first]
+        errors = scaled[first + 1:last] - scaled[first]
+        errors -= numpy.outer(fractions, scaled[last] - scaled[first])
+        numpy.abs(errors, out = errors)
+        worst = errors.max(axis = 1)
+        index = int(numpy.argmax(worst))
+        if worst[index] > 1.0:
+            split = first + 1 + index
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+
+    return numpy.flatnonzero(keep)
+
+def keyframes_to_steps(times, positions, joint_names, tolerances, grasp_prefix = "keyframe"):
+    """
+    Converts keyframes to a list of StepSpec and the dictionary of the
+    generated grasps (joint positions indexed by grasp name).
+
+    The interpolation time of a step is the time to reach the next keyframe.
+    Keyframes where the hand doesn't move (within the tolerances) are merged
+    into the pause time of the step leading to them. The times of the
+    keyframes are rounded to the ms before taking their differences, so the
+    rounding doesn't build up over the steps of a long recording.
+    """
+    steps = []
+    grasps = {}
+
+    def add_step(key):
+        grasp_name = "%s_%04d" % (grasp_prefix, len(steps))
+        grasps[grasp_name] = dict(zip(joint_names, numpy.round(positions[key], 3).tolist()))
+        steps.append([grasp_name, 0.0, 1.0])
+
+    add_step(0)
+    holds = numpy.all(numpy.abs(numpy.diff(positions, axis = 0)) <= tolerances, axis = 1)
+    durations = numpy.diff(numpy.round(times - times[0], 3))
+    for segment, (hold, duration) in enumerate(zip(holds.tolist(), durations.tolist())):
+        if hold:
+            #a hold at the very beginning is dropped
+            if len(steps) > 1:
+                steps[-2][1] += duration
+        else:
+            steps[-1][2] = duration
+            add_step(segment + 1)
+
+    return [StepSpec(grasp_name, grasps[grasp_name], round(pause_time, 3), round(interpolation_time, 3), -1, 0)
+            for grasp_name, pause_time, interpolation_time in steps], grasps
+
+def extract_keyframes(times, positions, joint_names, tolerance = 1.0, joint_tolerances = None,
+                      grasp_prefix = "keyframe"):
+    """
+    Reduces a dense trajectory (positions in degrees, one row per sample)
+    to the smallest list of steps reproducing it within the tolerances
+    (in degrees). Returns the steps and the generated grasps.
+    """
+    times = numpy.asarray(times, dtype = numpy.float64)
+    positions = numpy.asarray(positions, dtype = numpy.float64)
+    tolerances = tolerance_array(joint_names, tolerance, joint_tolerances)
+
+    keys = douglas_peucker(times, positions, tolerances)
+    return keyframes_to_steps(times[keys], positions[keys], joint_names, tolerances, grasp_prefix)
+
+def extract_keyframes_from_recording(recording, tolerance = 1.0, joint_tolerances = None,
+                                     grasp_prefix = "keyframe"):
+    """
+    Same as extract_keyframes for a JointStateRecording (in radians)
+    """
+    samples = recording.samples()
+    return extract_keyframes(samples["stamp"] - samples["stamp"][0], numpy.degrees(samples["position"]),
+                             recording.joint_names, tolerance, joint_tolerances, grasp_prefix)
+
+def save_grasps(filename, grasps):
+    """
+    Writes the grasps in the sr_hand grasps file format. If the file
+    already exists the grasps are added to it (replacing the grasps
+    with the same names).
+    """
+    if os.path.exists(filename):
+        root = ET.parse(filename).getroot()
+        for xml_grasp in root.findall("grasp"):
+            if xml_grasp.attrib.get("name") in grasps:
+                root.remove(xml_grasp)
+    else:
+        root = ET.Element("root")
+
+    for grasp_name in sorted(grasps.keys()):
+        xml_grasp = ET.SubElement(root, "grasp")
+        xml_grasp.set("name", grasp_name)
+        for joint_name, position in sorted(grasps[grasp_name].items()):
+            xml_joint = ET.SubElement(xml_grasp, "joint")
+            xml_joint.set("name", joint_name)
+            xml_joint.text = str(position)
+
+    indent(root)
+    ET.ElementTree(root).write(filename)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""
+Building, checking and playing movements from Python, without the GUI.
+
+    from sr_gui_movement_recorder.movement import Movement, run_batch
+    from sr_gui_movement_recorder.movement_player import MovementPlayer
+
+    pick = Movement()
+    pick.add_step("open_hand")
+    pick.add_step({"FFJ3": 45.0, "MFJ3": 45.0}, interpolation_time = 0.8, name = "half_closed")
+    grasp = pick.add_step("power_grasp", pause_time = 0.5)
+    pick.set_loop(grasp, 1, 3)
+    pick.save("pick.xml")
+
+    #500 variants of the same motion, from twice slower to twice faster
+    variants = [pick.scaled(2.0 ** x) for x in numpy.linspace(-1.0, 1.0, 500)]
+    results = run_batch(variants, MovementPlayer(ShadowHand_ROS()), metrics_publisher = metrics_publisher(),
+                        limits = JointLimits.load(), should_stop = rospy.is_shutdown)
+
+The grasps can be given by name (looked up in the grasps of the movement,
+the sr_hand ones by default) or as a dictionary of joint positions in degrees.
+"""
+
+from collections import namedtuple
+
+from sr_gui_movement_recorder.playback_engine import DEFAULT_RATE
+from sr_gui_movement_recorder.movement_compiler import StepSpec, compile_movement, movement_duration
+from sr_gui_movement_recorder.movement_io import load_movement, save_movement
+from sr_gui_movement_recorder.movement_binary import BinaryMovement, save_binary, is_binary_movement
+from sr_gui_movement_recorder.movement_validator import validate_movement
+from sr_gui_movement_recorder.movement_retiming import retime_steps
+from sr_gui_movement_recorder.interpolation import LINEAR
+
+class Movement(object):
+    """
+    A list of steps (StepSpec), with the same rules as in the GUI: the
+    first step is the starting position, a step can only loop back to a
+    previous one, and the loops follow the steps when steps are inserted
+    or removed.
+    """
+    def __init__(self, steps = (), grasps = None):
+        """
+        grasps is a dictionary of sr_hand Grasp indexed by name, used to
+        look up the grasps added by name (the sr_hand grasps by default)
+        """
+        self.steps = list(steps)
+        self.grasps_ = grasps
+
+    @classmethod
+    def load(cls, filename, grasps = None):
+        """
+        Reads a movement xml file or a binary movement file (.srm)
+        """
+        if is_binary_movement(filename):
+            return cls(BinaryMovement(filename).steps(), grasps)
+        movement = cls(grasps = grasps)
+        movement.steps = load_movement(filename, movement.grasps)
+        return movement
+
+    def save(self, filename):
+        """
+        Writes the movement to an xml file, or to a binary movement file
+        (.srm) which also has the positions of the grasps
+        """
+        if is_binary_movement(filename):
+            save_binary(filename, self.steps)
+        else:
+            save_movement(filename, self.steps)
+
+    @property
+    def grasps(self):
+        if self.grasps_ is None:
+            from sr_gui_movement_recorder.movement_player import load_grasps
+            self.grasps_ = load_grasps()
+        return self.grasps_
+
+    def copy(self):
+        return Movement(self.steps, self.grasps_)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getitem__(self, index):
+        return self.steps[index]
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def make_step(self, grasp, pause_time = 0.0, interpolation_time = 1.0, name = None):
+        """
+        A StepSpec going to the grasp: a grasp name or a dictionary of joint
+        positions (named name, step_<number of steps> by default)
+        """
+        if isinstance(grasp, dict):
+            if name is None:
+                name = "step_%d" % (len(self.steps) + 1)
+            return StepSpec(name, dict(grasp), float(pause_time), float(interpolation_time), -1, 0)
+        if grasp not in self.grasps:
+            raise ValueError("Unknown grasp: " + str(grasp))
+        return StepSpec(grasp, self.grasps[grasp].joints_and_positions, float(pause_time),
+                        float(interpolation_time), -1, 0)
+
+    def add_step(self, grasp, pause_time = 0.0, interpolation_time = 1.0, name = None):
+        """
+        Adds a step at the end of the movement, returns its index
+        """
+        self.steps.append(self.make_step(grasp, pause_time, interpolation_time, name))
+        return len(self.steps) - 1
+
+    def insert_step(self, index, grasp, pause_time = 0.0, interpolation_time = 1.0, name = None):
+        """
+        Inserts a step before the given index
+        """
+        step = self.make_step(grasp, pause_time, interpolation_time, name)
+        self.steps.insert(index, step)
+        self.shift_loops_(index + 1, lambda loop: loop + 1 if loop >= index else loop)
+
+    def remove_step(self, index):
+        del self.steps[index]
+
+        def shift(loop):
+            if loop < index:
+                return loop
+            if loop == index:
+                #the step we were looping to doesn't exist any more
+                return -1
+            return loop - 1
+        self.shift_loops_(index, shift)
+
+    def shift_loops_(self, first_index, shift):
+        for index in range(first_index, len(self.steps)):
+            step = self.steps[index]
+            if step.loop_to_step == -1:
+                continue
+            loop_to_step = shift(step.loop_to_step)
+            if loop_to_step == -1 or loop_to_step >= index:
+                self.steps[index] = step._replace(loop_to_step = -1, number_of_loops = 0)
+            else:
+                self.steps[index] = step._replace(loop_to_step = loop_to_step)
+
+    def set_timing(self, index, pause_time = None, interpolation_time = None):
+        """
+        Changes the pause and / or interpolation time (seconds) of a step
+        """
+        step = self.steps[index]
+        if pause_time is not None:
+            step = step._replace(pause_time = float(pause_time))
+        if interpolation_time is not None:
+            step = step._replace(interpolation_time = float(interpolation_time))
+        self.steps[index] = step
+
+    def set_grasp(self, index, grasp, name = None):
+        """
+        Changes the grasp of a step (a grasp name or a dictionary of joint positions)
+        """
+        step = self.steps[index]
+        grasp_step = self.make_step(grasp, name = name or step.grasp_name)
+        self.steps[index] = step._replace(grasp_name = grasp_step.grasp_name,
+                                          joints_and_positions = grasp_step.joints_and_positions)
+
+    def set_loop(self, index, loop_to_step, number_of_loops = 1):
+        """
+        Makes the step go back to a previous step number_of_loops times
+        (loop_to_step -1 removes the loop)
+        """
+        if loop_to_step == -1:
+            self.steps[index] = self.steps[index]._replace(loop_to_step = -1, number_of_loops = 0)
+            return
+        if loop_to_step < 0 or loop_to_step >= index:
+            raise ValueError("Step %d can only loop back to a previous step, not to %d" % (index, loop_to_step))
+        self.steps[index] = self.steps[index]._replace(loop_to_step = int(loop_to_step),
+                                                       number_of_loops = int(number_of_loops))
+
+    def scaled(self, factor):
+        """
+        A copy of the movement with all the pause and interpolation times
+        multiplied by factor
+        """
+        return Movement([step._replace(pause_time = step.pause_time * factor,
+                                       interpolation_time = step.interpolation_time * factor)
+                         for step in self.steps], self.grasps_)
+
+    def duration(self):
+        return movement_duration(self.steps)
+
+    def compile(self, rate = DEFAULT_RATE, profile = LINEAR):
+        return compile_movement(self.steps, rate, profile)
+
+    def validate(self, limits, rate = DEFAULT_RATE, profile = LINEAR):
+        """
+        The list of Violation of the JointLimits (see movement_validator)
+        """
+        return validate_movement(self.compile(rate, profile), limits)
+
+    def retimed(self, limits, rate = DEFAULT_RATE, profile = LINEAR):
+        """
+        A copy of the movement with the shortest interpolation times allowed
+        by the JointLimits (see movement_retiming). Raises a RetimingError
+        if no such times were found.
+        """
+        return Movement(retime_steps(self.steps, limits, rate, profile), self.grasps_)
+
+#The outcome of a movement of a batch: its index in the batch, whether it
+# was played to the end, its PlaybackMetrics (None without a metrics
+# publisher) and its limit violations (None without limits).
+BatchResult = namedtuple("BatchResult", ["index", "finished", "metrics", "violations"])
+
+def validate_batch(movements, limits, rate = DEFAULT_RATE, profile = LINEAR):
+    """
+    The violations of the JointLimits of each movement
+    """
+    return [validate_movement(compile_movement(list(movement), rate, profile), limits) for movement in movements]
+
+def run_batch(movements, player, should_stop = None, metrics_publisher = None, limits = None):
+    """
+    Plays the movements (Movement or lists of StepSpec) back to back with a
+    MovementPlayer. With limits (JointLimits), the movements going over
+    them are skipped. The batch ends early if should_stop() returns True.
+
+    Returns a BatchResult per movement attempted.
+    """
+    results = []
+    for index, movement in enumerate(movements):
+        steps = list(movement)
+        violations = None
+        if limits is not None:
+            #checked at the speed it's played at
+            violations = Movement(steps).scaled(1.0 / player.time_scale).validate(limits, player.rate, player.profile)
+            if len(violations) > 0:
+                results.append(BatchResult(index, False, None, violations))
+                continue
+        player.metrics = None
+        finished = player.play(steps, should_stop, metrics_publisher = metrics_publisher)
+        results.append(BatchResult(index, finished, player.metrics, violations))
+        if not finished:
+            break
+    return results
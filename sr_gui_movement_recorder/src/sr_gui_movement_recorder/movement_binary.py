@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import numpy
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec
+
+#Binary movement files (.srm), all little endian:
+# - a 64 bytes header (HEADER_DTYPE)
+# - the joint names table
+# - the steps table: the step timings and the positions of its grasp
+#   (float64, NaN for the joints which aren't in the grasp)
+# - the samples: their stamps (float64 seconds) then their positions
+#   (float32, one row per sample, in the units they were recorded in)
+# Each block starts on a 64 bytes boundary, so that the samples can be
+# memory mapped.
+EXTENSION = ".srm"
+MAGIC = b"SRMOVEMT"
+VERSION = 1
+ALIGNMENT = 64
+NAME_SIZE = 64
+HEADER_DTYPE = numpy.dtype([("magic", "S8"), ("version", "<u4"), ("nb_joints", "<u4"),
+                            ("nb_steps", "<u8"), ("nb_samples", "<u8"),
+                            ("names_offset", "<u8"), ("steps_offset", "<u8"),
+                            ("stamps_offset", "<u8"), ("positions_offset", "<u8")])
+NAMES_DTYPE = numpy.dtype("S%d" % NAME_SIZE)
+SAMPLES_CHUNK = 1 << 20
+
+def step_dtype(nb_joints):
+    return numpy.dtype([("grasp_name", NAMES_DTYPE), ("pause_time", "<f8"), ("interpolation_time", "<f8"),
+                        ("loop_to_step", "<i4"), ("number_of_loops", "<i4"),
+                        ("positions", "<f8", (nb_joints,))])
+
+def aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def encode_name(name):
+    encoded = name.encode("utf-8")
+    if len(encoded) > NAME_SIZE:
+        raise ValueError("Name too long for a binary movement (%d bytes max): %s" % (NAME_SIZE, name))
+    return encoded
+
+def decode_name(name):
+    return name.decode("utf-8")
+
+def save_binary(filename, steps = (), joint_names = None, stamps = None, positions = None):
+    """
+    Writes a binary movement: the steps (a list of StepSpec) and/or dense
+    samples (their stamps in seconds and positions, one row per sample,
+    one column per joint in joint_names).
+    """
+    if joint_names is None:
+        names = set()
+        for step in steps:
+            names.update(step.joints_and_positions.keys())
+        joint_names = sorted(names)
+    joint_names = list(joint_names)
+    columns = dict((name, index) for index, name in enumerate(joint_names))
+
+    table = numpy.zeros(len(steps), dtype = step_dtype(len(joint_names)))
+    table["positions"] = numpy.nan
+    for row, step in enumerate(steps):
+        table["grasp_name"][row] = encode_name(step.grasp_name)
+        table["pause_time"][row] = step.pause_time
+        table["interpolation_time"][row] = step.interpolation_time
+        table["loop_to_step"][row] = step.loop_to_step
+        table["number_of_loops"][row] = step.number_of_loops
+        for name, position in step.joints_and_positions.items():
+            if name not in columns:
+                raise ValueError("Joint %s of grasp %s isn't in the joint names" % (name, step.grasp_name))
+            table["positions"][row, columns[name]] = position
+
+    nb_samples = 0
+    if stamps is not None:
+        nb_samples = len(stamps)
+        if positions is None or len(positions) != nb_samples:
+            raise ValueError("The samples need as many positions as stamps")
+
+    header = numpy.zeros(1, dtype = HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["nb_joints"] = len(joint_names)
+    header["nb_steps"] = len(steps)
+    header["nb_samples"] = nb_samples
+    names_offset = aligned(HEADER_DTYPE.itemsize)
+    steps_offset = aligned(names_offset + NAMES_DTYPE.itemsize * len(joint_names))
+    stamps_offset = aligned(steps_offset + table.nbytes)
+    positions_offset = aligned(stamps_offset + 8 * nb_samples)
+    header["names_offset"] = names_offset
+    header["steps_offset"] = steps_offset
+    header["stamps_offset"] = stamps_offset
+    header["positions_offset"] = positions_offset
+
+    binary_file = open(filename, "wb")
+    try:
+        def write_at(offset, array):
+            binary_file.write(b"\x00" * (offset - binary_file.tell()))
+            array.tofile(binary_file)
+
+        write_at(0, header)
+        write_at(names_offset, numpy.array([encode_name(name) for name in joint_names], dtype = NAMES_DTYPE))
+        write_at(steps_offset, table)
+        if nb_samples > 0:
+            write_at(stamps_offset, numpy.asarray(stamps, dtype = "<f8"))
+            binary_file.write(b"\x00" * (positions_offset - binary_file.tell()))
+            #converted a chunk at a time, the samples can be bigger than the memory
+            for first in range(0, nb_samples, SAMPLES_CHUNK):
+                numpy.asarray(positions[first:first + SAMPLES_CHUNK], dtype = "<f4").tofile(binary_file)
+    finally:
+        binary_file.close()
+
+class BinaryMovement(object):
+    """
+    A binary movement file opened for reading. The samples are memory
+    mapped: nothing is read from the disk before it's used. Like a
+    JointStateRecording, it has joint_names, len() and samples(), so it
+    can be replayed or reduced to keyframes the same way.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        header = numpy.fromfile(filename, dtype = HEADER_DTYPE, count = 1)
+        if len(header) != 1 or header["magic"][0] != MAGIC:
+            raise ValueError("Not a binary movement file: " + filename)
+        if header["version"][0] > VERSION:
+            raise ValueError("Binary movement file version %d not supported (version %d max): %s" %
+                             (header["version"][0], VERSION, filename))
+        header = header[0]
+        nb_joints = int(header["nb_joints"])
+        nb_steps = int(header["nb_steps"])
+        nb_samples = int(header["nb_samples"])
+
+        self.joint_names = [decode_name(name) for name in
+                            numpy.memmap(filename, dtype = NAMES_DTYPE, mode = "r",
+                                         offset = int(header["names_offset"]), shape = (nb_joints,))] \
+                           if nb_joints else []
+        self.step_table = numpy.array(numpy.memmap(filename, dtype = step_dtype(nb_joints), mode = "r",
+                                                   offset = int(header["steps_offset"]), shape = (nb_steps,))) \
+                          if nb_steps else numpy.zeros(0, dtype = step_dtype(nb_joints))
+        if nb_samples:
+            self.stamps = numpy.memmap(filename, dtype = "<f8", mode = "r",
+                                       offset = int(header["stamps_offset"]), shape = (nb_samples,))
+            self.positions = numpy.memmap(filename, dtype = "<f4", mode = "r",
+                                          offset = int(header["positions_offset"]), shape = (nb_samples, nb_joints))
+        else:
+            self.stamps = numpy.zeros(0)
+            self.positions = numpy.zeros((0, nb_joints), dtype = numpy.float32)
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def samples(self):
+        return {"stamp": self.stamps, "position": self.positions}
+
+    def steps(self):
+        """
+        The steps, as a list of StepSpec using the grasp positions
+        saved in the file
+        """
+        steps = []
+        grasps = {}
+        for row in self.step_table:
+            grasp_name = decode_name(row["grasp_name"])
+            joints_and_positions = dict((name, position) for name, position
+                                        in zip(self.joint_names, row["positions"].tolist())
+                                        if position == position)
+            #the steps using the same grasp share its dictionary, like when loading from xml
+            joints_and_positions = grasps.setdefault((grasp_name, tuple(sorted(joints_and_positions.items()))),
+                                                     joints_and_positions)
+            steps.append(StepSpec(grasp_name, joints_and_positions, float(row["pause_time"]),
+                                  float(row["interpolation_time"]), int(row["loop_to_step"]),
+                                  int(row["number_of_loops"])))
+        return steps
+
+    def grasps(self):
+        """
+        The positions of the grasps used by the steps, indexed by grasp name
+        """
+        return dict((step.grasp_name, step.joints_and_positions) for step in self.steps())
+
+def is_binary_movement(filename):
+    return filename.endswith(EXTENSION)
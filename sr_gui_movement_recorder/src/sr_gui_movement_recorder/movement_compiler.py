@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import hashlib
+from collections import namedtuple, OrderedDict
+
+import numpy
+
+from sr_gui_movement_recorder.playback_engine import DEFAULT_RATE
+from sr_gui_movement_recorder.interpolation import profile_spline, LINEAR
+
+#A snapshot of one step of a movement, independent from the Qt widgets.
+# joints_and_positions is the dictionary of the grasp (in degrees).
+StepSpec = namedtuple("StepSpec", ["grasp_name", "joints_and_positions", "pause_time",
+                                   "interpolation_time", "loop_to_step", "number_of_loops"])
+
+def flatten_steps(steps):
+    """
+    Returns the indexes of the steps in the order in which they are played,
+    resolving the loops (loop_to_step / number_of_loops). The first index
+    is always 0: the starting position of the movement.
+    """
+    if len(steps) == 0:
+        return []
+    remaining_loops = [step.number_of_loops for step in steps]
+    sequence = [0]
+    index = 1
+    while index < len(steps):
+        sequence.append(index)
+        step = steps[index]
+        if step.loop_to_step != -1 and remaining_loops[index] > 0:
+            remaining_loops[index] -= 1
+            index = step.loop_to_step
+        else:
+            index += 1
+    return sequence
+
+def movement_duration(steps):
+    """
+    Total duration of the movement in seconds: moving from a step to the next
+    one takes the interpolation time of the step we leave, followed by its
+    pause time.
+    """
+    sequence = flatten_steps(steps)
+    duration = 0.0
+    for previous in sequence[:-1]:
+        duration += steps[previous].interpolation_time + steps[previous].pause_time
+    return duration
+
+def steps_hash(steps, rate, profile = LINEAR):
+    """
+    A content hash of the steps (and playback rate and profile) used as a cache key.
+    """
+    sha = hashlib.sha1(repr((float(rate), str(profile))).encode("utf-8"))
+    for step in steps:
+        joints = sorted(step.joints_and_positions.items())
+        sha.update(repr((step.grasp_name, joints, float(step.pause_time), float(step.interpolation_time),
+                         int(step.loop_to_step), int(step.number_of_loops))).encode("utf-8"))
+    return sha.hexdigest()
+
+class CompiledMovement(object):
+    """
+    A movement flattened into a time-indexed array of joint targets.
+
+    times[i] is the deadline (seconds from the start) at which positions[i]
+    has to be sent, step_indices[i] the step being played and row_segments[i]
+    the segment (move from a key to the next one). Positions are NaN
+    for joints which haven't been commanded yet. The key positions are the
+    targets at the end of each segment (key 0 being the starting position),
+    the key velocities and accelerations are set by the interpolation profile
+    (None if it doesn't constrain them).
+    """
+    def __init__(self, joint_names, rate, times, positions, step_indices,
+                 key_positions, segment_steps, segment_starts, segment_durations,
+                 segment_pauses, duration, profile = LINEAR, key_velocities = None,
+                 key_accelerations = None, row_segments = None):
+        self.joint_names = joint_names
+        self.rate = rate
+        self.profile = profile
+        self.times = times
+        self.positions = positions
+        self.step_indices = step_indices
+        self.key_positions = key_positions
+        self.segment_steps = segment_steps
+        self.segment_starts = segment_starts
+        self.segment_durations = segment_durations
+        self.segment_pauses = segment_pauses
+        self.duration = duration
+        self.key_velocities = key_velocities
+        self.key_accelerations = key_accelerations
+        self.row_segments = row_segments
+
+        self.commanded = numpy.isfinite(positions)
+        for array in (times, positions, step_indices, key_positions, segment_steps,
+                      segment_starts, segment_durations, segment_pauses, self.commanded,
+                      key_velocities, key_accelerations, row_segments):
+            if array is not None:
+                array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.times)
+
+    def step_time(self, index):
+        """
+        The time at which the movement starts going to the given step
+        (the first time, if the step is in a loop)
+        """
+        segments = numpy.flatnonzero(self.segment_steps == index)
+        if len(segments) == 0:
+            return 0.0
+        return float(self.segment_starts[segments[0]])
+
+    def targets(self, row):
+        """
+        The dictionary of targets to send for a given row
+        """
+        return dict((name, value) for name, value, commanded
+                    in zip(self.joint_names, self.positions[row].tolist(), self.commanded[row].tolist())
+                    if commanded)
+
+class MovementCompiler(object):
+    """
+    Compiles a list of StepSpec into a CompiledMovement, caching the
+    last compiled movements by content hash.
+    """
+    CACHE_SIZE = 8
+
+    def __init__(self):
+        self.cache = OrderedDict()
+
+    def compile(self, steps, rate = DEFAULT_RATE, profile = LINEAR):
+        key = steps_hash(steps, rate, profile)
+        compiled = self.cache.pop(key, None)
+        if compiled is None:
+            compiled = compile_movement(steps, rate, profile)
+            if len(self.cache) >= self.CACHE_SIZE:
+                self.cache.popitem(last = False)
+        self.cache[key] = compiled
+        return compiled
+
+def interpolate_segments(spline, segment_starts, segment_durations, rate):
+    """
+    Evaluates the SegmentSpline during each segment, at the given rate.
+    Returns, for each tick, the index of its segment, its time and
+    the interpolated positions.
+    """
+    nb_ticks = numpy.maximum(1, numpy.round(segment_durations * rate)).astype(numpy.int64)
+
+    #one row per tick: which segment and how far through it
+    row_segments = numpy.repeat(numpy.arange(len(nb_ticks)), nb_ticks)
+    first_rows = numpy.cumsum(nb_ticks) - nb_ticks
+    ticks = numpy.arange(len(row_segments)) - numpy.repeat(first_rows, nb_ticks) + 1
+    fractions = ticks / nb_ticks[row_segments].astype(float)
+
+    times = segment_starts[row_segments] + fractions * segment_durations[row_segments]
+    return row_segments, times, spline.evaluate_rows(row_segments, fractions)
+
+def compile_movement(steps, rate = DEFAULT_RATE, profile = LINEAR):
+    """
+    Flattens the steps, then interpolates between the successive grasps
+    at the given rate with the given profile (see interpolation.PROFILES).
+    A joint which is only present in the target grasp jumps to its target
+    half way through the segment, like the GraspInterpoler does.
+    """
+    rate = float(rate)
+    sequence = flatten_steps(steps)
+
+    joint_names = set()
+    for step in steps:
+        joint_names.update(step.joints_and_positions.keys())
+    joint_names = tuple(sorted(joint_names))
+    columns = dict((name, index) for index, name in enumerate(joint_names))
+
+    #the targets at the end of each segment, carrying forward the joints
+    # which are not part of the following grasp
+    key_positions = numpy.empty((len(sequence), len(joint_names)))
+    key_positions.fill(numpy.nan)
+    for key, index in enumerate(sequence):
+        if key > 0:
+            key_positions[key] = key_positions[key - 1]
+        for name, position in steps[index].joints_and_positions.items():
+            key_positions[key, columns[name]] = position
+
+    nb_segments = max(0, len(sequence) - 1)
+    segment_steps = numpy.array(sequence[1:], dtype = numpy.int32)
+    segment_durations = numpy.array([float(steps[index].interpolation_time) for index in sequence[:-1]])
+    segment_pauses = numpy.array([float(steps[index].pause_time) for index in sequence[:-1]])
+    segment_starts = numpy.zeros(nb_segments)
+    if nb_segments > 1:
+        segment_starts[1:] = numpy.cumsum(segment_durations + segment_pauses)[:-1]
+
+    #the steps followed by a pause are reached with a zero velocity
+    holds = numpy.append(True, segment_pauses > 0.0)
+    spline, key_velocities, key_accelerations = profile_spline(profile, key_positions, segment_durations, holds)
+    row_segments, times, positions = interpolate_segments(spline, segment_starts, segment_durations, rate)
+
+    duration = float(numpy.sum(segment_durations + segment_pauses))
+
+    return CompiledMovement(joint_names, rate, times, positions, segment_steps[row_segments],
+                            key_positions, segment_steps, segment_starts, segment_durations,
+                            segment_pauses, duration, profile, key_velocities, key_accelerations,
+                            row_segments)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import hashlib, os, sqlite3
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from sr_gui_movement_recorder.movement_compiler import movement_duration
+from sr_gui_movement_recorder.movement_io import step_from_xml
+from sr_gui_movement_recorder.movement_binary import BinaryMovement, EXTENSION as BINARY_EXTENSION
+
+#What the index knows about a movement file
+MovementEntry = namedtuple("MovementEntry", ["path", "nb_steps", "duration", "grasps", "checksum", "mtime"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movements (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    checksum TEXT,
+    nb_steps INTEGER,
+    duration REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS movement_grasps (
+    path TEXT NOT NULL REFERENCES movements(path) ON DELETE CASCADE,
+    grasp TEXT NOT NULL,
+    PRIMARY KEY (path, grasp)
+);
+CREATE INDEX IF NOT EXISTS movement_grasps_grasp ON movement_grasps(grasp);
+CREATE INDEX IF NOT EXISTS movements_duration ON movements(duration);
+"""
+
+def default_index_file():
+    """
+    The index shared by all the movement recorders of the user (in ~/.ros)
+    """
+    import rospkg
+    return os.path.join(rospkg.get_ros_home(), "sr_movement_index.sqlite")
+
+def file_checksum(filename, block_size = 1 << 16):
+    sha = hashlib.sha1()
+    movement_file = open(filename, "rb")
+    try:
+        block = movement_file.read(block_size)
+        while block:
+            sha.update(block)
+            block = movement_file.read(block_size)
+    finally:
+        movement_file.close()
+    return sha.hexdigest()
+
+def read_steps(filename):
+    """
+    The steps of a movement file with their timings and grasp names only
+    (the grasps aren't looked up). Raises a ValueError if it's not a movement.
+    """
+    if filename.endswith(BINARY_EXTENSION):
+        return BinaryMovement(filename).steps()
+    steps = []
+    try:
+        events = ET.iterparse(filename, events = ("start", "end"))
+        event, root = next(events)
+        if root.tag != "movement":
+            raise ValueError("Not a movement: <%s> root element" % root.tag)
+        for event, elem in events:
+            if event == "end" and elem.tag == "step":
+                steps.append(step_from_xml(elem, None))
+                elem.clear()
+    except ET.ParseError as e:
+        raise ValueError(str(e))
+    return steps
+
+class MovementIndex(object):
+    """
+    An sqlite index of the movement files (xml and .srm) of directories,
+    with the number of steps, the grasps used, the duration and the
+    checksum of each file. A file is only parsed again when its
+    modification time or size change, so searching thousands of
+    movements doesn't read any of them.
+    """
+    EXTENSIONS = (".xml", BINARY_EXTENSION)
+
+    def __init__(self, database = None):
+        self.database = database or default_index_file()
+        self.connection = sqlite3.connect(self.database)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, directory, recursive = True):
+        """
+        Indexes the new and modified movement files of the directory, and
+        forgets the files which were removed. Returns the number of files
+        (re)parsed.
+        """
+        directory = os.path.realpath(directory)
+        files = {}
+        for root, subdirectories, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(self.EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    try:
+                        status = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (status.st_mtime, status.st_size)
+            if not recursive:
+                del subdirectories[:]
+
+        prefix = os.path.join(directory, "")
+        known = dict((path, (mtime, size)) for path, mtime, size in self.connection.execute(
+            "SELECT path, mtime, size FROM movements WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)))
+
+        parsed = 0
+        with self.connection:
+            #the files of the subdirectories weren't listed if not recursive
+            removed = [(path,) for path in known if path not in files and
+                       (recursive or os.path.dirname(path) == directory)]
+            self.connection.executemany("DELETE FROM movements WHERE path = ?", removed)
+            for path, stamp in files.items():
+                if known.get(path) == stamp:
+                    continue
+                self.index_file_(path, stamp)
+                parsed += 1
+        return parsed
+
+    def index_file_(self, path, stamp):
+        mtime, size = stamp
+        self.connection.execute("DELETE FROM movements WHERE path = ?", (path,))
+        try:
+            steps = read_steps(path)
+            duration = movement_duration(steps)
+            checksum = file_checksum(path)
+        except (ValueError, TypeError, IndexError, IOError) as e:
+            self.index_error_(path, stamp, e)
+            return
+        #the steps without a <grasp> have no grasp name
+        grasps = set(step.grasp_name for step in steps if step.grasp_name is not None)
+        try:
+            self.connection.execute("INSERT INTO movements (path, mtime, size, checksum, nb_steps, duration) "
+                                    "VALUES (?, ?, ?, ?, ?, ?)",
+                                    (path, mtime, size, checksum, len(steps), duration))
+            self.connection.executemany("INSERT INTO movement_grasps (path, grasp) VALUES (?, ?)",
+                                        [(path, grasp) for grasp in grasps])
+        except sqlite3.Error as e:
+            #only this file is left out of the index, not the whole update
+            self.connection.execute("DELETE FROM movements WHERE path = ?", (path,))
+            self.index_error_(path, stamp, e)
+
+    def index_error_(self, path, stamp, error):
+        #remembered, so that it isn't parsed again before it changes
+        mtime, size = stamp
+        self.connection.execute("INSERT INTO movements (path, mtime, size, error) VALUES (?, ?, ?, ?)",
+                                (path, mtime, size, str(error)))
+
+    def search(self, directory = None, grasps = (), min_duration = None, max_duration = None, name = None):
+        """
+        The MovementEntry of the indexed movements (in the directory and its
+        subdirectories, if given) using all the given grasps, lasting between
+        min_duration and max_duration seconds and whose file name contains
+        name. Sorted by path.
+        """
+        conditions = ["error IS NULL"]
+        parameters = []
+        if directory is not None:
+            prefix = os.path.join(os.path.realpath(directory), "")
+            conditions.append("substr(path, 1, ?) = ?")
+            parameters += [len(prefix), prefix]
+        for grasp in grasps:
+            conditions.append("EXISTS (SELECT 1 FROM movement_grasps AS g WHERE g.path = m.path AND g.grasp = ?)")
+            parameters.append(grasp)
+        if min_duration is not None:
+            conditions.append("duration >= ?")
+            parameters.append(min_duration)
+        if max_duration is not None:
+            conditions.append("duration <= ?")
+            parameters.append(max_duration)
+        entries = []
+        rows = self.connection.execute("SELECT path, nb_steps, duration, checksum, mtime FROM movements AS m WHERE " +
+                                       " AND ".join(conditions) + " ORDER BY path", parameters).fetchall()
+        grasps_by_path = self.grasps_by_path_([row[0] for row in rows])
+        for path, nb_steps, duration, checksum, mtime in rows:
+            if name is not None and name.lower() not in os.path.basename(path).lower():
+                continue
+            entries.append(MovementEntry(path, nb_steps, duration, tuple(sorted(grasps_by_path.get(path, ()))),
+                                         checksum, mtime))
+        return entries
+
+    def grasps_by_path_(self, paths):
+        grasps = {}
+        #in chunks: sqlite limits the number of parameters of a query
+        for first in range(0, len(paths), 500):
+            chunk = paths[first:first + 500]
+            for path, grasp in self.connection.execute(
+                    "SELECT path, grasp FROM movement_grasps WHERE path IN (%s)" % ",".join("?" * len(chunk)), chunk):
+                grasps.setdefault(path, []).append(grasp)
+        return grasps
+
+    def grasp_names(self):
+        """
+        All the grasps used by the indexed movements
+        """
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT grasp FROM movement_grasps ORDER BY grasp")]
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import xml.etree.ElementTree as ET
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec
+
+def indent(elem, level=0):
+    """
+    print a prettier / indented xml tree
+    """
+    i = "\n" + level * "  "
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = i + "  "
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+        for elem in elem:
+            indent(elem, level + 1)
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+    else:
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = i
+
+def step_to_xml(step):
+    """
+    Converts a StepSpec to a <step> element
+    """
+    xml_step = ET.Element("step")
+    grasp = ET.SubElement(xml_step, "grasp")
+    grasp.set("name", step.grasp_name)
+    pause = ET.SubElement(xml_step, "pause_time")
+    pause.text = str(step.pause_time)
+    interpolation = ET.SubElement(xml_step, "interpolation_time")
+    interpolation.text = str(step.interpolation_time)
+    looping = ET.SubElement(xml_step, "loop_to_step")
+    looping.text = str(step.loop_to_step)
+    nb_loops = ET.SubElement(xml_step, "number_loops")
+    nb_loops.text = str(step.number_of_loops)
+    return xml_step
+
+def step_from_xml(xml_step, grasps):
+    """
+    Converts a <step> element to a StepSpec, looking the grasp up
+    in grasps (a dictionary of sr_hand Grasp indexed by name). If grasps
+    is None, only the timings are read: the grasps have no joints.
+    """
+    grasp_name = None
+    pause_time = 0.0
+    interpolation_time = 1.0
+    loop_to_step = -1
+    number_of_loops = 0
+    for subelement in xml_step:
+        if subelement.tag == "grasp":
+            grasp_name = subelement.attrib.get("name")
+        elif subelement.tag == "pause_time":
+            pause_time = float(subelement.text)
+        elif subelement.tag == "interpolation_time":
+            interpolation_time = float(subelement.text)
+        elif subelement.tag == "loop_to_step":
+            loop_to_step = int(subelement.text)
+        elif subelement.tag == "number_loops":
+            number_of_loops = int(subelement.text)
+
+    if grasps is None:
+        joints_and_positions = {}
+    elif grasp_name in grasps:
+        joints_and_positions = grasps[grasp_name].joints_and_positions
+    else:
+        raise ValueError("Unknown grasp in movement: " + str(grasp_name))
+    return StepSpec(grasp_name, joints_and_positions, pause_time,
+                    interpolation_time, loop_to_step, number_of_loops)
+
+def iter_movement(filename, grasps):
+    """
+    Streams the steps of a <movement> xml file: each <step> is converted
+    as soon as it has been parsed, then discarded.
+    """
+    for event, elem in ET.iterparse(filename):
+        if elem.tag == "step":
+            yield step_from_xml(elem, grasps)
+            elem.clear()
+
+def load_movement(filename, grasps):
+    """
+    Reads a <movement> xml file and returns the list of its steps
+    """
+    return list(iter_movement(filename, grasps))
+
+def save_movement(filename, steps):
+    """
+    Writes the steps to a <movement> xml file
+    """
+    root = ET.Element("movement")
+    for step in steps:
+        root.append(step_to_xml(step))
+
+    indent(root)
+    ET.ElementTree(root).write(filename)
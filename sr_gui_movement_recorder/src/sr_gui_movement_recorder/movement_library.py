@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+
+from QtCore import Qt
+from QtGui import QDialog, QDialogButtonBox, QFileDialog, QGridLayout, QHBoxLayout, QLabel, QLineEdit, \
+    QPushButton, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QApplication, QCursor
+from PyQt4.Qt import QDoubleSpinBox
+
+class MovementLibraryDialog(QDialog):
+    """
+    Browses the movements of a directory through a MovementIndex: the
+    movements can be filtered by the grasps they use, their duration and
+    their name without opening any file.
+    """
+    NAME, NB_STEPS, DURATION, GRASPS = range(4)
+    HEADERS = ["Name", "Steps", "Duration (s)", "Grasps"]
+
+    def __init__(self, index, directory, parent = None):
+        QDialog.__init__(self, parent)
+        self.setWindowTitle("Movement Library")
+        self.resize(800, 500)
+        self.index = index
+        self.entries = []
+
+        layout = QGridLayout()
+        layout.addWidget(QLabel("Directory:"), 0, 0)
+        directory_layout = QHBoxLayout()
+        self.directory_input = QLineEdit(directory)
+        self.directory_input.returnPressed.connect(self.update_index)
+        directory_layout.addWidget(self.directory_input)
+        browse_btn = QPushButton("Browse")
+        browse_btn.clicked.connect(self.browse)
+        directory_layout.addWidget(browse_btn)
+        update_btn = QPushButton("Update")
+        update_btn.setToolTip("Index the new and modified movements of the directory")
+        update_btn.clicked.connect(self.update_index)
+        directory_layout.addWidget(update_btn)
+        layout.addLayout(directory_layout, 0, 1, 1, 5)
+
+        layout.addWidget(QLabel("Grasps:"), 1, 0)
+        self.grasps_input = QLineEdit()
+        self.grasps_input.setToolTip("Only the movements using all these grasps (comma separated)")
+        self.grasps_input.textChanged.connect(self.refresh)
+        layout.addWidget(self.grasps_input, 1, 1)
+        layout.addWidget(QLabel("  Max duration (s):"), 1, 2)
+        self.duration_input = QDoubleSpinBox()
+        self.duration_input.setRange(0.0, 1e6)
+        self.duration_input.setSpecialValueText("any")
+        self.duration_input.valueChanged.connect(self.refresh)
+        layout.addWidget(self.duration_input, 1, 3)
+        layout.addWidget(QLabel("  Name:"), 1, 4)
+        self.name_input = QLineEdit()
+        self.name_input.textChanged.connect(self.refresh)
+        layout.addWidget(self.name_input, 1, 5)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setDefaultSectionSize(22)
+        self.table.horizontalHeader().setResizeMode(self.GRASPS, QHeaderView.Stretch)
+        self.table.doubleClicked.connect(self.accept)
+        layout.addWidget(self.table, 2, 0, 1, 6)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label, 3, 0, 1, 4)
+        buttons = QDialogButtonBox(QDialogButtonBox.Open | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons, 3, 4, 1, 2)
+        self.setLayout(layout)
+
+        if os.path.isdir(directory):
+            self.update_index()
+
+    def directory(self):
+        return str(self.directory_input.text())
+
+    def browse(self):
+        directory = QFileDialog.getExistingDirectory(self, "Movements Directory", self.directory())
+        if directory:
+            self.directory_input.setText(str(directory))
+            self.update_index()
+
+    def update_index(self):
+        if not os.path.isdir(self.directory()):
+            self.status_label.setText("No such directory")
+            return
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        try:
+            self.index.update(self.directory())
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.refresh()
+
+    def refresh(self, *args):
+        grasps = [grasp.strip() for grasp in str(self.grasps_input.text()).split(",") if grasp.strip()]
+        max_duration = self.duration_input.value() or None
+        name = str(self.name_input.text()).strip() or None
+        self.entries = self.index.search(self.directory(), grasps, max_duration = max_duration, name = name)
+
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(self.entries))
+        prefix = os.path.join(os.path.realpath(self.directory()), "")
+        for row, entry in enumerate(self.entries):
+            name_item = QTableWidgetItem(entry.path[len(prefix):])
+            name_item.setToolTip(entry.path)
+            #the row of the entry, the table can be sorted
+            name_item.setData(Qt.UserRole, row)
+            self.table.setItem(row, self.NAME, name_item)
+            nb_steps_item = QTableWidgetItem()
+            nb_steps_item.setData(Qt.DisplayRole, entry.nb_steps)
+            self.table.setItem(row, self.NB_STEPS, nb_steps_item)
+            duration_item = QTableWidgetItem()
+            duration_item.setData(Qt.DisplayRole, round(entry.duration, 2))
+            self.table.setItem(row, self.DURATION, duration_item)
+            self.table.setItem(row, self.GRASPS, QTableWidgetItem(", ".join(entry.grasps)))
+        self.table.setSortingEnabled(True)
+        self.table.resizeColumnToContents(self.NAME)
+        self.status_label.setText("%d movements" % len(self.entries))
+
+    def selected_path(self):
+        """
+        The path of the selected movement, None if there's none
+        """
+        rows = self.table.selectionModel().selectedRows()
+        if len(rows) == 0:
+            return None
+        return self.entries[self.table.item(rows[0].row(), self.NAME).data(Qt.UserRole)].path
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+
+import numpy
+
+from sr_gui_movement_recorder.playback_engine import DeadlineScheduler, DEFAULT_RATE
+from sr_gui_movement_recorder.movement_compiler import MovementCompiler
+from sr_gui_movement_recorder.movement_io import load_movement
+from sr_gui_movement_recorder.movement_binary import BinaryMovement, is_binary_movement
+from sr_gui_movement_recorder.grasp_library import GraspLibrary
+from sr_gui_movement_recorder.interpolation import LINEAR
+from sr_gui_movement_recorder.playback_metrics import PlaybackMetrics
+
+def default_grasps_file():
+    """
+    The grasps file used by the sr_hand library
+    """
+    import rospkg
+    return os.path.join(rospkg.RosPack().get_path("sr_hand"), "scripts", "sr_hand", "grasps.xml")
+
+def load_grasps(grasps_file = None):
+    """
+    Loads a grasps file without starting a hand library,
+    returns a dictionary of sr_hand Grasp indexed by name.
+    """
+    return GraspLibrary.get(grasps_file or default_grasps_file()).grasps
+
+class MovementPlayer(object):
+    """
+    Plays movements without any GUI.
+
+    hand is anything with a sendupdate_from_dict method (typically
+    a ShadowHand_ROS) or None for a dry run. The movement is played
+    time_scale times faster than its real time (the command rate
+    stays the same). profile is the interpolation profile between
+    the steps (see interpolation.PROFILES).
+    """
+    def __init__(self, hand = None, rate = DEFAULT_RATE, time_scale = 1.0, profile = LINEAR):
+        if time_scale <= 0.0:
+            raise ValueError("The time scale must be positive, got %s" % str(time_scale))
+        self.hand = hand
+        self.rate = float(rate)
+        self.time_scale = float(time_scale)
+        self.profile = profile
+        self.compiler = MovementCompiler()
+        self.scheduler = DeadlineScheduler(self.rate)
+        #the PlaybackMetrics of the last movement played with metrics
+        self.metrics = None
+
+    def compile(self, steps):
+        return self.compiler.compile(steps, self.rate / self.time_scale, self.profile)
+
+    def play(self, steps, should_stop = None, transport = None, metrics_publisher = None):
+        """
+        Plays the steps (a list of StepSpec) once. Returns False if
+        should_stop() or the PlaybackTransport stopped the movement,
+        True otherwise. In a dry run, the movement is only compiled.
+
+        If a metrics publisher is given, the PlaybackMetrics of the movement
+        are published on it and kept in self.metrics.
+        """
+        compiled = self.compile(steps)
+        if self.hand is None:
+            return True
+
+        metrics = None
+        if metrics_publisher is not None:
+            metrics = PlaybackMetrics(compiled, metrics_publisher)
+
+        def send_row(row):
+            self.hand.sendupdate_from_dict(compiled.targets(row))
+            if metrics is not None:
+                metrics.tick(row, self.scheduler.elapsed() * self.time_scale)
+
+        self.scheduler.start()
+        finished = self.scheduler.run(compiled.times / self.time_scale, send_row, should_stop, transport)
+        if metrics is not None:
+            metrics.finish()
+            self.metrics = metrics
+        return finished
+
+    def play_file(self, filename, grasps, should_stop = None, transport = None):
+        """
+        Plays a movement xml file (its grasps are looked up in grasps) or a
+        binary movement file: its steps if it has any, its samples otherwise.
+        """
+        if is_binary_movement(filename):
+            movement = BinaryMovement(filename)
+            steps = movement.steps()
+            if len(steps) == 0:
+                return self.play_recording(movement, should_stop, transport)
+            return self.play(steps, should_stop, transport)
+        return self.play(load_movement(filename, grasps), should_stop, transport)
+
+    def play_recording(self, recording, should_stop = None, transport = None):
+        """
+        Replays all the samples of a JointStateRecording (or of a
+        BinaryMovement) on their recorded timestamps.
+        """
+        if self.hand is None or len(recording) == 0:
+            return True
+        samples = recording.samples()
+        stamps = samples["stamp"]
+        positions = samples["position"]
+        joint_names = recording.joint_names
+
+        def send_row(row):
+            #the joint states are in radians, the hand library expects degrees
+            self.hand.sendupdate_from_dict(dict(zip(joint_names, numpy.degrees(positions[row]).tolist())))
+
+        self.scheduler.start()
+        return self.scheduler.run((stamps - stamps[0]) / self.time_scale, send_row, should_stop, transport)
@@ -22,263 +22,46 @@ from qt_gui.plugin import Plugin
 from python_qt_binding import loadUi
 
 from QtCore import QEvent, QObject, Qt, QTimer, Slot, SIGNAL, pyqtSignal
-from QtGui import QDockWidget, QShortcut, QMessageBox, QWidget, QFrame, QColor, QLabel, QComboBox, QLineEdit, QPushButton, QHBoxLayout, QVBoxLayout, QGridLayout, QIcon, QFileDialog
-from PyQt4.Qt import QTimer, QLayout, QPalette, QDoubleValidator, QIntValidator
+from QtGui import QDockWidget, QShortcut, QMessageBox, QWidget, QFrame, QColor, QLabel, QComboBox, QLineEdit, QPushButton, QHBoxLayout, QVBoxLayout, QGridLayout, QIcon, QFileDialog, QTableView, QAbstractItemView, QHeaderView, QCheckBox
+from PyQt4.Qt import QTimer, QLayout, QPalette, QDoubleValidator, QIntValidator, QSpinBox
 from pr2_mechanism_msgs.srv import ListControllers, SwitchController, LoadController
+from trajectory_msgs.msg import JointTrajectory
 
 
-import xml.etree.ElementTree as ET
-import time, threading
-
 from sr_hand.shadowhand_ros import ShadowHand_ROS
-
-class Step(QWidget):
-    """
-    A step in a sequence of steps which compose a full movement.
-    Contains add / remove steps buttons, loop control, pause / interpolation time,
-    grasp type.
-    """
-    def __init__(self, parent, step_index, plugin_parent):
-        QWidget.__init__(self, parent = parent)
-        self.step_index = step_index
-        self.parent = plugin_parent
-        self.grasp = 0
-        self.pause_time = 0
-        self.interpolation_time = 1
-        self.loop_to_step = -1
-        self.number_of_loops = 0
-        self.remaining_loops = 0
-
-        self.widgets = []
-
-    def draw(self):
-        self.frame = QFrame(self)
-        self.green = QColor(153, 231, 96)
-        self.saved_palette = self.palette()
-        green_palette = self.palette()
-        green_palette.setBrush(QPalette.Window, self.green)
-        self.frame.setPalette(green_palette)
-
-        self.grasp = self.parent.library.grasp_parser.grasps.values()[0]
-        label_grasp = QLabel(self.frame)
-        label_grasp.setText("Grasp:  ")# + str(self.step_index + 1) + ":")
-        self.widgets.append(label_grasp)
-
-        self.list_grasp = QComboBox(self.frame)
-        self.refresh_list()
-        self.frame.connect(self.list_grasp, SIGNAL('activated(QString)'), self.grasp_choosed)
-        self.widgets.append(self.list_grasp)
-
-
-        label_pause = QLabel(self.frame)
-        label_pause.setText(" Pause Time:")
-        self.widgets.append(label_pause)
-
-        self.pause_input = QLineEdit(self.frame)
-        self.pause_input.setValidator(QDoubleValidator(self))
-        self.pause_input.setText("0.0")
-        self.pause_input.setFixedWidth(35)
-        self.pause_input.setAlignment(Qt.AlignRight)
-        self.frame.connect(self.pause_input, SIGNAL('textChanged(QString)'), self.pause_changed)
-        self.widgets.append(self.pause_input)
-
-        label_interp = QLabel(self.frame)
-        label_interp.setText("s.   Interpolation Time:")
-        self.widgets.append(label_interp)
-
-        self.interp_input = QLineEdit(self.frame)
-        self.interp_input.setValidator(QDoubleValidator(self))
-        self.interp_input.setText("1.0")
-        self.interp_input.setAlignment(Qt.AlignRight)
-        self.interp_input.setFixedWidth(35)
-        self.frame.connect(self.interp_input, SIGNAL('textChanged(QString)'), self.interp_changed)
-        self.widgets.append(self.interp_input)
-
-        label_looping = QLabel(self.frame)
-        label_looping.setText("s.   Looping from step:")
-        self.widgets.append(label_looping)
-
-        self.loop_input = QComboBox(self.frame)
-        for i in range(0, self.step_index + 1):
-            if i == 0:
-                self.loop_input.addItem("None")
-            else:
-                self.loop_input.addItem(str(i))
-        self.frame.connect(self.loop_input, SIGNAL('activated(QString)'), self.choose_looping)
-        self.widgets.append(self.loop_input)
-
-        self.number_loops = QLineEdit(self.frame)
-        self.number_loops.setValidator(QIntValidator(self))
-        self.number_loops.setDisabled(True)
-        self.number_loops.setText("0")
-        self.number_loops.setAlignment(Qt.AlignRight)
-        self.number_loops.setFixedWidth(35)
-        #self.number_loops.setReadOnly(True)
-        #self.number_loops.setStyleSheet("QWidget { background-color: lightgrey }")
-        self.frame.connect(self.number_loops, SIGNAL('textChanged(QString)'), self.number_loops_changed)
-        self.widgets.append(self.number_loops)
-
-        label_times = QLabel(self.frame)
-        label_times.setText("times. ")
-        self.widgets.append(label_times)
-
-        self.new_step_button = QPushButton(self.frame)
-        self.new_step_button.setText("+")
-        self.new_step_button.setFixedWidth(20)
-        self.frame.connect(self.new_step_button, SIGNAL('clicked()'), self.add_step)
-        self.widgets.append(self.new_step_button)
-
-        self.remove_step_button = QPushButton(self.frame)
-        self.remove_step_button.setText("-")
-        self.remove_step_button.setFixedWidth(20)
-        self.frame.connect(self.remove_step_button, SIGNAL('clicked()'), self.remove_step)
-        self.widgets.append(self.remove_step_button)
-
-        self.layout = QHBoxLayout()
-        self.layout.setAlignment(Qt.AlignCenter)
-        self.layout.setSpacing(2)
-        self.layout.addWidget(label_grasp)
-        self.layout.addWidget(self.list_grasp)
-        self.layout.addWidget(label_pause)
-        self.layout.addWidget(self.pause_input)
-        self.layout.addWidget(label_interp)
-        self.layout.addWidget(self.interp_input)
-        self.layout.addWidget(label_looping)
-        self.layout.addWidget(self.loop_input)
-        self.layout.addWidget(self.number_loops)
-        self.layout.addWidget(label_times)
-        self.layout.addWidget(self.new_step_button)
-        self.layout.addWidget(self.remove_step_button)
-
-        self.frame.setLayout(self.layout)
-
-        layout = QVBoxLayout()
-        layout.addWidget(self.frame)
-        self.frame.show()
-        self.setLayout(layout)
-        #self.setWidget(self.frame)
-        self.show()
-
-    def grasp_choosed(self, grasp_name):
-        self.grasp = self.parent.library.grasp_parser.grasps[str(grasp_name)]
-
-    def pause_changed(self, pause_time):
-        self.pause_time = float(pause_time)
-
-    def interp_changed(self, interp_time):
-        self.interpolation_time = float(interp_time)
-
-    def add_step(self):
-        self.parent.add_step()
-
-    def number_loops_changed(self, number_loops):
-        self.number_of_loops = int(number_loops)
-
-    def choose_looping(self, looping):
-        if looping == "None":
-            self.number_loops.setDisabled(True)
-            self.number_loops.setText("0")
-            self.loop_to_step = -1
-        else:
-            self.number_loops.setEnabled(True)
-            self.number_loops.setText("1")
-            self.loop_to_step = int(looping) - 1
-
-    def remove_step(self, delete_first=False):
-        """
-        Make sure we don't delete the first item from the GUI
-        """
-        if not delete_first:
-            if len(self.parent.steps) <= 1:
-                return
-        self.close()
-        self.parent.steps.remove(self)
-        del self
-
-    def set_step_id(self, index):
-        self.step_index = index
-
-    def is_playing(self):
-        self.frame.setAutoFillBackground(True)
-        self.frame.repaint()
-
-    def stopped_playing(self):
-        self.frame.setAutoFillBackground(False)
-        self.frame.repaint()
-
-    def save_to_xml(self):
-        xml_step = ET.Element("step")
-        grasp = ET.SubElement(xml_step, "grasp")
-        grasp.set("name", self.grasp.grasp_name)
-        pause = ET.SubElement(xml_step, "pause_time")
-        pause.text = str(self.pause_time)
-        interpolation = ET.SubElement(xml_step, "interpolation_time")
-        interpolation.text = str(self.interpolation_time)
-        looping = ET.SubElement(xml_step, "loop_to_step")
-        looping.text = str(self.loop_to_step)
-        nb_loops = ET.SubElement(xml_step, "number_loops")
-        nb_loops.text = str(self.number_of_loops)
-        return xml_step
-
-    def load_from_xml(self, xml_element):
-        for subelement in xml_element:
-            if subelement.tag == "grasp":
-                grasp_name = subelement.attrib.get("name")
-                self.grasp_choosed(grasp_name)
-                list_grasps = self.parent.library.grasp_parser.grasps.keys()
-                list_grasps.sort()
-                for index, grasp_name_ref in zip(range(0, len(list_grasps)), list_grasps):
-                    if grasp_name == grasp_name_ref:
-                        self.list_grasp.setCurrentIndex(index)
-                        break
-            if subelement.tag == "pause_time":
-                self.pause_time = float(subelement.text)
-                self.pause_input.setText(subelement.text)
-
-            if subelement.tag == "interpolation_time":
-                self.interpolation_time = float(subelement.text)
-                self.interp_input.setText(subelement.text)
-
-            if subelement.tag == "loop_to_step":
-                self.loop_to_step = int(subelement.text)
-                self.loop_input.setCurrentIndex(self.loop_to_step + 1)
-                if self.loop_to_step == -1:
-                    self.number_loops.setDisabled(True)
-                else:
-                    self.number_loops.setEnabled(True)
-
-            if subelement.tag == "number_loops":
-                self.number_of_loops = int(subelement.text)
-                self.number_loops.setText(subelement.text)
-        self.grasp_slider = None
-
-    def refresh_list(self, value = 0):
-        self.list_grasp.clear()
-        self.parent.library.grasp_parser.refresh()
-        list_grasps = self.parent.library.grasp_parser.grasps.keys()
-        list_grasps.sort()
-        for grasp_name in list_grasps:
-            self.list_grasp.addItem(grasp_name)
-
-class SignalWidget(QWidget):
-    """
-    Qt Signal used to state when a step is playing / stopped.
-    """
-    isPlayingSig = pyqtSignal(int)
-    stoppedPlayingSig = pyqtSignal(int)
-
-    def __init__(self, parent=None):
-        super(SignalWidget, self).__init__(parent)
+from sr_gui_movement_recorder.playback_engine import PlaybackTransport, DEFAULT_RATE, MIN_RATE, MAX_RATE
+from sr_gui_movement_recorder.movement_compiler import MovementCompiler, movement_duration
+from sr_gui_movement_recorder.interpolation import PROFILES
+from sr_gui_movement_recorder.movement_io import save_movement, iter_movement
+from sr_gui_movement_recorder.movement_binary import BinaryMovement, save_binary, is_binary_movement
+from sr_gui_movement_recorder.step_model import StepModel, StepDelegate
+from sr_gui_movement_recorder.grasp_library import GraspLibrary
+from sr_gui_movement_recorder.movement_player import MovementPlayer
+from sr_gui_movement_recorder.joint_state_recorder import JointStateRecorder, JointStateRecording
+from sr_gui_movement_recorder.trajectory_execution import movement_to_trajectory, EXECUTOR_TOPIC
+from sr_gui_movement_recorder.multi_hand_player import MultiHandPlayer, HandPublisher, parse_hands
+from sr_gui_movement_recorder.playback_metrics import PlaybackMetrics, metrics_publisher
+from sr_gui_movement_recorder.movement_validator import JointLimits, validate_movement, violations_by_step, describe_violation
+from sr_gui_movement_recorder.movement_retiming import retime_steps, RetimingError
+from sr_gui_movement_recorder.playback_worker import PlaybackWorker, EventLoopMonitor
+from sr_gui_movement_recorder.movement_index import MovementIndex
+from sr_gui_movement_recorder.movement_library import MovementLibraryDialog
 
 class SrGuiMovementRecorder(Plugin):
     """
     A rosgui plugin for recording and replaying movements
     """
+    LOAD_CHUNK_SIZE = 500
+    #time given to the trajectory executor to receive the movement before it starts
+    EXECUTION_LEAD = 0.2
+    #the steps are checked against the joint limits when they haven't changed for this long (ms)
+    VALIDATION_DELAY = 300
+
     def __init__(self, context):
         super(SrGuiMovementRecorder, self).__init__(context)
         self.setObjectName('SrGuiMovementRecorder')
 
-        self._publisher = None
+        self._publisher = rospy.Publisher(EXECUTOR_TOPIC, JointTrajectory)
         self._widget = QWidget()
 
         ui_file = os.path.join(rospkg.RosPack().get_path('sr_gui_movement_recorder'), 'uis', 'SrGuiMovementRecorder.ui')
@@ -294,9 +77,6 @@ class SrGuiMovementRecorder(Plugin):
         self.layout = QVBoxLayout()
         self.layout.setSpacing(2)
 
-        self.layout.setAlignment(Qt.AlignCenter)
-        self.layout.setSizeConstraint(QLayout.SetFixedSize)
-
         self.sublayout = QGridLayout()
         self.command_frame = QFrame()
 
@@ -306,14 +86,25 @@ class SrGuiMovementRecorder(Plugin):
         self.command_frame.connect(self.play_btn, SIGNAL('clicked()'), self.button_play_clicked)
         self.sublayout.addWidget(self.play_btn, 0, 0)
 
-        self.signal_widget = SignalWidget(self.frame)
-        self.signal_widget.isPlayingSig['int'].connect(self.started_playing)
-        self.signal_widget.stoppedPlayingSig['int'].connect(self.stopped_playing)
-
-        self.mutex = threading.Lock()
-        self.stopped = True
-
-        self.thread = None
+        #stop / pause / seek commands for the playback thread
+        self.transport = PlaybackTransport()
+        self.transport.stop()
+
+        #the movements are played in the thread of the worker, which only
+        # reports back to the GUI thread through queued signals
+        self.worker = PlaybackWorker(self.transport)
+        self.worker.stepStarted.connect(self.started_playing, Qt.QueuedConnection)
+        self.worker.stepStopped.connect(self.stopped_playing, Qt.QueuedConnection)
+        self.worker.playbackFinished.connect(self.playback_finished, Qt.QueuedConnection)
+        self.playing = False
+        self.latency_monitor = EventLoopMonitor(self.frame)
+
+        self.compiler = MovementCompiler()
+        self.compiled_movement = None
+        #the CompiledMovement being played, None when nothing is played
+        # or when replaying a recording (which has no steps to seek to)
+        self.playing_movement = None
+        self.executing_remotely = False
 
         self.stop_btn = QPushButton()
         self.stop_btn.setText("Stop")
@@ -321,7 +112,13 @@ class SrGuiMovementRecorder(Plugin):
         self.command_frame.connect(self.stop_btn, SIGNAL('clicked()'), self.stop)
         self.sublayout.addWidget(self.stop_btn, 0, 1)
 
-        self.sublayout.addWidget(QLabel(''), 0, 2)
+        self.pause_btn = QPushButton()
+        self.pause_btn.setText("Pause")
+        self.pause_btn.setCheckable(True)
+        self.pause_btn.setDisabled(True)
+        self.pause_btn.setFixedWidth(80)
+        self.command_frame.connect(self.pause_btn, SIGNAL('toggled(bool)'), self.pause)
+        self.sublayout.addWidget(self.pause_btn, 0, 2)
 
         self.save_btn = QPushButton()
         self.save_btn.setText("Save")
@@ -335,9 +132,131 @@ class SrGuiMovementRecorder(Plugin):
         self.command_frame.connect(self.load_btn, SIGNAL('clicked()'), self.load)
         self.sublayout.addWidget(self.load_btn, 0, 4)
 
+        self.sublayout.addWidget(QLabel('  Rate (Hz):'), 0, 5)
+        self.rate_input = QSpinBox()
+        self.rate_input.setRange(int(MIN_RATE), int(MAX_RATE))
+        self.rate_input.setSingleStep(50)
+        self.rate_input.setValue(int(DEFAULT_RATE))
+        self.sublayout.addWidget(self.rate_input, 0, 6)
+
+        self.sublayout.addWidget(QLabel('  Profile:'), 0, 7)
+        self.profile_input = QComboBox()
+        self.profile_input.addItems(list(PROFILES))
+        self.profile_input.setToolTip("linear: constant speed between the steps\n"
+                                      "minimum_jerk: smooth start and stop at each step\n"
+                                      "cubic: smooth motion through the steps without a pause")
+        self.sublayout.addWidget(self.profile_input, 0, 8)
+
+        self.duration_label = QLabel()
+        self.sublayout.addWidget(self.duration_label, 0, 9)
+
+        self.retime_btn = QPushButton()
+        self.retime_btn.setText("Retime")
+        self.retime_btn.setFixedWidth(80)
+        self.retime_btn.setToolTip("Set the interpolation times to the shortest ones\n"
+                                   "allowed by the velocity and acceleration limits")
+        self.command_frame.connect(self.retime_btn, SIGNAL('clicked()'), self.retime)
+        self.sublayout.addWidget(self.retime_btn, 0, 10)
+
+        try:
+            self.joint_limits = JointLimits.load()
+        except IOError, e:
+            rospy.logwarn("Couldn't load the joint limits, the movements won't be checked: " + str(e))
+            self.joint_limits = JointLimits()
+        self.validation_timer = QTimer(self.frame)
+        self.validation_timer.setSingleShot(True)
+        self.validation_timer.setInterval(self.VALIDATION_DELAY)
+        self.validation_timer.timeout.connect(self.validate)
+        self.rate_input.valueChanged.connect(self.steps_changed)
+        self.profile_input.currentIndexChanged.connect(self.steps_changed)
+
+        self.recorder = None
+        self.record_btn = QPushButton()
+        self.record_btn.setText("Record")
+        self.record_btn.setCheckable(True)
+        self.record_btn.setFixedWidth(80)
+        self.command_frame.connect(self.record_btn, SIGNAL('toggled(bool)'), self.record)
+        self.sublayout.addWidget(self.record_btn, 1, 0)
+
+        self.replay_btn = QPushButton()
+        self.replay_btn.setText("Replay")
+        self.replay_btn.setFixedWidth(80)
+        self.command_frame.connect(self.replay_btn, SIGNAL('clicked()'), self.replay)
+        self.sublayout.addWidget(self.replay_btn, 1, 1)
+
+        #the timing and tracking metrics of the last movement played
+        self.metrics = None
+        self.metrics_publisher = metrics_publisher()
+        self.metrics_btn = QPushButton()
+        self.metrics_btn.setText("Metrics")
+        self.metrics_btn.setToolTip("Save the metrics of the last movement played (csv or npz)")
+        self.metrics_btn.setDisabled(True)
+        self.metrics_btn.setFixedWidth(80)
+        self.command_frame.connect(self.metrics_btn, SIGNAL('clicked()'), self.save_metrics)
+        self.sublayout.addWidget(self.metrics_btn, 1, 2)
+
+        self.add_step_btn = QPushButton()
+        self.add_step_btn.setText("+")
+        self.add_step_btn.setToolTip("Add a step after the selected one")
+        self.add_step_btn.setFixedWidth(80)
+        self.command_frame.connect(self.add_step_btn, SIGNAL('clicked()'), self.add_step)
+        self.sublayout.addWidget(self.add_step_btn, 1, 3)
+
+        self.remove_step_btn = QPushButton()
+        self.remove_step_btn.setText("-")
+        self.remove_step_btn.setToolTip("Remove the selected steps")
+        self.remove_step_btn.setFixedWidth(80)
+        self.command_frame.connect(self.remove_step_btn, SIGNAL('clicked()'), self.remove_steps)
+        self.sublayout.addWidget(self.remove_step_btn, 1, 4)
+
+        self.executor_checkbox = QCheckBox("Run on trajectory executor")
+        self.executor_checkbox.setToolTip("Send the whole movement to the trajectory_executor node\n"
+                                          "instead of streaming the targets from the GUI")
+        self.sublayout.addWidget(self.executor_checkbox, 1, 5, 1, 3)
+
+        self.sublayout.addWidget(QLabel('  Hands:'), 1, 8)
+        self.hands_input = QLineEdit()
+        self.hands_input.setToolTip("Play the movement on several hands in sync: their namespaces,\n"
+                                    "each with an optional time offset in seconds (/hand_1, /hand_2@0.5).\n"
+                                    "Leave empty to play on this hand only.")
+        self.sublayout.addWidget(self.hands_input, 1, 9)
+        #the publishers of the other hands, kept between the playbacks
+        self.hand_publishers = {}
+
+        #the index of the movement files, opened the first time the library is browsed
+        self.movement_index = None
+        self.library_directory = os.path.join(rospkg.RosPack().get_path('sr_gui_movement_recorder'), 'saved_src')
+        self.library_btn = QPushButton()
+        self.library_btn.setText("Library")
+        self.library_btn.setToolTip("Search the movements of a directory by grasp, duration or name")
+        self.library_btn.setFixedWidth(80)
+        self.command_frame.connect(self.library_btn, SIGNAL('clicked()'), self.browse_library)
+        self.sublayout.addWidget(self.library_btn, 1, 10)
+
         self.command_frame.setLayout(self.sublayout)
         self.layout.addWidget(self.command_frame)
 
+        #the steps are displayed in a table: only the cell being
+        # edited has a widget, so long movements stay cheap to display
+        self.grasp_library = GraspLibrary.for_parser(self.library.grasp_parser)
+        self.step_model = StepModel(self.grasp_library, self.frame)
+        self.step_view = QTableView()
+        self.step_view.setModel(self.step_model)
+        self.step_view.setItemDelegate(StepDelegate(self.step_view))
+        self.step_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.step_view.setEditTriggers(QAbstractItemView.AllEditTriggers)
+        self.step_view.verticalHeader().setDefaultSectionSize(22)
+        self.step_view.horizontalHeader().setResizeMode(StepModel.GRASP, QHeaderView.Stretch)
+        self.layout.addWidget(self.step_view)
+
+        #double clicking a step while playing continues the movement from it
+        self.step_view.doubleClicked.connect(self.seek_to_step)
+
+        self.step_model.dataChanged.connect(self.steps_changed)
+        self.step_model.rowsInserted.connect(self.steps_changed)
+        self.step_model.rowsRemoved.connect(self.steps_changed)
+        self.step_model.modelReset.connect(self.steps_changed)
+
         self.frame.setLayout(self.layout)
 
         path_to_icons = os.path.join( rospkg.RosPack().get_path('sr_visualization_icons'), 'icons')
@@ -346,8 +265,8 @@ class SrGuiMovementRecorder(Plugin):
         self.stop_btn.setIcon( QIcon( os.path.join( path_to_icons, 'stop.png' )))
         self.play_btn.setIcon( QIcon( os.path.join( path_to_icons, 'play.png' )))
 
-        self.steps = []
         self.add_step()
+        self.step_view.resizeColumnsToContents()
 
     def save(self):
         filename = QFileDialog.getSaveFileName(self.frame, 'Save Script', '')
@@ -356,149 +275,325 @@ class SrGuiMovementRecorder(Plugin):
         if filename == "":
             return
 
-        root = ET.Element("movement")
-        for step in self.steps:
-            root.append(step.save_to_xml())
-
-        self.indent(root)
-        tree = ET.ElementTree(root)
-
-        tree.write(filename)
-
-    def indent(self, elem, level=0):
-        """
-        print a prettier / indented xml tree
-        """
-        i = "\n" + level * "  "
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "  "
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                self.indent(elem, level + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
+        if is_binary_movement(filename):
+            #the binary files embed the positions of the grasps
+            save_binary(filename, self.step_specs())
         else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
+            save_movement(filename, self.step_specs())
 
     def load(self):
         """
         remove all the present steps
-        and load new from xml file
+        and load new from xml file (or binary .srm file)
         """
         filename = QFileDialog.getOpenFileName(self.frame, 'Open Script', '')
         filename = filename[0]
 
-        if filename != "":
-            self.remove_all_steps()
-
-            tree = ET.parse(filename)
-            root = tree.getroot()
-            xml_steps = tree.findall("step")
+        if filename == "":
+            return
+        self.load_file(filename)
+
+    def load_file(self, filename):
+        self.step_model.clear()
+        self.step_model.refresh_grasps()
+        #stream the steps into the model, a chunk at a time
+        chunk = []
+        try:
+            if is_binary_movement(filename):
+                steps = BinaryMovement(str(filename)).steps()
+            else:
+                steps = iter_movement(filename, self.grasp_library.grasps)
+            for step in steps:
+                chunk.append(step)
+                if len(chunk) == self.LOAD_CHUNK_SIZE:
+                    self.step_model.append_steps(chunk)
+                    chunk = []
+        except ValueError, e:
+            QMessageBox.warning(self.frame, "Warning", "Couldn't load " + filename + ":\n" + str(e))
+        self.step_model.append_steps(chunk)
+
+    def browse_library(self):
+        """
+        Load a movement found in the movement library
+        """
+        if self.movement_index is None:
+            self.movement_index = MovementIndex()
+        dialog = MovementLibraryDialog(self.movement_index, self.library_directory, self.frame)
+        accepted = dialog.exec_()
+        self.library_directory = dialog.directory()
+        if accepted and dialog.selected_path() is not None:
+            self.load_file(dialog.selected_path())
+
+    def record(self, recording):
+        """
+        Start / stop recording the joint states to a file
+        """
+        if recording:
+            filename = QFileDialog.getSaveFileName(self.frame, 'Record Joint States', '', 'Recordings (*.npy)')
+            filename = filename[0]
+            if filename == "":
+                self.record_btn.setChecked(False)
+                return
+            if not filename.endswith(".npy"):
+                filename += ".npy"
+            self.recorder = JointStateRecorder(str(filename))
+        elif self.recorder is not None:
+            recording = self.recorder.stop()
+            if recording is not None:
+                rospy.loginfo("Recorded %d joint states (%d dropped)" % (len(recording), self.recorder.dropped))
+                recording.close()
+            self.recorder = None
+
+    def replay(self):
+        """
+        Replay a joint states recording
+        """
+        if self.playing:
+            return
+        filename = QFileDialog.getOpenFileName(self.frame, 'Open Recording', '', 'Recordings (*.npy *.srm)')
+        filename = filename[0]
+        if filename == "":
+            return
 
-            for step in xml_steps:
-                self.add_step()
-                self.steps[-1].load_from_xml(step)
+        if is_binary_movement(filename):
+            recording = BinaryMovement(str(filename))
+        else:
+            recording = JointStateRecording.open(str(filename))
 
-    def remove_all_steps(self):
-        while len(self.steps) != 0:
-            self.steps[0].remove_step(delete_first=True)
+        self.enable_controls(False)
+        self.transport.reset()
+        self.pause_btn.setEnabled(True)
+        self.playing_movement = None
+        self.worker.play_recording(MovementPlayer(self.library), recording)
+        self.start_playing()
 
     def started_playing(self, index):
-        self.steps[index].is_playing()
+        self.step_model.set_playing(index)
 
     def stopped_playing(self, index):
-        self.steps[index].stopped_playing()
+        self.step_model.set_playing(None)
 
     def add_step(self):
-        step_tmp = Step(self.frame, len(self.steps), self)
-        self.steps.append(step_tmp)
-        self.layout.addWidget(step_tmp)
-        step_tmp.draw()
-        for step, index in zip(self.steps, range(0, len(self.steps))):
-            step.set_step_id(index)
+        """
+        Add a step after the selected one (or at the end)
+        """
+        rows = self.selected_rows()
+        if len(rows) == 0:
+            row = self.step_model.rowCount()
+        else:
+            row = rows[-1] + 1
+        self.step_model.insert_steps(row, [self.step_model.make_step()])
+        self.step_view.selectRow(row)
 
-    def button_play_clicked(self):
-        if len(self.steps) < 1:
-            return
+    def remove_steps(self):
+        """
+        Remove the selected steps, making sure we don't delete all of them
+        """
+        for row in reversed(self.selected_rows()):
+            if self.step_model.rowCount() <= 1:
+                return
+            self.step_model.remove_steps(row)
 
-        self.play_btn.setDisabled(True)
-        self.load_btn.setDisabled(True)
+    def selected_rows(self):
+        return sorted(index.row() for index in self.step_view.selectionModel().selectedRows())
 
-        for step in self.steps:
-            step.remove_step_button.setDisabled(True)
-            step.new_step_button.setDisabled(True)
-            step.remaining_loops = step.number_of_loops
+    def step_specs(self):
+        return self.step_model.snapshot()
 
-        self.thread = threading.Thread(None, self.play)
-        self.thread.start()
+    def steps_changed(self, *args):
+        """
+        Refresh the total duration of the movement, and check it
+        against the joint limits once the editing is finished
+        """
+        self.duration_label.setText("  Duration: %.2f s" % movement_duration(self.step_specs()))
+        if self.step_model.editable:
+            self.validation_timer.start()
+
+    def validate(self, compiled = None):
+        """
+        Highlight the steps of the compiled movement (compiling the current
+        steps by default) going over the joint limits.
+        Returns the list of violations.
+        """
+        if compiled is None:
+            compiled = self.compiler.compile(self.step_specs(), self.rate_input.value(),
+                                             str(self.profile_input.currentText()))
+        violations = validate_movement(compiled, self.joint_limits)
+        self.step_model.set_invalid(violations_by_step(violations))
+        text = "  Duration: %.2f s" % compiled.duration
+        if len(violations) > 0:
+            text += ", %d steps over the limits" % len(set(violation.step for violation in violations))
+        self.duration_label.setText(text)
+        return violations
+
+    def retime(self):
+        """
+        Replace the interpolation times by the shortest ones allowed by the joint limits
+        """
+        steps = self.step_specs()
+        try:
+            retimed = retime_steps(steps, self.joint_limits, self.rate_input.value(),
+                                   str(self.profile_input.currentText()))
+        except RetimingError, e:
+            answer = QMessageBox.question(self.frame, "Joint limits",
+                                          "%s, the first one being:\n%s\n\nUse these times anyway?" %
+                                          (str(e), describe_violation(e.violations[0])),
+                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return
+            retimed = e.steps
+        rospy.loginfo("Movement retimed from %.2f s to %.2f s" % (movement_duration(steps), movement_duration(retimed)))
+        self.step_model.replace_steps(retimed)
+
+    def set_editable(self, editable):
+        self.step_model.set_editable(editable)
+        self.add_step_btn.setEnabled(editable)
+        self.remove_step_btn.setEnabled(editable)
+        self.retime_btn.setEnabled(editable)
+        if editable:
+            self.step_view.setEditTriggers(QAbstractItemView.AllEditTriggers)
+        else:
+            self.step_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
 
-    def play(self):
-        self.stopped = False
-        first_time = True
-        index = 0
+    def enable_controls(self, enabled):
+        """
+        Enable the controls which can't be used while playing
+        """
+        self.set_editable(enabled)
+        self.play_btn.setEnabled(enabled)
+        self.replay_btn.setEnabled(enabled)
+        self.load_btn.setEnabled(enabled)
+        self.library_btn.setEnabled(enabled)
+        self.rate_input.setEnabled(enabled)
+        self.profile_input.setEnabled(enabled)
+        self.hands_input.setEnabled(enabled)
+        self.executor_checkbox.setEnabled(enabled)
+        if enabled:
+            self.pause_btn.setChecked(False)
+            self.pause_btn.setDisabled(True)
+            self.metrics_btn.setEnabled(self.metrics is not None)
 
-        while index < len(self.steps):
-            self.mutex.acquire()
-            if self.stopped:
-                self.mutex.release()
+    def button_play_clicked(self):
+        if self.playing or self.step_model.rowCount() < 1:
+            return
+
+        try:
+            hands = parse_hands(str(self.hands_input.text()))
+        except ValueError, e:
+            QMessageBox.warning(self.frame, "Warning", str(e))
+            return
+
+        #everything the playback needs is taken now: editing the steps
+        # while playing doesn't change the movement being played
+        self.compiled_movement = self.compiler.compile(self.step_specs(), self.rate_input.value(),
+                                                       str(self.profile_input.currentText()))
+        self.validation_timer.stop()
+        violations = self.validate(self.compiled_movement)
+        if len(violations) > 0:
+            answer = QMessageBox.question(self.frame, "Joint limits",
+                                          "%d limits are exceeded, the first one being:\n%s\n\nPlay anyway?" %
+                                          (len(violations), describe_violation(violations[0])),
+                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
                 return
-            self.mutex.release()
 
-            step = self.steps[index]
-            index = self.play_step(step, first_time, index)
-            first_time = False
+        self.enable_controls(False)
+        self.transport.reset()
+        if self.executor_checkbox.isChecked():
+            self.executing_remotely = True
+            start_time = rospy.Time.now() + rospy.Duration.from_sec(self.EXECUTION_LEAD)
+            self._publisher.publish(movement_to_trajectory(self.compiled_movement, start_time))
+            self.worker.follow(self.compiled_movement, self.EXECUTION_LEAD)
+        elif len(hands) > 0:
+            self.pause_btn.setEnabled(True)
+            player, start_delay = self.hands_player(hands)
+            self.worker.play_hands(player, start_delay)
+        else:
+            self.pause_btn.setEnabled(True)
+            metrics = PlaybackMetrics(self.compiled_movement, self.metrics_publisher)
+            self.worker.play(self.library, self.compiled_movement, metrics)
+        self.playing_movement = self.compiled_movement
+        self.start_playing()
 
+    def hands_player(self, hands):
+        """
+        The MultiHandPlayer playing the movement on all the given hands
+        (namespace, time offset), and the delay before starting it
+        """
+        new_hands = [namespace for namespace, offset in hands if namespace not in self.hand_publishers]
+        for namespace in new_hands:
+            self.hand_publishers[namespace] = HandPublisher(namespace)
+
+        player = MultiHandPlayer(self.rate_input.value(), self.compiled_movement.profile, self.compiler)
+        steps = self.step_specs()
+        for namespace, offset in hands:
+            player.add_hand(self.hand_publishers[namespace], steps, offset)
+        #the new publishers need some time to connect to the controllers
+        start_delay = self.EXECUTION_LEAD if new_hands else 0.0
+        return player, start_delay
+
+    def start_playing(self):
+        self.playing = True
+        self.latency_monitor.start()
+
+    def playback_finished(self, finished, metrics):
+        """
+        Called in the GUI thread when the worker has finished playing
+        (finished is False if the playback was stopped)
+        """
+        self.playing = False
+        self.playing_movement = None
+        rospy.loginfo("GUI latency while playing: " + str(self.latency_monitor.stop()))
+        if metrics is not None:
+            self.metrics = metrics
+        if finished:
+            self.executing_remotely = False
         self.stop()
 
     def stop(self):
-        for step in self.steps:
-            step.new_step_button.setEnabled(True)
-            step.remove_step_button.setEnabled(True)
-        self.mutex.acquire()
-        self.stopped = True
-        self.mutex.release()
-        self.play_btn.setEnabled(True)
-        self.load_btn.setEnabled(True)
-
-    def play_step(self, step, first_time, index):
-        if first_time:
-            self.current_step = step
-            return index + 1
-        next_step = step
-
-        self.signal_widget.isPlayingSig['int'].emit(index)
-        self.move_step(next_step)
-        self.signal_widget.stoppedPlayingSig['int'].emit(index)
-
-        self.current_step = next_step
-
-        #looping?
-        if step.loop_to_step != -1:
-            if step.remaining_loops > 0:
-                step.remaining_loops = step.remaining_loops - 1
-                return step.loop_to_step
-        return index + 1
-
-    def move_step(self, next_step):
-        interpoler = self.library.create_grasp_interpoler(self.current_step.grasp, next_step.grasp)
-        if self.current_step.interpolation_time == 0.0:
-            self.library.sendupdate_from_dict(next_step.grasp.joints_and_positions)
-        else:
-            for interpolation in range (0, 10 * int(self.current_step.interpolation_time)):
-                self.mutex.acquire()
-                if self.stopped:
-                    self.mutex.release()
-                    return
-                self.mutex.release()
+        if self.executing_remotely:
+            #an empty trajectory stops the executor
+            self._publisher.publish(JointTrajectory())
+            self.executing_remotely = False
+        self.transport.stop()
+        #the controls are enabled again once the worker has stopped
+        if not self.playing:
+            self.enable_controls(True)
+
+    def save_metrics(self):
+        """
+        Save the metrics of the last movement played
+        """
+        if self.metrics is None:
+            return
+        filename = QFileDialog.getSaveFileName(self.frame, 'Save Metrics', '', 'Metrics (*.csv *.npz)')
+        filename = filename[0]
+        if filename == "":
+            return
+        filename = str(filename)
+        if not filename.endswith(".npz") and not filename.endswith(".csv"):
+            filename += ".csv"
+        self.metrics.save(filename)
 
-                targets_to_send = self.library.grasp_interpoler.interpolate(100.0 * interpolation / (10 * self.current_step.interpolation_time))
-                self.library.sendupdate_from_dict(targets_to_send)
-                time.sleep(0.1)
+    def is_stopped(self):
+        return self.transport.is_stopped()
 
-        time.sleep(self.current_step.pause_time)
+    def pause(self, paused):
+        if paused:
+            self.transport.pause()
+        else:
+            self.transport.resume()
+
+    def seek_to_step(self, index):
+        """
+        Continue the movement being played from the given step
+        """
+        if self.is_stopped() or self.step_model.editable or self.executing_remotely:
+            return
+        if self.playing_movement is None:
+            #replaying a recording: the steps aren't what's being played
+            return
+        self.transport.seek(self.playing_movement.step_time(index.row()))
 
     def _unregisterPublisher(self):
         if self._publisher is not None:
@@ -506,5 +601,14 @@ class SrGuiMovementRecorder(Plugin):
             self._publisher = None
 
     def shutdown_plugin(self):
-        self.remove_all_steps()
+        self.stop()
+        self.worker.shutdown()
+        if self.movement_index is not None:
+            self.movement_index.close()
+        for hand in self.hand_publishers.values():
+            hand.unregister()
+        self.hand_publishers = {}
+        self.record_btn.setChecked(False)
+        self.step_model.clear()
+        self.metrics_publisher.unregister()
         self._unregisterPublisher()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import math
+
+import numpy
+
+from sr_gui_movement_recorder.playback_engine import DEFAULT_RATE
+from sr_gui_movement_recorder.movement_compiler import flatten_steps, compile_movement
+from sr_gui_movement_recorder.movement_validator import validate_movement, VELOCITY, ACCELERATION
+from sr_gui_movement_recorder.interpolation import LINEAR, MINIMUM_JERK, CUBIC
+
+#The peak velocity and acceleration of each profile over a segment going
+# a distance d in a time T, as multiples of d / T and d / T^2 (None when
+# the acceleration isn't bounded). The cubic ones are for a segment
+# starting and ending at rest: the blending is corrected by the validation.
+PROFILE_PEAKS = {LINEAR: (1.0, None),
+                 MINIMUM_JERK: (15.0 / 8.0, 10.0 / math.sqrt(3.0)),
+                 CUBIC: (1.5, 6.0)}
+
+def shortest_durations(key_positions, profile, max_velocities, max_accelerations):
+    """
+    The shortest time of each segment (from key i to key i + 1) for which
+    no joint goes over its max velocity or acceleration (NaN for no limit)
+    """
+    velocity_peak, acceleration_peak = PROFILE_PEAKS[profile]
+    distances = numpy.abs(numpy.diff(numpy.asarray(key_positions, dtype = numpy.float64), axis = 0))
+    durations = numpy.zeros(len(distances))
+    if len(distances) == 0 or distances.shape[1] == 0:
+        #no segment, or steps without any joint
+        return durations
+    #the joints appearing (NaN distances: the steps share no position for
+    # them) or without limits don't constrain anything
+    with numpy.errstate(invalid = "ignore"):
+        times = velocity_peak * distances / max_velocities
+        durations = numpy.maximum(durations, numpy.where(numpy.isfinite(times), times, 0.0).max(axis = 1))
+        if acceleration_peak is not None:
+            times = numpy.sqrt(acceleration_peak * distances / max_accelerations)
+            durations = numpy.maximum(durations, numpy.where(numpy.isfinite(times), times, 0.0).max(axis = 1))
+    return durations
+
+class RetimingError(ValueError):
+    """
+    Raised when no times within the limits were found: steps are the
+    last times tried, violations the limits they still go over.
+    """
+    def __init__(self, message, steps, violations):
+        ValueError.__init__(self, message)
+        self.steps = steps
+        self.violations = violations
+
+def retime_steps(steps, limits, rate = DEFAULT_RATE, profile = LINEAR, minimum_time = None, max_iterations = 10):
+    """
+    Sets the interpolation time of each step to the shortest one allowed by
+    the velocity and acceleration limits (JointLimits) of the joints, rounded
+    up to the command period (and at least minimum_time, one period by
+    default). A step played several times (in a loop) gets the time of its
+    slowest move.
+
+    The times are computed from the distances between the grasps, then the
+    compiled movement is validated and the steps still over the limits are
+    slowed down, until there's no violation left. Returns the list of
+    retimed StepSpec, raises a RetimingError if there are still violations
+    after max_iterations.
+    """
+    if len(steps) < 2:
+        return list(steps)
+    rate = float(rate)
+    period = 1.0 / rate
+    if minimum_time is None:
+        minimum_time = period
+    sequence = numpy.array(flatten_steps(steps))
+    #the step whose interpolation time is used by each segment
+    sources = sequence[:-1]
+    moved = numpy.zeros(len(steps), dtype = bool)
+    moved[sources] = True
+
+    def round_up(times):
+        times = numpy.maximum(times, minimum_time)
+        #a small tolerance so that an exact multiple isn't rounded to the next period
+        return numpy.round(numpy.ceil(times * rate - 1e-6) * period, 6)
+
+    def with_times(times):
+        return [step._replace(interpolation_time = float(times[index])) if moved[index] else step
+                for index, step in enumerate(steps)]
+
+    compiled = compile_movement(steps, rate, profile)
+    minimums, maximums, max_velocities, max_accelerations = limits.arrays(compiled.joint_names)
+    segment_times = shortest_durations(compiled.key_positions, profile, max_velocities, max_accelerations)
+    times = numpy.zeros(len(steps))
+    numpy.maximum.at(times, sources, segment_times)
+    times = round_up(times)
+
+    for iteration in range(max_iterations + 1):
+        retimed = with_times(times)
+        compiled = compile_movement(retimed, rate, profile)
+        violations = [violation for violation in validate_movement(compiled, limits)
+                      if violation.kind in (VELOCITY, ACCELERATION)]
+        if len(violations) == 0:
+            return retimed
+        if iteration == max_iterations:
+            break
+        factors = numpy.ones(len(steps))
+        for violation in violations:
+            segment = int(numpy.searchsorted(compiled.segment_starts, violation.time, side = "left")) - 1
+            ratio = abs(violation.value) / violation.limit
+            if violation.kind == ACCELERATION:
+                ratio = math.sqrt(ratio)
+            source = sources[max(0, segment)]
+            factors[source] = max(factors[source], ratio)
+        times = round_up(times * factors)
+    raise RetimingError("Couldn't retime the movement within the joint limits: %d steps still over them "
+                        "after %d corrections" % (len(set(violation.step for violation in violations)),
+                                                  max_iterations), retimed, violations)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+from collections import namedtuple
+
+import numpy
+import yaml
+
+POSITION = "position"
+VELOCITY = "velocity"
+ACCELERATION = "acceleration"
+UNITS = {POSITION: "deg", VELOCITY: "deg/s", ACCELERATION: "deg/s^2"}
+#relative to the limit: the rounding errors of the finite differences
+# don't put a movement played exactly at the limit over it
+TOLERANCE = 1e-9
+
+#The worst value of a joint over the limit while going to a step
+# (step index, joint name, one of POSITION / VELOCITY / ACCELERATION,
+# value, limit, time in seconds from the start of the movement)
+Violation = namedtuple("Violation", ["step", "joint_name", "kind", "value", "limit", "time"])
+
+def default_limits_file():
+    """
+    The joint limits file of this package
+    """
+    import rospkg
+    return os.path.join(rospkg.RosPack().get_path("sr_gui_movement_recorder"), "config", "joint_limits.yaml")
+
+class JointLimits(object):
+    """
+    The position, velocity and acceleration limits of the joints, in
+    degrees. The defaults (a dictionary like the one of a joint) apply
+    to the joints without their own limits.
+    """
+    def __init__(self, joints = None, defaults = None):
+        self.joints = joints or {}
+        self.defaults = defaults or {}
+
+    @classmethod
+    def load(cls, filename = None):
+        """
+        Reads a joint limits yaml file (the one of this package by default)
+        """
+        limits_file = open(filename or default_limits_file())
+        try:
+            config = yaml.safe_load(limits_file) or {}
+        finally:
+            limits_file.close()
+        return cls(config.get("joints"), config.get("defaults"))
+
+    def limit(self, joint_name, name):
+        value = self.joints.get(joint_name, {}).get(name, self.defaults.get(name))
+        return numpy.nan if value is None else float(value)
+
+    def arrays(self, joint_names):
+        """
+        The minimums, maximums, max velocities and max accelerations of the
+        given joints, NaN where there's no limit
+        """
+        return tuple(numpy.array([self.limit(joint_name, name) for joint_name in joint_names])
+                     for name in ("min", "max", "max_velocity", "max_acceleration"))
+
+def worst_violations(kind, values, excess, limits, compiled, rows):
+    """
+    One Violation per step and joint where excess > 0 (give or take the
+    TOLERANCE), for its largest excess. values and excess have one row per element of rows (the rows
+    of the compiled movement they were measured at), limits one value
+    per joint.
+    """
+    over = excess > TOLERANCE * numpy.abs(limits)
+    if not over.any():
+        return []
+    over_rows, columns = numpy.nonzero(over)
+    nb_joints = len(compiled.joint_names)
+    keys = compiled.step_indices[rows[over_rows]].astype(numpy.int64) * nb_joints + columns
+    #sorted by step and joint, the largest excess first
+    order = numpy.lexsort((-excess[over_rows, columns], keys))
+    firsts = order[numpy.append(True, keys[order][1:] != keys[order][:-1])]
+
+    violations = []
+    for row, column in zip(over_rows[firsts].tolist(), columns[firsts].tolist()):
+        violations.append(Violation(int(compiled.step_indices[rows[row]]), compiled.joint_names[column], kind,
+                                    float(values[row, column]), float(limits[column]),
+                                    float(compiled.times[rows[row]])))
+    return violations
+
+def validate_movement(compiled, limits):
+    """
+    Checks all the targets of a CompiledMovement against the JointLimits,
+    with one vectorized pass over the whole array for each kind of limit.
+    The velocities are the finite differences between the successive
+    targets (from the start position of their segment for the first
+    target of a segment), the accelerations the differences between the
+    velocities within a segment: the instant changes of velocity at the
+    steps of the linear profile aren't counted. A segment with a zero
+    interpolation time is a jump to its target: it has no velocity or
+    acceleration to check.
+
+    Returns the list of Violation, sorted by time.
+    """
+    if len(compiled) == 0:
+        return []
+    minimums, maximums, max_velocities, max_accelerations = limits.arrays(compiled.joint_names)
+    positions = compiled.positions
+    times = compiled.times
+    segments = compiled.row_segments
+    rows = numpy.arange(len(compiled))
+    violations = []
+
+    #the comparisons with NaN (joints not commanded yet, no limit) are False
+    with numpy.errstate(invalid = "ignore", divide = "ignore"):
+        excess = minimums - positions
+        violations += worst_violations(POSITION, positions, excess, minimums, compiled, rows)
+        numpy.subtract(positions, maximums, out = excess)
+        violations += worst_violations(POSITION, positions, excess, maximums, compiled, rows)
+
+        #the positions and times the targets are coming from
+        first_rows = numpy.flatnonzero(numpy.append(True, segments[1:] != segments[:-1]))
+        velocities = numpy.empty(positions.shape)
+        velocities[1:] = positions[:-1]
+        velocities[first_rows] = compiled.key_positions[segments[first_rows]]
+        periods = numpy.empty(times.shape)
+        periods[1:] = times[:-1]
+        periods[first_rows] = compiled.segment_starts[segments[first_rows]]
+        numpy.subtract(times, periods, out = periods)
+        #the jumps (zero duration segments) would give infinite velocities: NaN are never over the limits
+        periods[periods <= 0.0] = numpy.nan
+
+        numpy.subtract(positions, velocities, out = velocities)
+        velocities /= periods[:, numpy.newaxis]
+        numpy.abs(velocities, out = excess)
+        excess -= max_velocities
+        violations += worst_violations(VELOCITY, velocities, excess, max_velocities, compiled, rows)
+
+        #within a segment only
+        rows = numpy.flatnonzero(segments[1:] == segments[:-1]) + 1
+        accelerations = velocities[rows]
+        accelerations -= velocities[rows - 1]
+        accelerations /= periods[rows, numpy.newaxis]
+        excess = numpy.abs(accelerations)
+        excess -= max_accelerations
+        violations += worst_violations(ACCELERATION, accelerations, excess, max_accelerations, compiled, rows)
+
+    violations.sort(key = lambda violation: violation.time)
+    return violations
+
+def describe_violation(violation):
+    unit = UNITS[violation.kind]
+    return "step %d, %s: %s %.1f %s at %.2f s (limit %.1f %s)" % (
+        violation.step + 1, violation.joint_name, violation.kind, violation.value, unit,
+        violation.time, violation.limit, unit)
+
+def violations_by_step(violations):
+    """
+    The descriptions of the violations, grouped by step index
+    """
+    steps = {}
+    for violation in violations:
+        steps.setdefault(violation.step, []).append(describe_violation(violation))
+    return steps
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import math
+
+import rospy
+import numpy
+
+from std_msgs.msg import Float64
+
+from sr_gui_movement_recorder.playback_engine import DeadlineScheduler, DEFAULT_RATE
+from sr_gui_movement_recorder.movement_compiler import MovementCompiler
+from sr_gui_movement_recorder.interpolation import LINEAR
+
+class HandPublisher(object):
+    """
+    Sends targets to the position controllers of the hand in a given
+    namespace (<namespace>/sh_<joint>_position_controller/command).
+    Several hands can be driven from the same node, which isn't possible
+    with ShadowHand_ROS. sendupdate_from_dict takes degrees, like the
+    ShadowHand_ROS one.
+    """
+    def __init__(self, namespace, controller = "position_controller"):
+        self.namespace = namespace.rstrip("/")
+        self.controller = controller
+        self.publishers = {}
+
+    def publisher(self, joint_name):
+        publisher = self.publishers.get(joint_name)
+        if publisher is None:
+            topic = "%s/sh_%s_%s/command" % (self.namespace, joint_name.lower(), self.controller)
+            publisher = rospy.Publisher(topic, Float64)
+            self.publishers[joint_name] = publisher
+        return publisher
+
+    def sendupdate_from_dict(self, targets):
+        for joint_name, target in targets.items():
+            self.publisher(joint_name).publish(Float64(math.radians(target)))
+
+    def unregister(self):
+        for publisher in self.publishers.values():
+            publisher.unregister()
+        self.publishers = {}
+
+def parse_hands(text):
+    """
+    Parses a list of hands like "/hand_1, /hand_2@0.5" (namespaces with an
+    optional time offset in seconds). Returns a list of (namespace, offset).
+    """
+    hands = []
+    for item in text.replace(",", " ").split():
+        namespace, separator, offset = item.partition("@")
+        if separator == "":
+            offset = 0.0
+        try:
+            offset = float(offset)
+        except ValueError:
+            raise ValueError("Invalid time offset for %s: %s" % (namespace, offset))
+        if offset < 0.0:
+            raise ValueError("The time offset of %s must be positive" % namespace)
+        hands.append((namespace, offset))
+    return hands
+
+class MultiHandPlayer(object):
+    """
+    Plays movements on several hands from a single timing loop: the ticks of
+    all the hands are merged into one sorted timeline and sent by the same
+    DeadlineScheduler, so the hands never drift apart. Each hand plays its
+    own movement, or the same one with a different time offset.
+    """
+    def __init__(self, rate = DEFAULT_RATE, profile = LINEAR, compiler = None):
+        self.rate = float(rate)
+        self.profile = profile
+        self.compiler = compiler or MovementCompiler()
+        self.scheduler = DeadlineScheduler(self.rate)
+        #(hand, compiled movement, time offset)
+        self.hands = []
+
+    def add_hand(self, hand, steps, time_offset = 0.0):
+        """
+        hand is a namespace or anything with a sendupdate_from_dict method,
+        steps the list of StepSpec it plays, starting time_offset seconds
+        after the first hand. Identical movements are only compiled once.
+        """
+        if not hasattr(hand, "sendupdate_from_dict"):
+            hand = HandPublisher(hand)
+        compiled = self.compiler.compile(steps, self.rate, self.profile)
+        if isinstance(hand, HandPublisher):
+            #advertise the topics now, the subscribers need some time to connect
+            for joint_name in compiled.joint_names:
+                hand.publisher(joint_name)
+        self.hands.append((hand, compiled, float(time_offset)))
+
+    def timeline(self):
+        """
+        The merged ticks of all the hands, sorted by time: returns the
+        times, the index of the hand and the row of its movement.
+        """
+        times = numpy.concatenate([compiled.times + offset for hand, compiled, offset in self.hands] or [[]])
+        hands = numpy.concatenate([numpy.repeat(index, len(compiled))
+                                   for index, (hand, compiled, offset) in enumerate(self.hands)] or [[]])
+        rows = numpy.concatenate([numpy.arange(len(compiled)) for hand, compiled, offset in self.hands] or [[]])
+        order = numpy.argsort(times, kind = "mergesort")
+        return times[order], hands[order].astype(numpy.int64), rows[order].astype(numpy.int64)
+
+    def duration(self):
+        return max([compiled.duration + offset for hand, compiled, offset in self.hands] or [0.0])
+
+    def play(self, should_stop = None, transport = None, callback = None, start_delay = 0.0):
+        """
+        Plays the movements of all the hands once, start_delay seconds from
+        now. The ticks due at the same time are sent together.
+        callback(hand_index, row) is called after each target is sent.
+
+        Returns False if the playback was stopped, True otherwise.
+        """
+        times, hands, rows = self.timeline()
+        #one deadline per group of ticks due at the same time (to the microsecond,
+        # the offsets don't fall exactly on the ticks of the other hands)
+        deadlines, firsts = numpy.unique(numpy.round(times, 6), return_index = True)
+        lasts = numpy.append(firsts[1:], len(times))
+
+        def send_group(group):
+            for tick in range(firsts[group], lasts[group]):
+                hand_index = hands[tick]
+                hand, compiled, offset = self.hands[hand_index]
+                hand.sendupdate_from_dict(compiled.targets(rows[tick]))
+                if callback is not None:
+                    callback(hand_index, rows[tick])
+
+        self.scheduler.start()
+        return self.scheduler.run(deadlines + start_delay, send_group, should_stop, transport)
+
+    def clear(self):
+        self.hands = []
+
+    def shutdown(self):
+        for hand, compiled, offset in self.hands:
+            if isinstance(hand, HandPublisher):
+                hand.unregister()
+        self.clear()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import bisect, ctypes, ctypes.util, math, sys, threading, time
+
+try:
+    from time import monotonic
+except ImportError:
+    #python 2 has no time.monotonic: read CLOCK_MONOTONIC through librt
+    class _timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    _CLOCK_MONOTONIC = 1
+    try:
+        _librt = ctypes.CDLL(ctypes.util.find_library("rt") or "librt.so.1", use_errno=True)
+        _clock_gettime = _librt.clock_gettime
+        _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+    except (OSError, AttributeError):
+        _clock_gettime = None
+
+    def monotonic():
+        """
+        Seconds from an arbitrary origin, never going backwards
+        (falls back to the wall clock if librt can't be loaded)
+        """
+        if _clock_gettime is None:
+            return time.time()
+        t = _timespec()
+        _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(t))
+        return t.tv_sec + t.tv_nsec * 1e-9
+
+DEFAULT_RATE = 100.0
+MIN_RATE = 100.0
+MAX_RATE = 500.0
+
+#Python 2 implements the timed waits by polling, sleeping up to 50 ms between
+# two checks: waiting in short slices keeps the reaction time to a few ms
+if sys.version_info[0] < 3:
+    WAIT_SLICE = 0.005
+else:
+    WAIT_SLICE = None
+
+class PlaybackTransport(object):
+    """
+    Stop / pause / resume / seek commands for a playback, sent from any
+    thread and applied by the DeadlineScheduler running the playback.
+    Each command wakes the playback thread up, even in the middle of a
+    long wait (a pause between two steps for example).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.paused = False
+        self.seek_time = None
+
+    def reset(self):
+        """
+        Ready for a new playback
+        """
+        self.lock.acquire()
+        self.stopped = False
+        self.paused = False
+        self.seek_time = None
+        self.wakeup.clear()
+        self.lock.release()
+
+    def command_(self, **changes):
+        self.lock.acquire()
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.wakeup.set()
+        self.lock.release()
+
+    def stop(self):
+        self.command_(stopped = True)
+
+    def pause(self):
+        self.command_(paused = True)
+
+    def resume(self):
+        self.command_(paused = False)
+
+    def seek(self, seek_time):
+        """
+        Continue the playback from seek_time (seconds from the start)
+        """
+        self.command_(seek_time = float(seek_time))
+
+    def is_stopped(self):
+        self.lock.acquire()
+        stopped = self.stopped
+        self.lock.release()
+        return stopped
+
+    def is_paused(self):
+        self.lock.acquire()
+        paused = self.paused
+        self.lock.release()
+        return paused
+
+    def take_seek(self):
+        """
+        The pending seek time (None if there's none), cleared
+        """
+        self.lock.acquire()
+        seek_time = self.seek_time
+        self.seek_time = None
+        self.lock.release()
+        return seek_time
+
+    def wait(self, timeout = None, clock = monotonic):
+        """
+        Wait for a command (at most timeout seconds if it's not None).
+        Returns True if a command was received.
+        """
+        if timeout is not None:
+            deadline = clock() + timeout
+        while True:
+            if timeout is None:
+                wait_time = WAIT_SLICE
+            else:
+                wait_time = deadline - clock()
+                if wait_time <= 0.0:
+                    break
+                if WAIT_SLICE is not None:
+                    wait_time = min(wait_time, WAIT_SLICE)
+            if self.wakeup.wait(wait_time):
+                break
+        self.lock.acquire()
+        woken = self.wakeup.is_set()
+        self.wakeup.clear()
+        self.lock.release()
+        return woken
+
+class PlaybackStats(object):
+    """
+    Jitter (lateness of each tick compared to its deadline) and
+    overruns (ticks later than a full period) of a playback.
+    """
+    def __init__(self, period):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.jitter_sum = 0.0
+        self.jitter_sq_sum = 0.0
+        self.jitter_max = 0.0
+
+    def add(self, lateness):
+        self.ticks += 1
+        self.jitter_sum += lateness
+        self.jitter_sq_sum += lateness * lateness
+        if lateness > self.jitter_max:
+            self.jitter_max = lateness
+        if lateness > self.period:
+            self.overruns += 1
+
+    def jitter_mean(self):
+        if self.ticks == 0:
+            return 0.0
+        return self.jitter_sum / self.ticks
+
+    def jitter_std(self):
+        if self.ticks == 0:
+            return 0.0
+        mean = self.jitter_mean()
+        return math.sqrt(max(0.0, self.jitter_sq_sum / self.ticks - mean * mean))
+
+    def __str__(self):
+        return "%d ticks at %.0f Hz, jitter mean %.3f ms / std %.3f ms / max %.3f ms, %d overruns" % \
+            (self.ticks, 1.0 / self.period, 1000.0 * self.jitter_mean(), 1000.0 * self.jitter_std(),
+             1000.0 * self.jitter_max, self.overruns)
+
+class DeadlineScheduler(object):
+    """
+    Runs ticks on absolute deadlines computed from a monotonic clock:
+    the deadline of tick n is start + n * period, so a late tick
+    doesn't delay the following ones and no drift builds up.
+    """
+    def __init__(self, rate = DEFAULT_RATE, clock = monotonic, sleep = time.sleep):
+        rate = float(rate)
+        if rate <= 0.0:
+            raise ValueError("The playback rate must be positive, got %s" % str(rate))
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = PlaybackStats(self.period)
+        self.start_time = None
+
+    def start(self):
+        """
+        Set the time origin for all the following deadlines
+        """
+        self.stats.reset()
+        self.start_time = self.clock()
+        return self.start_time
+
+    def elapsed(self):
+        """
+        Seconds since the start time
+        """
+        return self.clock() - self.start_time
+
+    def wait_until(self, deadline):
+        """
+        Sleep until the deadline (relative to the start time, in seconds)
+        and return how late we woke up.
+        """
+        absolute_deadline = self.start_time + deadline
+        remaining = absolute_deadline - self.clock()
+        if remaining > 0.0:
+            self.sleep(remaining)
+        return self.clock() - absolute_deadline
+
+    def run(self, times, callback, should_stop = None, transport = None):
+        """
+        Call callback(row) at each of the deadlines in times (seconds after
+        the start time, sorted). Long waits are split into periods so that
+        should_stop() is checked at least once per period.
+
+        With a PlaybackTransport, the waits are interrupted as soon as a
+        command is received: pausing shifts the following deadlines by the
+        time spent paused, seeking restarts from the first deadline at or
+        after the seek time.
+
+        Returns False if the playback was stopped, True otherwise.
+        """
+        row = 0
+        while row < len(times):
+            if should_stop is not None and should_stop():
+                return False
+            if transport is not None:
+                if transport.is_stopped():
+                    return False
+                seek_time = transport.take_seek()
+                if seek_time is not None:
+                    row = bisect.bisect_left(times, seek_time)
+                    self.start_time = self.clock() - seek_time
+                    continue
+                if transport.is_paused():
+                    paused_at = self.clock()
+                    transport.wait(self.period if should_stop is not None else None)
+                    self.start_time += self.clock() - paused_at
+                    continue
+
+            deadline = times[row]
+            remaining = self.start_time + deadline - self.clock()
+            if transport is not None:
+                if remaining > 0.0:
+                    wait_time = remaining
+                    if should_stop is not None:
+                        wait_time = min(remaining, self.period)
+                    if transport.wait(wait_time) or wait_time < remaining:
+                        #a command arrived before the deadline, or should_stop needs checking
+                        continue
+            elif remaining > self.period:
+                self.sleep(self.period)
+                continue
+
+            self.stats.add(max(0.0, self.wait_until(deadline)))
+            callback(row)
+            row += 1
+        return True
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import csv, threading
+
+import rospy
+import numpy
+
+from sensor_msgs.msg import JointState
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+
+#the topic the metrics of each step are published on
+METRICS_TOPIC = "movement_recorder/playback_metrics"
+
+def metrics_publisher(topic = METRICS_TOPIC):
+    """
+    The publisher for the metrics, to be kept between the playbacks
+    """
+    return rospy.Publisher(topic, DiagnosticArray)
+
+class PlaybackMetrics(object):
+    """
+    Timing and tracking metrics of the playback of a CompiledMovement:
+     - the scheduled and actual send time of each tick
+     - the start and end overruns of each step (how late its first and
+       last ticks were sent)
+     - the RMS error between the targets sent and the positions measured
+       on joint_states while each step was played, per joint
+
+    The steps are counted each time they're played (a step in a loop is
+    counted once per loop). The summary of each step is published as a
+    DiagnosticArray when the next one starts (if a publisher is given).
+    """
+    def __init__(self, compiled, publisher = None, joint_states_topic = "joint_states"):
+        self.compiled = compiled
+        self.joint_names = compiled.joint_names
+        self.scheduled = compiled.times
+        self.sent = numpy.empty(len(compiled))
+        self.sent.fill(numpy.nan)
+
+        #the successive steps played, and which one each tick belongs to
+        step_indices = compiled.step_indices
+        changes = numpy.diff(step_indices) != 0
+        self.row_played = numpy.cumsum(numpy.append(0, changes))
+        self.first_rows = numpy.flatnonzero(numpy.append(True, changes))[:len(step_indices)]
+        self.last_rows = numpy.append(self.first_rows[1:] - 1, len(step_indices) - 1)[:len(self.first_rows)]
+        self.played_steps = step_indices[self.first_rows]
+
+        nb_played = len(self.first_rows)
+        self.error_sq_sum = numpy.zeros((nb_played, len(self.joint_names)))
+        self.error_count = numpy.zeros((nb_played, len(self.joint_names)), dtype = numpy.int64)
+
+        self.mutex = threading.Lock()
+        self.current = -1
+        self.target = None
+        self.state_names = None
+        self.state_columns = None
+
+        self.publisher = publisher
+        self.subscriber = rospy.Subscriber(joint_states_topic, JointState, self.joint_states_callback, queue_size = 10)
+
+    def tick(self, row, sent_time):
+        """
+        Called by the playback after sending a row, sent_time being
+        the time since the start of the playback
+        """
+        self.sent[row] = sent_time
+        played = int(self.row_played[row])
+        self.mutex.acquire()
+        previous = self.current
+        self.current = played
+        self.target = self.compiled.positions[row]
+        self.mutex.release()
+        if played != previous and previous >= 0:
+            self.publish(previous)
+
+    def joint_states_callback(self, msg):
+        if self.state_names != msg.name:
+            #which position of the message corresponds to each of our joints
+            self.state_names = list(msg.name)
+            indexes = dict((name, index) for index, name in enumerate(msg.name))
+            self.state_columns = (numpy.array([index for index, name in enumerate(self.joint_names) if name in indexes],
+                                              dtype = numpy.int64),
+                                  numpy.array([indexes[name] for name in self.joint_names if name in indexes],
+                                              dtype = numpy.int64))
+        columns, msg_columns = self.state_columns
+        if len(columns) == 0 or len(msg.position) != len(msg.name):
+            return
+
+        self.mutex.acquire()
+        played = self.current
+        target = self.target
+        self.mutex.release()
+        if target is None:
+            return
+
+        errors = numpy.degrees(numpy.asarray(msg.position)[msg_columns]) - target[columns]
+        valid = numpy.isfinite(errors)
+        self.mutex.acquire()
+        self.error_sq_sum[played, columns[valid]] += errors[valid] ** 2
+        self.error_count[played, columns[valid]] += 1
+        self.mutex.release()
+
+    def start_overruns(self):
+        return self.sent[self.first_rows] - self.scheduled[self.first_rows]
+
+    def end_overruns(self):
+        return self.sent[self.last_rows] - self.scheduled[self.last_rows]
+
+    def tick_lateness(self):
+        return self.sent - self.scheduled
+
+    def joint_rms_errors(self):
+        """
+        RMS tracking error (degrees) per step played and per joint,
+        NaN if the joint wasn't measured
+        """
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            return numpy.sqrt(self.error_sq_sum / self.error_count)
+
+    def rms_errors(self):
+        """
+        RMS tracking error (degrees) over all the joints, per step played
+        """
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            return numpy.sqrt(self.error_sq_sum.sum(axis = 1) / self.error_count.sum(axis = 1))
+
+    def summary(self, played):
+        """
+        The metrics of a step played, as a list of (name, value)
+        """
+        first = self.first_rows[played]
+        last = self.last_rows[played]
+        lateness = self.sent[first:last + 1] - self.scheduled[first:last + 1]
+        joint_errors = self.joint_rms_errors()[played]
+        summary = [("step", int(self.played_steps[played]) + 1),
+                   ("scheduled_start", float(self.scheduled[first])),
+                   ("start_overrun", float(lateness[0])),
+                   ("end_overrun", float(lateness[-1])),
+                   ("max_tick_lateness", float(numpy.nanmax(lateness)) if numpy.any(numpy.isfinite(lateness)) else numpy.nan),
+                   ("rms_error", float(self.rms_errors()[played]))]
+        if numpy.any(numpy.isfinite(joint_errors)):
+            worst = int(numpy.nanargmax(joint_errors))
+            summary.append(("worst_joint", self.joint_names[worst]))
+            summary.append(("worst_joint_rms_error", float(joint_errors[worst])))
+        return summary
+
+    def publish(self, played):
+        if self.publisher is None:
+            return
+        status = DiagnosticStatus()
+        status.name = "movement_recorder: step %d" % (int(self.played_steps[played]) + 1)
+        status.message = "step %d of the movement played" % (played + 1)
+        status.values = [KeyValue(name, str(value)) for name, value in self.summary(played)]
+        diagnostics = DiagnosticArray()
+        diagnostics.header.stamp = rospy.Time.now()
+        diagnostics.status = [status]
+        self.publisher.publish(diagnostics)
+
+    def finish(self):
+        """
+        Publish the metrics of the last step and stop listening to the joint states
+        """
+        self.subscriber.unregister()
+        if self.current >= 0:
+            self.publish(self.current)
+
+    def save(self, filename):
+        """
+        Dumps the metrics: a .npz file has all the ticks and steps arrays,
+        a .csv file has one line per step played.
+        """
+        if filename.endswith(".npz"):
+            numpy.savez(filename, joint_names = numpy.array(self.joint_names), scheduled = self.scheduled,
+                        sent = self.sent, step_indices = self.compiled.step_indices,
+                        played_steps = self.played_steps, start_overruns = self.start_overruns(),
+                        end_overruns = self.end_overruns(), rms_errors = self.rms_errors(),
+                        joint_rms_errors = self.joint_rms_errors())
+            return
+
+        header = ["step", "scheduled_start", "start_overrun", "end_overrun", "max_tick_lateness",
+                  "rms_error", "worst_joint", "worst_joint_rms_error"]
+        csv_file = open(filename, "w")
+        try:
+            writer = csv.writer(csv_file)
+            writer.writerow(header)
+            for played in range(len(self.first_rows)):
+                values = dict(self.summary(played))
+                writer.writerow([values.get(name, "") for name in header])
+        finally:
+            csv_file.close()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import rospy
+import numpy
+
+from QtCore import QObject, QThread, QTimer, Qt, Slot, pyqtSignal
+
+from sr_gui_movement_recorder.playback_engine import DeadlineScheduler, PlaybackStats, monotonic
+
+class PlaybackWorker(QObject):
+    """
+    Plays the movements in its own QThread, away from the GUI thread.
+
+    Each playback works on an immutable snapshot taken by the GUI when it
+    was requested (a CompiledMovement, a MultiHandPlayer with its compiled
+    movements, or a recording) and never touches the widgets: the steps
+    being played and the end of the playback are reported with signals,
+    queued to the GUI thread. A playback is stopped, paused or moved with
+    the PlaybackTransport, which can be used from any thread.
+    """
+    stepStarted = pyqtSignal(int)
+    stepStopped = pyqtSignal(int)
+    #True if played until the end, and the PlaybackMetrics (or None)
+    playbackFinished = pyqtSignal(bool, object)
+    playbackRequested = pyqtSignal(object)
+
+    def __init__(self, transport):
+        QObject.__init__(self)
+        self.transport = transport
+        self.playing_index = None
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.playbackRequested.connect(self.run_, Qt.QueuedConnection)
+        self.thread.start()
+
+    def play(self, hand, compiled, metrics = None):
+        """
+        Sends the rows of the compiled movement to the hand on their deadlines
+        """
+        self.playbackRequested.emit((self.play_, (hand, compiled, metrics)))
+
+    def play_hands(self, player, start_delay = 0.0):
+        """
+        Plays a MultiHandPlayer, highlighting the steps of its first hand
+        """
+        self.playbackRequested.emit((self.play_hands_, (player, start_delay)))
+
+    def follow(self, compiled, start_delay = 0.0):
+        """
+        Highlights the steps while the trajectory executor plays the compiled
+        movement (starting start_delay seconds from now): nothing is sent.
+        """
+        self.playbackRequested.emit((self.follow_, (compiled, start_delay)))
+
+    def play_recording(self, player, recording):
+        """
+        Replays a recording with a MovementPlayer
+        """
+        self.playbackRequested.emit((self.play_recording_, (player, recording)))
+
+    @Slot(object)
+    def run_(self, request):
+        function, args = request
+        self.playing_index = None
+        finished = False
+        metrics = None
+        try:
+            finished, metrics = function(*args)
+        except Exception as e:
+            rospy.logerr("Playback failed: " + str(e))
+        self.set_playing_(None)
+        self.playbackFinished.emit(finished, metrics)
+
+    def set_playing_(self, index):
+        if index == self.playing_index:
+            return
+        if self.playing_index is not None:
+            self.stepStopped.emit(self.playing_index)
+        if index is not None:
+            self.stepStarted.emit(index)
+        self.playing_index = index
+
+    def play_(self, hand, compiled, metrics):
+        scheduler = DeadlineScheduler(compiled.rate)
+        step_indices = compiled.step_indices
+
+        def send_row(row):
+            self.set_playing_(int(step_indices[row]))
+            hand.sendupdate_from_dict(compiled.targets(row))
+            if metrics is not None:
+                metrics.tick(row, scheduler.elapsed())
+
+        scheduler.start()
+        finished = scheduler.run(compiled.times, send_row, transport = self.transport)
+        if metrics is not None:
+            metrics.finish()
+        if finished:
+            rospy.loginfo("Movement played: " + str(scheduler.stats))
+        return finished, metrics
+
+    def play_hands_(self, player, start_delay):
+        step_indices = player.hands[0][1].step_indices
+
+        def highlight(hand_index, row):
+            if hand_index == 0:
+                self.set_playing_(int(step_indices[row]))
+
+        finished = player.play(transport = self.transport, callback = highlight, start_delay = start_delay)
+        if finished:
+            rospy.loginfo("Movement played on %d hands: %s" % (len(player.hands), str(player.scheduler.stats)))
+        player.clear()
+        return finished, None
+
+    def follow_(self, compiled, start_delay):
+        scheduler = DeadlineScheduler(compiled.rate)
+        segment_steps = compiled.segment_steps
+
+        def start_segment(segment):
+            if segment < len(segment_steps):
+                self.set_playing_(int(segment_steps[segment]))
+            else:
+                self.set_playing_(None)
+
+        #the start of each segment, then the end of the last one
+        times = numpy.append(compiled.segment_starts, compiled.segment_starts[-1:] + compiled.segment_durations[-1:])
+        scheduler.start()
+        return scheduler.run(times + start_delay, start_segment, transport = self.transport), None
+
+    def play_recording_(self, player, recording):
+        finished = player.play_recording(recording, transport = self.transport)
+        if finished:
+            rospy.loginfo("Recording replayed: " + str(player.scheduler.stats))
+        return finished, None
+
+    def shutdown(self):
+        """
+        Stops the playback and the thread
+        """
+        self.transport.stop()
+        self.thread.quit()
+        self.thread.wait()
+
+class EventLoopMonitor(QObject):
+    """
+    Measures the latency of the event loop of the thread it's created in
+    (the GUI thread): how late a periodic timer fires. Used to check that
+    the GUI stays responsive while playing.
+    """
+    INTERVAL = 20
+
+    def __init__(self, parent = None):
+        QObject.__init__(self, parent)
+        self.stats = PlaybackStats(self.INTERVAL / 1000.0)
+        self.last = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.INTERVAL)
+        self.timer.timeout.connect(self.tick_)
+
+    def start(self):
+        self.stats.reset()
+        self.last = monotonic()
+        self.timer.start()
+
+    def tick_(self):
+        now = monotonic()
+        self.stats.add(max(0.0, now - self.last - self.INTERVAL / 1000.0))
+        self.last = now
+
+    def stop(self):
+        """
+        Stops measuring, returns the PlaybackStats of the latency
+        """
+        self.timer.stop()
+        return self.stats
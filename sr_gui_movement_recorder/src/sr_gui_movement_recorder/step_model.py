@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+from QtCore import Qt, QAbstractTableModel, QModelIndex, QStringListModel
+from QtGui import QBrush, QColor, QComboBox, QLineEdit, QStyledItemDelegate
+from PyQt4.Qt import QDoubleValidator, QIntValidator
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec
+
+class StepModel(QAbstractTableModel):
+    """
+    The steps of a movement, one row per step. The steps are stored as
+    immutable StepSpec: editing a cell replaces the StepSpec of the row.
+    """
+    GRASP, PAUSE, INTERPOLATION, LOOP, NB_LOOPS = range(5)
+    HEADERS = ["Grasp", "Pause Time (s)", "Interpolation Time (s)", "Looping from step", "Times"]
+
+    def __init__(self, grasp_library, parent = None):
+        """
+        grasp_library is the GraspLibrary the steps are using
+        """
+        QAbstractTableModel.__init__(self, parent)
+        self.grasp_library = grasp_library
+        #the model shared by all the grasp combo boxes
+        self.grasp_names_model = QStringListModel(list(grasp_library.names), self)
+        self.grasp_library_version = grasp_library.version
+        self.steps = []
+        self.editable = True
+        self.playing_index = None
+        self.playing_brush = QBrush(QColor(153, 231, 96))
+        #the descriptions of the limits violated by the steps, indexed by row
+        self.invalid = {}
+        self.invalid_brush = QBrush(QColor(255, 153, 153))
+
+    @property
+    def grasps(self):
+        return self.grasp_library.grasps
+
+    def grasp_names(self):
+        return self.grasp_library.names
+
+    def refresh_grasps(self):
+        """
+        Reload the grasps if the grasps file changed
+        """
+        self.grasp_library.refresh()
+        if self.grasp_library.version != self.grasp_library_version:
+            self.grasp_library_version = self.grasp_library.version
+            self.grasp_names_model.setStringList(list(self.grasp_library.names))
+
+    def make_step(self, grasp_name = None):
+        """
+        A new step with the default values
+        """
+        if grasp_name is None:
+            grasp_name = self.grasp_names()[0]
+        return StepSpec(grasp_name, self.grasps[grasp_name].joints_and_positions, 0.0, 1.0, -1, 0)
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.steps)
+
+    def columnCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role = Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+    def flags(self, index):
+        flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        if not self.editable:
+            return flags
+        if index.column() == self.NB_LOOPS and self.steps[index.row()].loop_to_step == -1:
+            return flags
+        return flags | Qt.ItemIsEditable
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        column = index.column()
+        step = self.steps[row]
+
+        if role == Qt.BackgroundRole:
+            if row == self.playing_index:
+                return self.playing_brush
+            if row in self.invalid:
+                return self.invalid_brush
+            return None
+
+        if role == Qt.ToolTipRole:
+            if row in self.invalid:
+                return "\n".join(self.invalid[row])
+            return None
+
+        if role == Qt.TextAlignmentRole:
+            if column == self.GRASP:
+                return int(Qt.AlignLeft | Qt.AlignVCenter)
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+
+        if column == self.GRASP:
+            return step.grasp_name
+        if column == self.PAUSE:
+            return str(step.pause_time)
+        if column == self.INTERPOLATION:
+            return str(step.interpolation_time)
+        if column == self.LOOP:
+            if step.loop_to_step == -1:
+                return "None"
+            return str(step.loop_to_step + 1)
+        if column == self.NB_LOOPS:
+            return str(step.number_of_loops)
+        return None
+
+    def setData(self, index, value, role = Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        row = index.row()
+        column = index.column()
+        step = self.steps[row]
+        value = str(value)
+
+        try:
+            if column == self.GRASP:
+                if value not in self.grasps:
+                    return False
+                step = step._replace(grasp_name = value, joints_and_positions = self.grasps[value].joints_and_positions)
+            elif column == self.PAUSE:
+                step = step._replace(pause_time = float(value))
+            elif column == self.INTERPOLATION:
+                step = step._replace(interpolation_time = float(value))
+            elif column == self.LOOP:
+                if value == "None":
+                    step = step._replace(loop_to_step = -1, number_of_loops = 0)
+                else:
+                    loop_to_step = int(value) - 1
+                    #we can only loop back to a previous step
+                    if loop_to_step < 0 or loop_to_step >= row:
+                        return False
+                    step = step._replace(loop_to_step = loop_to_step, number_of_loops = max(1, step.number_of_loops))
+            elif column == self.NB_LOOPS:
+                step = step._replace(number_of_loops = int(value))
+        except ValueError:
+            return False
+
+        self.steps[row] = step
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        return True
+
+    def replace_steps(self, steps):
+        """
+        Replace all the steps by a list of StepSpec of the same length
+        """
+        if len(steps) != len(self.steps):
+            raise ValueError("Expected %d steps, got %d" % (len(self.steps), len(steps)))
+        if len(steps) == 0:
+            return
+        self.steps = list(steps)
+        self.dataChanged.emit(self.index(0, 0), self.index(len(self.steps) - 1, self.columnCount() - 1))
+
+    def set_editable(self, editable):
+        self.editable = editable
+
+    def set_playing(self, index):
+        """
+        Highlight the step being played (None to remove the highlight)
+        """
+        previous = self.playing_index
+        self.playing_index = index
+        for row in (previous, index):
+            if row is not None and row < len(self.steps):
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def set_invalid(self, invalid):
+        """
+        Highlight the steps going over the joint limits, invalid being a
+        dictionary of lists of descriptions indexed by row
+        """
+        previous = self.invalid
+        self.invalid = invalid
+        for row in set(previous.keys()) | set(invalid.keys()):
+            if previous.get(row) != invalid.get(row) and row < len(self.steps):
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def insert_steps(self, row, steps):
+        """
+        Insert a list of StepSpec before row, with a single insertion
+        notification for the views.
+        """
+        if len(steps) == 0:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(steps) - 1)
+        self.steps[row:row] = steps
+        self.endInsertRows()
+
+        #the loops pointing after the inserted steps are shifted
+        count = len(steps)
+        self.update_loops_(row + count, lambda loop: loop + count if loop >= row else loop)
+
+    def append_steps(self, steps):
+        self.insert_steps(len(self.steps), steps)
+
+    def remove_steps(self, row, count = 1):
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        del self.steps[row:row + count]
+        self.endRemoveRows()
+
+        def shift(loop):
+            if loop < row:
+                return loop
+            if loop < row + count:
+                #the step we were looping to doesn't exist any more
+                return -1
+            return loop - count
+        self.update_loops_(row, shift)
+
+    def update_loops_(self, first_row, shift):
+        for row in range(first_row, len(self.steps)):
+            step = self.steps[row]
+            if step.loop_to_step == -1:
+                continue
+            loop_to_step = shift(step.loop_to_step)
+            if loop_to_step == step.loop_to_step:
+                continue
+            if loop_to_step == -1 or loop_to_step >= row:
+                self.steps[row] = step._replace(loop_to_step = -1, number_of_loops = 0)
+            else:
+                self.steps[row] = step._replace(loop_to_step = loop_to_step)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def clear(self):
+        self.beginResetModel()
+        self.steps = []
+        self.playing_index = None
+        self.invalid = {}
+        self.endResetModel()
+
+    def snapshot(self):
+        """
+        An immutable copy of the steps
+        """
+        return tuple(self.steps)
+
+class StepDelegate(QStyledItemDelegate):
+    """
+    Creates the editors for the cells of the StepModel: only the
+    cell being edited has a widget.
+    """
+    def createEditor(self, parent, option, index):
+        model = index.model()
+        column = index.column()
+        if column == StepModel.GRASP:
+            model.refresh_grasps()
+            editor = QComboBox(parent)
+            editor.setModel(model.grasp_names_model)
+            editor.activated.connect(lambda value: self.commitData.emit(editor))
+        elif column == StepModel.LOOP:
+            editor = QComboBox(parent)
+            editor.addItem("None")
+            for step in range(1, index.row() + 1):
+                editor.addItem(str(step))
+            editor.activated.connect(lambda value: self.commitData.emit(editor))
+        else:
+            editor = QLineEdit(parent)
+            if column == StepModel.NB_LOOPS:
+                editor.setValidator(QIntValidator(editor))
+            else:
+                editor.setValidator(QDoubleValidator(editor))
+            editor.setAlignment(Qt.AlignRight)
+        return editor
+
+    def setEditorData(self, editor, index):
+        value = index.model().data(index, Qt.EditRole)
+        if isinstance(editor, QComboBox):
+            editor.setCurrentIndex(max(0, editor.findText(value)))
+        else:
+            editor.setText(value)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText())
+        else:
+            model.setData(index, editor.text())
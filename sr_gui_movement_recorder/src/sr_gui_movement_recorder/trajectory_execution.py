@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import threading
+
+import rospy
+import numpy
+
+from trajectory_msgs.msg import JointTrajectory, JointTrajectoryPoint
+
+from sr_gui_movement_recorder.playback_engine import DeadlineScheduler, DEFAULT_RATE
+from sr_gui_movement_recorder.movement_compiler import interpolate_segments
+from sr_gui_movement_recorder.interpolation import SegmentSpline
+
+#the topic the trajectory executor listens to
+EXECUTOR_TOPIC = "trajectory_executor/command"
+
+def movement_to_trajectory(compiled, start_time = None):
+    """
+    Converts a CompiledMovement to a JointTrajectory with one point per
+    segment end (plus one at the end of each pause). The positions are in
+    radians, NaN for the joints which haven't been commanded yet. The
+    velocities and accelerations are set when the interpolation profile
+    of the movement constrains them.
+    The trajectory starts at start_time (a rospy.Time, 0 for "now").
+    """
+    trajectory = JointTrajectory()
+    if start_time is not None:
+        trajectory.header.stamp = start_time
+    trajectory.joint_names = list(compiled.joint_names)
+    key_positions = numpy.radians(compiled.key_positions).tolist()
+    key_velocities = None
+    if compiled.key_velocities is not None:
+        key_velocities = numpy.radians(compiled.key_velocities).tolist()
+    key_accelerations = None
+    if compiled.key_accelerations is not None:
+        key_accelerations = numpy.radians(compiled.key_accelerations).tolist()
+
+    def add_point(time_from_start, key, hold = False):
+        point = JointTrajectoryPoint()
+        point.positions = key_positions[key]
+        if key_velocities is not None:
+            point.velocities = [0.0] * len(trajectory.joint_names) if hold else key_velocities[key]
+        if key_accelerations is not None:
+            point.accelerations = [0.0] * len(trajectory.joint_names) if hold else key_accelerations[key]
+        point.time_from_start = rospy.Duration.from_sec(time_from_start)
+        trajectory.points.append(point)
+
+    add_point(0.0, 0)
+    for segment in range(len(compiled.segment_starts)):
+        end = float(compiled.segment_starts[segment] + compiled.segment_durations[segment])
+        add_point(end, segment + 1)
+        if compiled.segment_pauses[segment] > 0.0:
+            add_point(end + float(compiled.segment_pauses[segment]), segment + 1, hold = True)
+    return trajectory
+
+def sample_trajectory(trajectory, rate = DEFAULT_RATE):
+    """
+    Interpolates a JointTrajectory at the given rate. Returns the times
+    (seconds from the start of the trajectory) and the positions in degrees.
+    Like the usual trajectory controllers, the segments are quintic when the
+    points have accelerations, cubic when they have velocities and linear
+    otherwise. Nothing is sent while the hand holds its position between
+    two points.
+    """
+    points = trajectory.points
+    times = numpy.array([point.time_from_start.to_sec() for point in points])
+    positions = numpy.degrees(numpy.array([point.positions for point in points], dtype = numpy.float64))
+    if len(times) < 2:
+        return times, positions
+
+    def derivatives(name):
+        if not all(len(getattr(point, name)) == len(trajectory.joint_names) for point in points):
+            return None
+        return numpy.degrees(numpy.array([getattr(point, name) for point in points], dtype = numpy.float64))
+    velocities = derivatives("velocities")
+    accelerations = derivatives("accelerations")
+
+    start = positions[:-1]
+    end = positions[1:]
+    same = (start == end) | (numpy.isnan(start) & numpy.isnan(end))
+    if velocities is not None:
+        same &= (velocities[:-1] == 0.0) & (velocities[1:] == 0.0)
+    moving = numpy.flatnonzero(~numpy.all(same, axis = 1))
+
+    def segment_values(values, offset):
+        if values is None:
+            return None
+        return values[moving + offset]
+    spline = SegmentSpline(start[moving], end[moving], numpy.diff(times)[moving],
+                           segment_values(velocities, 0), segment_values(velocities, 1),
+                           segment_values(accelerations, 0), segment_values(accelerations, 1))
+    segments, row_times, row_positions = interpolate_segments(spline, times[moving],
+                                                              numpy.diff(times)[moving], float(rate))
+    return row_times, row_positions
+
+class TrajectoryExecutor(object):
+    """
+    Executes the JointTrajectory received on EXECUTOR_TOPIC by sending
+    interpolated targets to the hand (anything with a sendupdate_from_dict
+    method, typically a ShadowHand_ROS). A new trajectory replaces the one
+    being executed, an empty one only stops it.
+    """
+    def __init__(self, hand, rate = DEFAULT_RATE, topic = EXECUTOR_TOPIC):
+        self.hand = hand
+        self.rate = float(rate)
+        self.scheduler = DeadlineScheduler(self.rate)
+        self.mutex = threading.Lock()
+        self.received = threading.Event()
+        self.pending = None
+
+        self.thread = threading.Thread(None, self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        self.subscriber = rospy.Subscriber(topic, JointTrajectory, self.callback, queue_size = 1)
+
+    def callback(self, trajectory):
+        self.mutex.acquire()
+        self.pending = trajectory
+        self.mutex.release()
+        self.received.set()
+
+    def has_pending(self):
+        self.mutex.acquire()
+        pending = self.pending is not None
+        self.mutex.release()
+        return pending or rospy.is_shutdown()
+
+    def run(self):
+        while not rospy.is_shutdown():
+            #a timeout so that we notice the shutdown
+            self.received.wait(0.1)
+            self.mutex.acquire()
+            trajectory = self.pending
+            self.pending = None
+            self.received.clear()
+            self.mutex.release()
+            if trajectory is not None and len(trajectory.points) > 0:
+                self.execute(trajectory)
+
+    def execute(self, trajectory):
+        times, positions = sample_trajectory(trajectory, self.rate)
+        joint_names = trajectory.joint_names
+        commanded = numpy.isfinite(positions)
+
+        def send_row(row):
+            self.hand.sendupdate_from_dict(dict((name, value) for name, value, valid
+                                                in zip(joint_names, positions[row].tolist(), commanded[row].tolist())
+                                                if valid))
+
+        #the trajectory starts at its stamp (or as soon as it's received)
+        delay = 0.0
+        if not trajectory.header.stamp.is_zero():
+            delay = max(0.0, (trajectory.header.stamp - rospy.Time.now()).to_sec())
+
+        self.scheduler.start()
+        if self.scheduler.run(times + delay, send_row, self.has_pending):
+            rospy.loginfo("Trajectory executed: " + str(self.scheduler.stats))
+        else:
+            rospy.loginfo("Trajectory interrupted")
+
+    def shutdown(self):
+        self.subscriber.unregister()
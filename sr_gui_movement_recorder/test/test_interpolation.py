@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import unittest
+
+import numpy
+
+from sr_gui_movement_recorder.interpolation import profile_spline, blend_velocities, GraspSpline, \
+    LINEAR, MINIMUM_JERK, CUBIC, PROFILES
+
+class Grasp(object):
+    def __init__(self, joints_and_positions):
+        self.joints_and_positions = joints_and_positions
+
+def velocity(spline, segment, fraction, duration, step = 1e-6):
+    """
+    Numerical derivative of the spline, in units per second
+    """
+    return (spline.evaluate(segment, fraction + step) - spline.evaluate(segment, fraction - step)) / (2.0 * step * duration)
+
+class TestProfiles(unittest.TestCase):
+    def setUp(self):
+        self.keys = numpy.array([[0.0, 10.0], [90.0, 10.0], [30.0, -20.0], [60.0, 40.0]])
+        self.durations = numpy.array([1.0, 2.0, 0.5])
+
+    def test_unknown_profile(self):
+        self.assertRaises(ValueError, profile_spline, "quadratic", self.keys, self.durations)
+
+    def test_keys(self):
+        for profile in PROFILES:
+            spline = profile_spline(profile, self.keys, self.durations)[0]
+            self.assertEqual(len(spline), 3)
+            for segment in range(3):
+                numpy.testing.assert_allclose(spline.evaluate(segment, 0.0), self.keys[segment], atol = 1e-9)
+                numpy.testing.assert_allclose(spline.evaluate(segment, 1.0), self.keys[segment + 1], atol = 1e-9)
+
+    def test_linear(self):
+        spline, velocities, accelerations = profile_spline(LINEAR, self.keys, self.durations)
+        self.assertTrue(velocities is None and accelerations is None)
+        numpy.testing.assert_allclose(spline.evaluate(0, 0.25), [22.5, 10.0])
+
+    def test_minimum_jerk(self):
+        spline, velocities, accelerations = profile_spline(MINIMUM_JERK, self.keys, self.durations)
+        self.assertFalse(velocities.any() or accelerations.any())
+        numpy.testing.assert_allclose(spline.evaluate(0, 0.5), [45.0, 10.0])
+        numpy.testing.assert_allclose(spline.evaluate(0, 0.25), [90.0 * 0.103515625, 10.0])
+        #starts and stops with a zero velocity
+        numpy.testing.assert_allclose(velocity(spline, 1, 1e-5, 2.0), [0.0, 0.0], atol = 1e-3)
+        numpy.testing.assert_allclose(velocity(spline, 1, 1.0 - 1e-5, 2.0), [0.0, 0.0], atol = 1e-3)
+
+    def test_cubic(self):
+        keys = numpy.array([[0.0], [10.0], [30.0], [40.0], [0.0]])
+        durations = numpy.ones(4)
+        spline, velocities, accelerations = profile_spline(CUBIC, keys, durations)
+        self.assertTrue(accelerations is None)
+        #stops at both ends and where the direction changes
+        numpy.testing.assert_allclose(velocities[:, 0], [0.0, 15.0, 15.0, 0.0, 0.0])
+        #continuous velocity through the keys
+        for segment in range(3):
+            numpy.testing.assert_allclose(velocity(spline, segment, 1.0 - 1e-5, 1.0),
+                                          velocity(spline, segment + 1, 1e-5, 1.0), atol = 1e-2)
+        #never overshoots the keys
+        positions = spline.evaluate_rows(numpy.repeat(numpy.arange(4), 101), numpy.tile(numpy.linspace(0.0, 1.0, 101), 4))
+        self.assertTrue(positions.min() >= 0.0 and positions.max() <= 40.0 + 1e-9)
+
+    def test_cubic_holds(self):
+        keys = numpy.array([[0.0], [10.0], [20.0]])
+        self.assertEqual(blend_velocities(keys, [1.0, 1.0], [False, False, False])[1, 0], 10.0)
+        self.assertEqual(blend_velocities(keys, [1.0, 1.0], [False, True, False])[1, 0], 0.0)
+
+    def test_evaluate_rows(self):
+        for profile in PROFILES:
+            spline = profile_spline(profile, self.keys, self.durations)[0]
+            segments = numpy.array([0, 0, 1, 2, 2])
+            fractions = numpy.array([0.1, 0.7, 0.5, 0.0, 0.95])
+            expected = [spline.evaluate(segment, fraction) for segment, fraction in zip(segments, fractions)]
+            numpy.testing.assert_allclose(spline.evaluate_rows(segments, fractions), expected)
+
+    def test_half_way(self):
+        keys = numpy.array([[0.0, numpy.nan, 5.0], [10.0, 20.0, numpy.nan]])
+        for profile in PROFILES:
+            spline = profile_spline(profile, keys, [1.0])[0]
+            numpy.testing.assert_allclose(spline.evaluate(0, 0.25)[1:], [numpy.nan, 5.0])
+            numpy.testing.assert_allclose(spline.evaluate(0, 0.75)[1:], [20.0, numpy.nan])
+
+class TestGraspSpline(unittest.TestCase):
+    def test_interpolate(self):
+        spline = GraspSpline(Grasp({"FFJ3": 0.0, "MFJ3": 10.0}), Grasp({"FFJ3": 90.0, "RFJ3": 40.0}))
+        self.assertEqual(spline.interpolate(0), {"FFJ3": 0.0, "MFJ3": 10.0})
+        self.assertEqual(spline.interpolate(50), {"FFJ3": 45.0, "RFJ3": 40.0})
+        self.assertEqual(spline.interpolate(150), {"FFJ3": 90.0, "RFJ3": 40.0})
+
+    def test_minimum_jerk(self):
+        spline = GraspSpline(Grasp({"FFJ3": 0.0}), Grasp({"FFJ3": 90.0}), MINIMUM_JERK)
+        self.assertAlmostEqual(spline.interpolate(25)["FFJ3"], 90.0 * 0.103515625)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_interpolation", TestProfiles)
+    rosunit.unitrun("sr_gui_movement_recorder", "test_interpolation", TestGraspSpline)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import unittest
+
+import numpy
+
+from sr_gui_movement_recorder.keyframe_extractor import douglas_peucker, tolerance_array, extract_keyframes
+
+def max_error(times, positions, keys):
+    """
+    The largest deviation of each joint from the linear interpolation of the kept samples
+    """
+    interpolated = numpy.array([numpy.interp(times, times[keys], positions[keys, joint])
+                                for joint in range(positions.shape[1])]).T
+    return numpy.abs(interpolated - positions).max(axis = 0)
+
+class TestDouglasPeucker(unittest.TestCase):
+    def test_short(self):
+        self.assertEqual(list(douglas_peucker(numpy.zeros(0), numpy.zeros((0, 1)), [1.0])), [])
+        self.assertEqual(list(douglas_peucker(numpy.arange(2.0), numpy.zeros((2, 1)), [1.0])), [0, 1])
+
+    def test_piecewise_linear(self):
+        times = numpy.arange(301) * 0.01
+        positions = numpy.interp(times, [0.0, 1.0, 2.0, 3.0], [0.0, 90.0, 30.0, 30.0])[:, numpy.newaxis]
+        keys = douglas_peucker(times, positions, numpy.array([0.1]))
+        self.assertEqual(list(keys), [0, 100, 200, 300])
+
+    def test_tolerances(self):
+        times = numpy.linspace(0.0, 2.0, 1001)
+        positions = numpy.array([90.0 * numpy.sin(numpy.pi * times), 10.0 * numpy.cos(3.0 * times)]).T
+        tolerances = numpy.array([1.0, 0.1])
+        keys = douglas_peucker(times, positions, tolerances)
+
+        self.assertEqual((keys[0], keys[-1]), (0, 1000))
+        self.assertTrue((numpy.diff(keys) > 0).all())
+        self.assertTrue((max_error(times, positions, keys) <= tolerances).all())
+        #far less samples than the recording
+        self.assertTrue(len(keys) < 100)
+
+    def test_duplicate_stamps(self):
+        times = numpy.array([0.0, 1.0, 1.0, 2.0, 3.0, 3.0, 3.0, 4.0])
+        positions = numpy.array([0.0, 10.0, 10.0, 50.0, 0.0, 5.0, 10.0, 10.0])[:, numpy.newaxis]
+        with numpy.errstate(all = "raise"):
+            keys = douglas_peucker(times, positions, numpy.array([0.1]))
+        #only the last of the samples with the same stamp can be kept
+        self.assertEqual(list(keys), [0, 2, 3, 6, 7])
+
+        self.assertEqual(list(douglas_peucker(numpy.zeros(4), numpy.arange(4.0)[:, numpy.newaxis],
+                                              numpy.array([0.1]))), [3])
+
+    def test_tolerance_array(self):
+        numpy.testing.assert_array_equal(tolerance_array(["FFJ3", "MFJ3"], 1.0, {"MFJ3": 0.5}), [1.0, 0.5])
+        self.assertRaises(ValueError, tolerance_array, ["FFJ3"], 0.0)
+        self.assertRaises(ValueError, tolerance_array, ["FFJ3"], 1.0, {"FFJ3": -1.0})
+
+class TestExtractKeyframes(unittest.TestCase):
+    def test_steps(self):
+        times = numpy.arange(401) * 0.01
+        positions = numpy.array([numpy.interp(times, [0.0, 0.5, 1.0, 2.0, 4.0], [0.0, 0.0, 90.0, 90.0, 45.0]),
+                                 numpy.interp(times, [0.0, 0.5, 1.0, 2.0, 4.0], [10.0, 10.0, 20.0, 20.0, 0.0])]).T
+        steps, grasps = extract_keyframes(times, positions, ["FFJ3", "MFJ3"], 0.5)
+
+        #the hold at the start is dropped, the one at 90 degrees is the pause of the step leading to it
+        self.assertEqual([(step.pause_time, step.interpolation_time) for step in steps],
+                         [(1.0, 0.5), (0.0, 2.0), (0.0, 1.0)])
+        self.assertEqual([grasps[step.grasp_name] for step in steps],
+                         [{"FFJ3": 0.0, "MFJ3": 10.0}, {"FFJ3": 90.0, "MFJ3": 20.0}, {"FFJ3": 45.0, "MFJ3": 0.0}])
+        self.assertEqual(steps[0].grasp_name, "keyframe_0000")
+
+    def test_no_drift(self):
+        #a long recording with irregular stamps, every sample is a keyframe
+        times = 12.0 + numpy.arange(5000) * 0.0034
+        positions = numpy.where(numpy.arange(5000) % 2 == 0, 0.0, 10.0)[:, numpy.newaxis]
+        steps, grasps = extract_keyframes(times, positions, ["FFJ3"], 0.5)
+        self.assertEqual(len(steps), 5000)
+
+        #the steps start at the times of their keyframes, give or take the rounding of one of them
+        starts = numpy.cumsum([0.0] + [step.interpolation_time + step.pause_time for step in steps[:-1]])
+        self.assertTrue(numpy.abs(starts - (times - times[0])).max() <= 0.0005 + 1e-9)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_keyframe_extractor", TestDouglasPeucker)
+    rosunit.unitrun("sr_gui_movement_recorder", "test_keyframe_extractor", TestExtractKeyframes)
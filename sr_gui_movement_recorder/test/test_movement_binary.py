@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec
+from sr_gui_movement_recorder.movement_binary import save_binary, BinaryMovement, is_binary_movement, \
+    HEADER_DTYPE, ALIGNMENT, MAGIC
+
+class TestMovementBinary(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "movement.srm")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def header(self):
+        return numpy.fromfile(self.filename, dtype = HEADER_DTYPE, count = 1)[0]
+
+    def test_steps_round_trip(self):
+        open_hand = {"FFJ3": 0.0, "MFJ3": 0.0}
+        steps = [StepSpec("open", open_hand, 1.0, 0.5, -1, 0),
+                 StepSpec("pinch", {"FFJ3": 45.5, "THJ4": 12.25}, 0.0, 2.0, -1, 0),
+                 StepSpec("open", open_hand, 0.25, 1.0, 1, 3)]
+        save_binary(self.filename, steps)
+        movement = BinaryMovement(self.filename)
+
+        self.assertEqual(movement.joint_names, ["FFJ3", "MFJ3", "THJ4"])
+        loaded = movement.steps()
+        self.assertEqual(loaded, steps)
+        #the steps using the same grasp share its dictionary
+        self.assertTrue(loaded[0].joints_and_positions is loaded[2].joints_and_positions)
+        self.assertEqual(movement.grasps(), {"open": open_hand, "pinch": {"FFJ3": 45.5, "THJ4": 12.25}})
+        self.assertEqual(len(movement), 0)
+
+    def test_samples_round_trip(self):
+        stamps = numpy.arange(1000) * 0.01
+        positions = numpy.random.RandomState(0).uniform(-90.0, 90.0, (1000, 3))
+        save_binary(self.filename, joint_names = ["FFJ3", "MFJ3", "RFJ3"], stamps = stamps, positions = positions)
+        movement = BinaryMovement(self.filename)
+
+        self.assertEqual(len(movement), 1000)
+        self.assertEqual(movement.steps(), [])
+        self.assertTrue(isinstance(movement.positions, numpy.memmap))
+        numpy.testing.assert_array_equal(movement.samples()["stamp"], stamps)
+        #the positions are stored as float32
+        numpy.testing.assert_array_equal(movement.samples()["position"], positions.astype(numpy.float32))
+
+    def test_header_alignment(self):
+        steps = [StepSpec("a", {"FFJ3": 1.0}, 0.0, 1.0, -1, 0)]
+        save_binary(self.filename, steps, ["FFJ3", "MFJ3"], numpy.arange(7) * 0.1, numpy.zeros((7, 2)))
+        header = self.header()
+
+        self.assertEqual(header["magic"], MAGIC)
+        self.assertEqual((int(header["nb_joints"]), int(header["nb_steps"]), int(header["nb_samples"])), (2, 1, 7))
+        offsets = [int(header[name]) for name in ("names_offset", "steps_offset", "stamps_offset", "positions_offset")]
+        self.assertEqual(offsets, sorted(offsets))
+        for offset in offsets:
+            self.assertEqual(offset % ALIGNMENT, 0)
+        self.assertEqual(os.path.getsize(self.filename), offsets[-1] + 7 * 2 * 4)
+
+    def test_reopen(self):
+        stamps = numpy.arange(10) * 0.1
+        save_binary(self.filename, joint_names = ["FFJ3"], stamps = stamps, positions = numpy.ones((10, 1)))
+        first = BinaryMovement(self.filename)
+        second = BinaryMovement(self.filename)
+
+        numpy.testing.assert_array_equal(first.stamps, second.stamps)
+        #read only maps of the file
+        self.assertRaises(ValueError, first.positions.__setitem__, 0, 2.0)
+        del first, second
+        save_binary(self.filename, joint_names = ["FFJ3"], stamps = stamps[:5], positions = numpy.zeros((5, 1)))
+        self.assertEqual(len(BinaryMovement(self.filename)), 5)
+
+    def test_empty(self):
+        save_binary(self.filename)
+        movement = BinaryMovement(self.filename)
+        self.assertEqual(movement.joint_names, [])
+        self.assertEqual(movement.steps(), [])
+        self.assertEqual(len(movement), 0)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, save_binary, self.filename, joint_names = ["FFJ3"],
+                          stamps = [0.0, 0.1], positions = [[0.0]])
+        self.assertRaises(ValueError, save_binary, self.filename,
+                          [StepSpec("a", {"FFJ3": 1.0}, 0.0, 1.0, -1, 0)], ["MFJ3"])
+        self.assertRaises(ValueError, save_binary, self.filename,
+                          [StepSpec("a" * 65, {"FFJ3": 1.0}, 0.0, 1.0, -1, 0)])
+
+        with open(self.filename, "wb") as not_a_movement:
+            not_a_movement.write(b"<movement/>" + b"\x00" * 128)
+        self.assertRaises(ValueError, BinaryMovement, self.filename)
+
+    def test_is_binary_movement(self):
+        self.assertTrue(is_binary_movement("movement.srm"))
+        self.assertFalse(is_binary_movement("movement.xml"))
+        self.assertFalse(is_binary_movement("recording.npy"))
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_binary", TestMovementBinary)
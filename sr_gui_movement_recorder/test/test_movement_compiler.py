@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import unittest
+
+import numpy
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec, flatten_steps, movement_duration, \
+    compile_movement, MovementCompiler
+
+def step(joints_and_positions, pause_time = 0.0, interpolation_time = 1.0, loop_to_step = -1, number_of_loops = 0):
+    return StepSpec("grasp", joints_and_positions, pause_time, interpolation_time, loop_to_step, number_of_loops)
+
+class TestFlattenSteps(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(flatten_steps([]), [])
+
+    def test_no_loop(self):
+        steps = [step({"FFJ3": 0.0}) for index in range(3)]
+        self.assertEqual(flatten_steps(steps), [0, 1, 2])
+
+    def test_loops(self):
+        steps = [step({"FFJ3": 0.0}), step({"FFJ3": 10.0}),
+                 step({"FFJ3": 20.0}, loop_to_step = 1, number_of_loops = 2), step({"FFJ3": 30.0})]
+        self.assertEqual(flatten_steps(steps), [0, 1, 2, 1, 2, 1, 2, 3])
+
+    def test_duration(self):
+        steps = [step({"FFJ3": 0.0}, pause_time = 0.5, interpolation_time = 1.0),
+                 step({"FFJ3": 10.0}, pause_time = 0.25, interpolation_time = 2.0),
+                 step({"FFJ3": 20.0}, pause_time = 4.0, interpolation_time = 8.0)]
+        #the last step is never left
+        self.assertAlmostEqual(movement_duration(steps), 3.75)
+
+class TestCompileMovement(unittest.TestCase):
+    def test_linear(self):
+        steps = [step({"FFJ3": 0.0, "MFJ3": 10.0}, pause_time = 0.5), step({"FFJ3": 90.0, "MFJ3": 20.0})]
+        compiled = compile_movement(steps, rate = 10.0)
+
+        self.assertEqual(compiled.joint_names, ("FFJ3", "MFJ3"))
+        self.assertEqual(len(compiled), 10)
+        self.assertAlmostEqual(compiled.duration, 1.5)
+        numpy.testing.assert_allclose(compiled.times, numpy.arange(1, 11) / 10.0)
+        numpy.testing.assert_allclose(compiled.positions[:, 0], numpy.arange(1, 11) * 9.0)
+        numpy.testing.assert_allclose(compiled.positions[:, 1], 10.0 + numpy.arange(1, 11))
+        self.assertTrue((compiled.step_indices == 1).all())
+        self.assertEqual(compiled.targets(4), {"FFJ3": 45.0, "MFJ3": 15.0})
+
+    def test_segments(self):
+        steps = [step({"FFJ3": 0.0}, pause_time = 1.0, interpolation_time = 0.5),
+                 step({"FFJ3": 10.0}, interpolation_time = 2.0), step({"FFJ3": 20.0})]
+        compiled = compile_movement(steps, rate = 10.0)
+
+        numpy.testing.assert_allclose(compiled.segment_starts, [0.0, 1.5])
+        numpy.testing.assert_allclose(compiled.segment_durations, [0.5, 2.0])
+        numpy.testing.assert_allclose(compiled.key_positions[:, 0], [0.0, 10.0, 20.0])
+        self.assertEqual(list(compiled.segment_steps), [1, 2])
+        self.assertEqual(compiled.step_time(2), 1.5)
+        self.assertEqual(len(compiled), 5 + 20)
+        self.assertEqual(list(compiled.row_segments), [0] * 5 + [1] * 20)
+        #the pause isn't part of the rows: the next segment starts after it
+        self.assertAlmostEqual(compiled.times[5], 1.6)
+
+    def test_new_joint_jumps_half_way(self):
+        steps = [step({"FFJ3": 0.0}), step({"FFJ3": 10.0, "MFJ3": 50.0})]
+        compiled = compile_movement(steps, rate = 10.0)
+
+        commanded = [("MFJ3" in compiled.targets(row)) for row in range(len(compiled))]
+        self.assertEqual(commanded, [False] * 4 + [True] * 6)
+        self.assertEqual(compiled.targets(4)["MFJ3"], 50.0)
+
+    def test_carried_joints(self):
+        steps = [step({"FFJ3": 0.0, "MFJ3": 30.0}), step({"FFJ3": 10.0}), step({"MFJ3": 60.0})]
+        compiled = compile_movement(steps, rate = 10.0)
+
+        numpy.testing.assert_allclose(compiled.key_positions, [[0.0, 30.0], [10.0, 30.0], [10.0, 60.0]])
+        self.assertEqual(compiled.targets(len(compiled) - 1), {"FFJ3": 10.0, "MFJ3": 60.0})
+
+    def test_read_only(self):
+        compiled = compile_movement([step({"FFJ3": 0.0}), step({"FFJ3": 10.0})], rate = 10.0)
+        self.assertRaises(ValueError, compiled.positions.__setitem__, 0, 1.0)
+
+    def test_single_step(self):
+        compiled = compile_movement([step({"FFJ3": 0.0})], rate = 10.0)
+        self.assertEqual(len(compiled), 0)
+        self.assertEqual(compiled.duration, 0.0)
+
+class TestMovementCompiler(unittest.TestCase):
+    def test_cache(self):
+        compiler = MovementCompiler()
+        steps = [step({"FFJ3": 0.0}), step({"FFJ3": 10.0})]
+        compiled = compiler.compile(steps, 10.0)
+
+        self.assertTrue(compiler.compile(list(steps), 10.0) is compiled)
+        self.assertFalse(compiler.compile(steps, 20.0) is compiled)
+        self.assertFalse(compiler.compile([steps[0], step({"FFJ3": 20.0})], 10.0) is compiled)
+
+    def test_cache_size(self):
+        compiler = MovementCompiler()
+        for index in range(MovementCompiler.CACHE_SIZE + 2):
+            compiler.compile([step({"FFJ3": 0.0}), step({"FFJ3": float(index)})], 10.0)
+        self.assertEqual(len(compiler.cache), MovementCompiler.CACHE_SIZE)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_compiler", TestFlattenSteps)
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_compiler", TestCompileMovement)
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_compiler", TestMovementCompiler)
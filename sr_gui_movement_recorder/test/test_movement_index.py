@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sr_gui_movement_recorder.movement_index import MovementIndex
+
+STEP = """  <step>
+    %s
+    <pause_time>%s</pause_time>
+    <interpolation_time>%s</interpolation_time>
+    <loop_to_step>-1</loop_to_step>
+    <number_loops>0</number_loops>
+  </step>
+"""
+
+def movement_xml(*steps):
+    return "<movement>\n" + "".join(STEP % step for step in steps) + "</movement>\n"
+
+class TestMovementIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = MovementIndex(os.path.join(self.directory, "index.sqlite"))
+        self.movements = os.path.join(self.directory, "movements")
+        os.mkdir(self.movements)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.movements, name)
+        movement_file = open(path, "w")
+        movement_file.write(content)
+        movement_file.close()
+        return path
+
+    def errors(self):
+        return dict(self.index.connection.execute("SELECT path, error FROM movements WHERE error IS NOT NULL"))
+
+    def test_search(self):
+        self.write("grab.xml", movement_xml(('<grasp name="opened" />', "0.0", "1.0"),
+                                            ('<grasp name="grab" />', "0.5", "2.0"),
+                                            ('<grasp name="opened" />', "0.0", "1.0")))
+        self.write("open.xml", movement_xml(('<grasp name="opened" />', "0.0", "1.0"),
+                                            ('<grasp name="opened" />', "0.0", "1.0")))
+        self.assertEqual(self.index.update(self.movements), 2)
+
+        entries = self.index.search(self.movements, grasps = ["grab"])
+        self.assertEqual([os.path.basename(entry.path) for entry in entries], ["grab.xml"])
+        self.assertEqual((entries[0].nb_steps, entries[0].duration, entries[0].grasps), (3, 3.5, ("grab", "opened")))
+        self.assertEqual(len(self.index.search(self.movements, max_duration = 2.0)), 1)
+        self.assertEqual(self.index.grasp_names(), ["grab", "opened"])
+        #nothing changed
+        self.assertEqual(self.index.update(self.movements), 0)
+
+    def test_step_without_grasp(self):
+        self.write("no_grasp.xml", movement_xml(('<grasp name="opened" />', "0.0", "1.0"), ("", "0.0", "2.0")))
+        self.write("open.xml", movement_xml(('<grasp name="opened" />', "0.0", "1.0"),
+                                            ('<grasp name="opened" />', "0.0", "1.0")))
+        self.assertEqual(self.index.update(self.movements), 2)
+
+        entries = dict((os.path.basename(entry.path), entry) for entry in self.index.search(self.movements))
+        self.assertEqual(sorted(entries.keys()), ["no_grasp.xml", "open.xml"])
+        self.assertEqual(entries["no_grasp.xml"].grasps, ("opened",))
+        self.assertEqual(entries["no_grasp.xml"].nb_steps, 2)
+        self.assertEqual(self.errors(), {})
+
+    def test_invalid_files(self):
+        not_a_movement = self.write("grasps.xml", "<root><grasp name='opened' /></root>")
+        broken = self.write("broken.xml", "<movement><step>")
+        no_time = self.write("no_time.xml", movement_xml(('<grasp name="opened" />', "", "1.0")))
+        self.write("open.xml", movement_xml(('<grasp name="opened" />', "0.0", "1.0"),
+                                            ('<grasp name="opened" />', "0.0", "1.0")))
+        self.assertEqual(self.index.update(self.movements), 4)
+
+        #the other files are still indexed
+        self.assertEqual([os.path.basename(entry.path) for entry in self.index.search(self.movements)], ["open.xml"])
+        self.assertEqual(sorted(self.errors().keys()), sorted([not_a_movement, broken, no_time]))
+        #and the invalid ones aren't parsed again before they change
+        self.assertEqual(self.index.update(self.movements), 0)
+
+    def test_removed_files(self):
+        path = self.write("open.xml", movement_xml(('<grasp name="opened" />', "0.0", "1.0"),
+                                                   ('<grasp name="opened" />', "0.0", "1.0")))
+        self.index.update(self.movements)
+        os.remove(path)
+        self.index.update(self.movements)
+        self.assertEqual(self.index.search(self.movements), [])
+        self.assertEqual(self.index.grasp_names(), [])
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_index", TestMovementIndex)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import unittest
+
+import numpy
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec, compile_movement
+from sr_gui_movement_recorder.movement_validator import JointLimits, validate_movement
+from sr_gui_movement_recorder.movement_retiming import retime_steps, shortest_durations, RetimingError
+from sr_gui_movement_recorder.interpolation import PROFILES, LINEAR, MINIMUM_JERK, CUBIC
+
+def step(joints_and_positions, interpolation_time = 1.0, pause_time = 0.0, loop_to_step = -1, number_of_loops = 0):
+    return StepSpec("grasp", joints_and_positions, pause_time, interpolation_time, loop_to_step, number_of_loops)
+
+class TestMovementRetiming(unittest.TestCase):
+    def setUp(self):
+        self.limits = JointLimits({"MFJ3": {"max_velocity": 90.0}},
+                                  {"max_velocity": 360.0, "max_acceleration": 3600.0})
+        self.steps = [step({"FFJ3": 0.0, "MFJ3": 0.0}, 5.0), step({"FFJ3": 90.0, "MFJ3": 9.0}, 5.0, 1.0),
+                      step({"FFJ3": 0.0, "MFJ3": 90.0}, 5.0), step({"FFJ3": 45.0, "MFJ3": 90.0})]
+
+    def test_shortest_durations(self):
+        keys = numpy.array([[0.0, 0.0], [90.0, 9.0], [0.0, 90.0]])
+        numpy.testing.assert_allclose(shortest_durations(keys, LINEAR, numpy.array([360.0, 90.0]), None),
+                                      [0.25, 0.9])
+        #no limit
+        numpy.testing.assert_allclose(shortest_durations(keys, LINEAR, numpy.array([numpy.nan, numpy.nan]), None),
+                                      [0.0, 0.0])
+
+    def test_retimed_movements_are_valid(self):
+        for profile in PROFILES:
+            retimed = retime_steps(self.steps, self.limits, 100.0, profile)
+            self.assertEqual(validate_movement(compile_movement(retimed, 100.0, profile), self.limits), [])
+            #faster than the original movement, pauses and grasps kept
+            self.assertTrue(all(retimed_step.interpolation_time < 5.0 for retimed_step in retimed[:-1]))
+            self.assertEqual([retimed_step.pause_time for retimed_step in retimed], [0.0, 1.0, 0.0, 0.0])
+            self.assertEqual([retimed_step.joints_and_positions for retimed_step in retimed],
+                             [original.joints_and_positions for original in self.steps])
+
+    def test_linear_times(self):
+        retimed = retime_steps(self.steps, self.limits, 100.0, LINEAR)
+        #the slowest joint of each move, rounded up to the period
+        self.assertEqual([retimed_step.interpolation_time for retimed_step in retimed[:-1]], [0.25, 0.9, 0.13])
+        #the last step is never left
+        self.assertEqual(retimed[-1], self.steps[-1])
+
+    def test_loops(self):
+        steps = [step({"FFJ3": 0.0}), step({"FFJ3": 10.0}), step({"FFJ3": 90.0}, loop_to_step = 1, number_of_loops = 1),
+                 step({"FFJ3": 90.0})]
+        retimed = retime_steps(steps, self.limits, 100.0, LINEAR)
+        #step 2 goes back to step 1 (80 degrees) and then to step 3 (no move): the slowest move counts
+        self.assertEqual(retimed[2].interpolation_time, 0.23)
+
+    def test_no_joints(self):
+        steps = [step({}), step({}), step({})]
+        retimed = retime_steps(steps, self.limits, 100.0, MINIMUM_JERK)
+        self.assertEqual([retimed_step.interpolation_time for retimed_step in retimed], [0.01, 0.01, 1.0])
+
+    def test_not_within_the_limits(self):
+        #the blending through the short move goes over the acceleration limit of the first estimate
+        steps = [step({"FFJ3": position}) for position in (0.0, 10.0, 50.0, 52.0, 90.0)]
+        limits = JointLimits(defaults = {"max_velocity": 1000.0, "max_acceleration": 3600.0})
+        try:
+            retime_steps(steps, limits, 100.0, CUBIC, max_iterations = 0)
+            self.fail("RetimingError not raised")
+        except RetimingError as e:
+            self.assertEqual([violation.step for violation in e.violations], [3])
+            self.assertEqual(len(e.steps), len(steps))
+            self.assertNotEqual(validate_movement(compile_movement(e.steps, 100.0, CUBIC), limits), [])
+
+        retimed = retime_steps(steps, limits, 100.0, CUBIC)
+        self.assertEqual(validate_movement(compile_movement(retimed, 100.0, CUBIC), limits), [])
+
+    def test_single_step(self):
+        self.assertEqual(retime_steps(self.steps[:1], self.limits), self.steps[:1])
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_retiming", TestMovementRetiming)
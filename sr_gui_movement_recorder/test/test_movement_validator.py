@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import os
+import unittest
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec, compile_movement
+from sr_gui_movement_recorder.movement_validator import JointLimits, validate_movement, violations_by_step, \
+    POSITION, VELOCITY, ACCELERATION
+from sr_gui_movement_recorder.interpolation import MINIMUM_JERK
+
+LIMITS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config", "joint_limits.yaml")
+
+def step(joints_and_positions, interpolation_time = 1.0, pause_time = 0.0):
+    return StepSpec("grasp", joints_and_positions, pause_time, interpolation_time, -1, 0)
+
+class TestMovementValidator(unittest.TestCase):
+    def setUp(self):
+        self.limits = JointLimits({"FFJ3": {"min": 0.0, "max": 90.0}},
+                                  {"max_velocity": 360.0, "max_acceleration": 3600.0})
+
+    def validate(self, steps, profile = "linear"):
+        return validate_movement(compile_movement(steps, 100.0, profile), self.limits)
+
+    def test_load(self):
+        limits = JointLimits.load(LIMITS_FILE)
+        self.assertEqual(limits.limit("FFJ3", "max"), 90.0)
+        self.assertEqual(limits.limit("FFJ3", "max_velocity"), 360.0)
+        self.assertTrue(limits.limit("FFJ3", "max_jerk") != limits.limit("FFJ3", "max_jerk"))
+
+    def test_valid(self):
+        self.assertEqual(self.validate([step({"FFJ3": 0.0}), step({"FFJ3": 90.0}), step({"FFJ3": 45.0})]), [])
+        self.assertEqual(self.validate([step({"FFJ3": 0.0})]), [])
+
+    def test_position(self):
+        violations = self.validate([step({"FFJ3": 0.0}), step({"FFJ3": 100.0, "MFJ3": 200.0})])
+        self.assertEqual([(violation.step, violation.joint_name, violation.kind) for violation in violations],
+                         [(1, "FFJ3", POSITION)])
+        #the worst value of the step
+        self.assertEqual((violations[0].value, violations[0].limit, violations[0].time), (100.0, 90.0, 1.0))
+
+    def test_velocity(self):
+        violations = self.validate([step({"FFJ3": 0.0}, 0.1), step({"FFJ3": 90.0})])
+        self.assertEqual([(violation.step, violation.kind) for violation in violations], [(1, VELOCITY)])
+        self.assertAlmostEqual(violations[0].value, 900.0)
+        descriptions = violations_by_step(violations)
+        self.assertEqual(list(descriptions.keys()), [1])
+        self.assertTrue(descriptions[1][0].startswith("step 2, FFJ3: velocity 900.0 deg/s at "))
+        self.assertTrue(descriptions[1][0].endswith(" s (limit 360.0 deg/s)"))
+
+    def test_acceleration(self):
+        #1.875 * 90 / 0.4 = 422 deg/s, 5.77 * 90 / 0.4^2 = 3248 deg/s^2 at the peaks
+        self.assertEqual(self.validate([step({"FFJ3": 0.0}, 0.5), step({"FFJ3": 90.0})], MINIMUM_JERK), [])
+        violations = self.validate([step({"FFJ3": 0.0}, 0.3), step({"FFJ3": 90.0})], MINIMUM_JERK)
+        self.assertEqual(sorted(set(violation.kind for violation in violations)), [ACCELERATION, VELOCITY])
+
+    def test_at_the_limit(self):
+        #360 deg/s, with the rounding errors of the times
+        self.assertEqual(self.validate([step({"FFJ3": 0.0}, 0.13), step({"FFJ3": 46.8}), step({"FFJ3": 0.0})]), [])
+
+    def test_jump(self):
+        #a zero interpolation time jumps to the target
+        self.assertEqual(self.validate([step({"FFJ3": 0.0}, 0.0), step({"FFJ3": 90.0}), step({"FFJ3": 0.0})]), [])
+
+    def test_sorted_by_time(self):
+        violations = self.validate([step({"FFJ3": 0.0}, 0.1), step({"FFJ3": 90.0}, 0.1),
+                                    step({"FFJ3": 0.0}, 0.1), step({"FFJ3": 95.0})])
+        times = [violation.time for violation in violations]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(sorted(set(violation.step for violation in violations)), [1, 2, 3])
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_movement_validator", TestMovementValidator)
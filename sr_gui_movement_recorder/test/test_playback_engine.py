@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import math
+import threading
+import unittest
+
+from sr_gui_movement_recorder.playback_engine import DeadlineScheduler, PlaybackStats, PlaybackTransport, monotonic
+
+class FakeClock(object):
+    """
+    A clock which only moves when sleeping (or when told to)
+    """
+    def __init__(self, now = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, duration):
+        self.now += duration
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = DeadlineScheduler(100.0, clock = self.clock, sleep = self.clock.sleep)
+        self.calls = []
+
+    def callback(self, row):
+        self.calls.append((row, self.scheduler.elapsed()))
+
+    def test_invalid_rate(self):
+        self.assertRaises(ValueError, DeadlineScheduler, 0.0)
+        self.assertRaises(ValueError, DeadlineScheduler, -10.0)
+
+    def test_deadlines(self):
+        times = [0.0, 0.01, 0.5, 0.51, 2.0]
+        self.scheduler.start()
+        self.assertTrue(self.scheduler.run(times, self.callback))
+
+        self.assertEqual([row for row, elapsed in self.calls], list(range(len(times))))
+        for (row, elapsed), deadline in zip(self.calls, times):
+            self.assertAlmostEqual(elapsed, deadline)
+        self.assertEqual(self.scheduler.stats.ticks, len(times))
+        self.assertEqual(self.scheduler.stats.overruns, 0)
+
+    def test_no_drift(self):
+        def slow_callback(row):
+            self.callback(row)
+            if row == 1:
+                #late by 3 periods
+                self.clock.sleep(0.035)
+
+        times = [index * 0.01 for index in range(10)]
+        self.scheduler.start()
+        self.scheduler.run(times, slow_callback)
+
+        #the ticks missed while late are sent straight away, the next ones on their deadlines
+        elapsed = [elapsed for row, elapsed in self.calls]
+        self.assertAlmostEqual(elapsed[2], 0.045)
+        self.assertAlmostEqual(elapsed[4], 0.045)
+        self.assertAlmostEqual(elapsed[5], 0.05)
+        self.assertAlmostEqual(elapsed[9], 0.09)
+        self.assertEqual(self.scheduler.stats.overruns, 2)
+        self.assertAlmostEqual(self.scheduler.stats.jitter_max, 0.025)
+
+    def test_should_stop(self):
+        self.scheduler.start()
+        finished = self.scheduler.run([0.0, 0.01, 1.0, 2.0], self.callback,
+                                      should_stop = lambda: len(self.calls) == 2)
+        self.assertFalse(finished)
+        self.assertEqual([row for row, elapsed in self.calls], [0, 1])
+
+class TestPlaybackStats(unittest.TestCase):
+    def test_stats(self):
+        stats = PlaybackStats(0.01)
+        self.assertEqual(stats.jitter_mean(), 0.0)
+        for lateness in (0.0, 0.002, 0.004, 0.03):
+            stats.add(lateness)
+
+        self.assertEqual(stats.ticks, 4)
+        self.assertEqual(stats.overruns, 1)
+        self.assertAlmostEqual(stats.jitter_mean(), 0.009)
+        self.assertAlmostEqual(stats.jitter_std(), math.sqrt(0.000149))
+        self.assertAlmostEqual(stats.jitter_max, 0.03)
+        stats.reset()
+        self.assertEqual((stats.ticks, stats.overruns, stats.jitter_max), (0, 0, 0.0))
+
+class TestPlaybackTransport(unittest.TestCase):
+    def setUp(self):
+        self.transport = PlaybackTransport()
+        self.scheduler = DeadlineScheduler(100.0)
+        self.rows = []
+
+    def run_scheduler(self, times):
+        self.scheduler.start()
+        return self.scheduler.run(times, self.rows.append, transport = self.transport)
+
+    def later(self, delay, command, *args):
+        timer = threading.Timer(delay, command, args)
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_wait(self):
+        self.assertFalse(self.transport.wait(0.01))
+        self.transport.pause()
+        self.assertTrue(self.transport.wait(0.01))
+        #the command has been consumed
+        self.assertFalse(self.transport.wait(0.01))
+
+    def test_stopped_before_start(self):
+        self.transport.stop()
+        self.assertFalse(self.run_scheduler([0.0, 0.01]))
+        self.assertEqual(self.rows, [])
+        self.transport.reset()
+        self.assertTrue(self.run_scheduler([0.0, 0.01]))
+        self.assertEqual(self.rows, [0, 1])
+
+    def test_stop_wakes_up(self):
+        self.later(0.05, self.transport.stop)
+        start = monotonic()
+        self.assertFalse(self.run_scheduler([0.0, 10.0]))
+        self.assertEqual(self.rows, [0])
+        self.assertTrue(monotonic() - start < 1.0)
+
+    def test_seek(self):
+        self.transport.seek(5.0)
+        start = monotonic()
+        self.assertTrue(self.run_scheduler([0.0, 1.0, 2.0, 5.0, 5.01]))
+        self.assertEqual(self.rows, [3, 4])
+        self.assertTrue(monotonic() - start < 1.0)
+
+    def test_seek_back(self):
+        def callback(row):
+            self.rows.append(row)
+            if len(self.rows) == 2:
+                self.transport.seek(0.0)
+
+        self.scheduler.start()
+        self.assertTrue(self.scheduler.run([0.0, 0.01, 0.02], callback, transport = self.transport))
+        self.assertEqual(self.rows, [0, 1, 0, 1, 2])
+
+    def test_pause(self):
+        self.transport.pause()
+        self.later(0.1, self.transport.resume)
+        start = monotonic()
+        self.assertTrue(self.run_scheduler([0.0, 0.05]))
+        self.assertEqual(self.rows, [0, 1])
+        #the deadlines are shifted by the time spent paused
+        self.assertTrue(monotonic() - start >= 0.15)
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_playback_engine", TestDeadlineScheduler)
+    rosunit.unitrun("sr_gui_movement_recorder", "test_playback_engine", TestPlaybackStats)
+    rosunit.unitrun("sr_gui_movement_recorder", "test_playback_engine", TestPlaybackTransport)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright 2011 Shadow Robot Company Ltd.
+#
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+import sys
+import unittest
+
+#imports the Qt modules used by the package (from QtCore import ...)
+from python_qt_binding.QtCore import QCoreApplication, QTimer
+
+from sr_gui_movement_recorder.movement_compiler import StepSpec, compile_movement
+from sr_gui_movement_recorder.playback_engine import PlaybackTransport
+from sr_gui_movement_recorder.playback_worker import PlaybackWorker, EventLoopMonitor
+
+#the GUI stays responsive if its timers are never late by more than this
+MAX_LATENESS = 0.1
+
+class StubHand(object):
+    """
+    Counts the targets sent instead of publishing them
+    """
+    def __init__(self):
+        self.updates = 0
+
+    def sendupdate_from_dict(self, dictionary):
+        self.updates += 1
+
+def example_steps():
+    grasps = [{"FFJ3": 0.0, "MFJ3": 0.0, "RFJ3": 0.0},
+              {"FFJ3": 90.0, "MFJ3": 45.0, "RFJ3": 20.0},
+              {"FFJ3": 10.0, "MFJ3": 80.0, "RFJ3": 60.0}]
+    return [StepSpec("grasp_%d" % index, grasp, 0.0, 0.5, -1, 0) for index, grasp in enumerate(grasps)]
+
+class TestPlaybackWorker(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+        self.worker = PlaybackWorker(PlaybackTransport())
+        self.finished = []
+        self.steps_started = []
+        self.worker.playbackFinished.connect(self.playback_finished)
+        self.worker.stepStarted.connect(self.steps_started.append)
+        #don't hang if the playback never finishes
+        self.timeout = QTimer()
+        self.timeout.setSingleShot(True)
+        self.timeout.timeout.connect(self.app.quit)
+
+    def tearDown(self):
+        self.worker.shutdown()
+
+    def playback_finished(self, finished, metrics):
+        self.finished.append(finished)
+        self.app.quit()
+
+    def test_event_loop_latency(self):
+        compiled = compile_movement(example_steps(), rate = 500.0)
+        hand = StubHand()
+        monitor = EventLoopMonitor()
+
+        monitor.start()
+        self.timeout.start(int(1000 * (compiled.duration + 5.0)))
+        self.worker.play(hand, compiled)
+        self.app.exec_()
+        stats = monitor.stop()
+
+        self.assertEqual(self.finished, [True])
+        self.assertEqual(hand.updates, len(compiled))
+        self.assertEqual(self.steps_started, [1, 2])
+        self.assertTrue(stats.ticks > 0)
+        self.assertTrue(stats.jitter_max < MAX_LATENESS,
+                        "the GUI thread was blocked while playing: " + str(stats))
+
+    def test_stop(self):
+        compiled = compile_movement(example_steps(), rate = 100.0)
+        self.timeout.start(5000)
+        self.worker.play(StubHand(), compiled)
+        self.worker.transport.stop()
+        self.app.exec_()
+
+        self.assertEqual(self.finished, [False])
+
+if __name__ == "__main__":
+    import rosunit
+    rosunit.unitrun("sr_gui_movement_recorder", "test_playback_worker", TestPlaybackWorker)